@@ -2,4 +2,15 @@
 pip3 install -r requirements.txt
 export FLASK_APP=app.py
 export FLASK_ENV=production
-gunicorn app:app
+
+# Every open workspace event stream holds a worker thread for as long as the
+# page stays open, so serve with threaded workers: WEB_WORKERS x WEB_THREADS
+# requests run at once. EVENTS_MAX_STREAMS caps the streams of each worker
+# below its thread count, leaving the remaining threads for regular requests;
+# streams over the cap are refused with 503 and those clients go without live
+# updates. Workers see each other's commits through a MongoDB change stream,
+# or, on standalone servers without one, by polling every EVENTS_POLL_SECONDS.
+WEB_WORKERS=${WEB_WORKERS:-2}
+WEB_THREADS=${WEB_THREADS:-32}
+export EVENTS_MAX_STREAMS=${EVENTS_MAX_STREAMS:-$((WEB_THREADS - 8))}
+gunicorn --worker-class gthread --workers "$WEB_WORKERS" --threads "$WEB_THREADS" app:app
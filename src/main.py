@@ -9,6 +9,11 @@ from src.routes.user import user_bp
 from src.routes.workspace import workspace_bp
 from src.routes.version import version_bp
 from src.routes.ai import ai_bp
+from src.routes.commit import commit_bp
+from src.routes.export import export_bp
+from src.routes.bulk_import import import_bp
+from src.routes.search import search_bp
+from src.routes.events import events_bp
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +28,11 @@ app.register_blueprint(user_bp)
 app.register_blueprint(workspace_bp)
 app.register_blueprint(version_bp)
 app.register_blueprint(ai_bp)
+app.register_blueprint(commit_bp)
+app.register_blueprint(export_bp)
+app.register_blueprint(import_bp)
+app.register_blueprint(search_bp)
+app.register_blueprint(events_bp)
 
 # Connect to MongoDB
 # Flask 2.0+ removed before_first_request
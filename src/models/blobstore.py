@@ -0,0 +1,1731 @@
+"""
+Content-addressed blob storage for file contents.
+
+BlobStore is the only way DatabaseManager and the routes read and write
+file contents. Blobs are addressed by the SHA-256 of their raw bytes and
+written at most once, so concurrent commits of the same content are safe.
+
+Backends:
+    MongoBlobStore       file_contents/chunks collections, with delta,
+                         chunk and compression encodings (default)
+    FilesystemBlobStore  one file per blob under fan-out directories,
+                         read through mmap
+    MemoryBlobStore      process-local dict, for tests and demo mode
+    MirroredBlobStore    Mongo primary with a write-through local
+                         filesystem mirror serving the reads
+
+The backend is picked with BLOB_STORE_BACKEND (mongo, filesystem, memory,
+mirror); the filesystem backend and the mirror store blobs under
+BLOB_STORE_PATH.
+"""
+import io
+import os
+import re
+import json
+import mmap
+import fcntl
+import codecs
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict, Counter
+from datetime import datetime
+from bson import Binary
+from pymongo import UpdateOne
+from src.models.delta import create_delta, apply_delta
+from src.models.version import FileContent
+from src.models.compression import CODEC_NONE, choose_codec, compress, decompress, is_text_type
+from src.models.chunking import iter_chunks, chunk_hash, StreamChunker
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Backend configuration
+BLOB_STORE_BACKEND = os.getenv('BLOB_STORE_BACKEND', 'mongo').lower()
+BLOB_STORE_PATH = os.getenv('BLOB_STORE_PATH', os.path.join('data', 'blobs'))
+
+# Delta storage configuration
+DELTA_STORAGE_ENABLED = os.getenv('DELTA_STORAGE_ENABLED', 'true').lower() == 'true'
+DELTA_KEYFRAME_INTERVAL = int(os.getenv('DELTA_KEYFRAME_INTERVAL', 50))  # max chain length before a full copy
+DELTA_MAX_RATIO = float(os.getenv('DELTA_MAX_RATIO', 0.5))  # store a delta only if it is this much smaller
+DELTA_CACHE_BYTES = int(os.getenv('DELTA_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Chunk store configuration
+CHUNKING_ENABLED = os.getenv('CHUNKING_ENABLED', 'true').lower() == 'true'
+CHUNKING_MIN_SIZE = int(os.getenv('CHUNKING_MIN_SIZE', 1024 * 1024))  # smaller blobs are stored whole
+CHUNK_BATCH_SIZE = 16  # chunks per round trip
+
+# Bytes read from an input stream per call
+READ_SIZE = 64 * 1024
+
+# Hashes batched into one exists_many query
+EXISTS_BATCH_SIZE = 1000
+
+_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def is_valid_hash(content_hash):
+    """
+    Check that a string is a hex SHA-256 digest.
+
+    Args:
+        content_hash (str): Candidate hash
+
+    Returns:
+        bool: True if the hash is well formed
+    """
+    return isinstance(content_hash, str) and bool(_HASH_PATTERN.match(content_hash))
+
+
+class BlobCache:
+    """
+    Bounded LRU cache of rebuilt file contents, keyed by content hash.
+    Keeps recently used delta bases around so rebuilding a chain does
+    not have to walk back to the keyframe every time.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes (int): Maximum total size of cached contents
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, content_hash):
+        """
+        Get cached content and mark it as recently used.
+
+        Args:
+            content_hash (str): Content hash
+
+        Returns:
+            bytes: Cached content or None if not cached
+        """
+        with self._lock:
+            content = self._entries.get(content_hash)
+            if content is not None:
+                self._entries.move_to_end(content_hash)
+            return content
+
+    def put(self, content_hash, content):
+        """
+        Add content to the cache, evicting the least recently used entries.
+
+        Args:
+            content_hash (str): Content hash
+            content (bytes): Rebuilt content
+        """
+        if len(content) > self.max_bytes:
+            return
+
+        with self._lock:
+            if content_hash in self._entries:
+                self._entries.move_to_end(content_hash)
+                return
+            self._entries[content_hash] = content
+            self.current_bytes += len(content)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def discard(self, content_hash):
+        """
+        Remove content from the cache.
+
+        Args:
+            content_hash (str): Content hash
+        """
+        with self._lock:
+            content = self._entries.pop(content_hash, None)
+            if content is not None:
+                self.current_bytes -= len(content)
+
+
+class HashingReader:
+    """
+    Wraps an input stream, hashing and measuring everything read through it.
+    Text content types are only treated as text if they decode cleanly.
+    """
+
+    def __init__(self, stream, content_type=None, encoding=None):
+        """
+        Initialize the reader.
+
+        Args:
+            stream (file-like): Stream to read from
+            content_type (str, optional): MIME type of the content
+            encoding (str, optional): Known text encoding; detected if None
+        """
+        self.stream = stream
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._encoding = encoding
+        self._decoder = None
+        if encoding is None and is_text_type(content_type):
+            self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read(self, size=-1):
+        """
+        Read from the stream.
+
+        Args:
+            size (int, optional): Maximum number of bytes, -1 for all
+
+        Returns:
+            bytes: Data read, empty at the end of the stream
+        """
+        piece = self.stream.read(size)
+        if piece:
+            self._hasher.update(piece)
+            self.size += len(piece)
+            if self._decoder:
+                try:
+                    self._decoder.decode(piece)
+                except UnicodeDecodeError:
+                    self._decoder = None
+        return piece
+
+    def hexdigest(self):
+        """
+        Get the SHA-256 of everything read so far.
+        """
+        return self._hasher.hexdigest()
+
+    def encoding(self):
+        """
+        Get the text encoding of the content once it has been read fully.
+
+        Returns:
+            str: "utf-8" for text content, the given encoding, or None
+        """
+        if self._encoding is not None or self._decoder is None:
+            return self._encoding
+        try:
+            self._decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return None
+        return "utf-8"
+
+
+class IterStream:
+    """
+    Minimal file-like object over an iterator of byte strings.
+    """
+
+    def __init__(self, pieces):
+        self._pieces = iter(pieces)
+        self._buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            piece = next(self._pieces, None)
+            if piece is None:
+                break
+            self._buffer += piece
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class BlobStore:
+    """
+    Interface of a content-addressed blob store.
+
+    Backends implement put, get, get_meta and exists_many. Metadata is a
+    dict with at least content_hash, content_type, size, encoding,
+    created_at and refcount, the number of versions using the blob. The
+    chunk upload protocol has a generic implementation that stores every
+    chunk as a blob of its own.
+    """
+
+    def put(self, content_hash, stream, content_type=None, encoding=None, base_hash=None):
+        """
+        Store a blob unless it already exists. Storing an existing blob
+        again refreshes its created_at, so the garbage collector gives the
+        commit that stores it the full grace period to take a reference.
+
+        Args:
+            content_hash (str): Expected SHA-256 of the content, or None to
+                compute it from the stream
+            stream (file-like): Stream to read the content from
+            content_type (str, optional): MIME type of the content
+            encoding (str, optional): Text encoding; detected from the
+                content type and content if None
+            base_hash (str, optional): Hash of a similar blob (usually the
+                previous version) that backends may encode against
+
+        Returns:
+            dict: content_hash, size and whether the blob was created, or
+                None if the content does not match content_hash or the
+                write failed
+        """
+        raise NotImplementedError
+
+    def put_many(self, blobs):
+        """
+        Store several small blobs at once, skipping those that already exist.
+        No delta encoding is attempted.
+
+        Args:
+            blobs (list): (content_hash, raw bytes, content_type) tuples
+
+        Returns:
+            dict: {size, created} per stored content hash; blobs that do
+                not match their hash are left out
+        """
+        stored = {}
+        for content_hash, raw, content_type in blobs:
+            result = self.put(content_hash, io.BytesIO(raw), content_type)
+            if result:
+                stored[result["content_hash"]] = {"size": result["size"], "created": result["created"]}
+        return stored
+
+    def get(self, content_hash):
+        """
+        Read a whole blob.
+
+        Args:
+            content_hash (str): Content hash
+
+        Returns:
+            bytes: Raw content or None if not found
+        """
+        raise NotImplementedError
+
+    def get_meta(self, content_hash):
+        """
+        Get the metadata of a blob without reading its content.
+
+        Args:
+            content_hash (str): Content hash
+
+        Returns:
+            dict: Blob metadata or None if not found
+        """
+        raise NotImplementedError
+
+    def get_many(self, content_hashes):
+        """
+        Read several whole blobs at once.
+
+        Args:
+            content_hashes (list): Content hashes
+
+        Returns:
+            dict: Raw content per content hash, missing blobs left out
+        """
+        found = {}
+        for content_hash in content_hashes:
+            raw = self.get(content_hash)
+            if raw is not None:
+                found[content_hash] = raw
+        return found
+
+    def get_meta_many(self, content_hashes):
+        """
+        Get the metadata of several blobs at once.
+
+        Args:
+            content_hashes (list): Content hashes
+
+        Returns:
+            dict: Blob metadata per content hash, missing blobs left out
+        """
+        found = {}
+        for content_hash in content_hashes:
+            meta = self.get_meta(content_hash)
+            if meta:
+                found[content_hash] = meta
+        return found
+
+    def exists(self, content_hash):
+        """
+        Check whether a blob is stored.
+
+        Args:
+            content_hash (str): Content hash
+
+        Returns:
+            bool: True if the blob exists
+        """
+        return content_hash in self.exists_many([content_hash])
+
+    def exists_many(self, content_hashes):
+        """
+        Check which of several blobs are stored.
+
+        Args:
+            content_hashes (list): Content hashes
+
+        Returns:
+            set: Hashes that are stored
+        """
+        raise NotImplementedError
+
+    def content_length(self, meta):
+        """
+        Get the size in bytes of a blob.
+
+        Args:
+            meta (dict): Blob metadata from get_meta
+
+        Returns:
+            int: Content length or None if the content is missing
+        """
+        return meta.get("size")
+
+    def iter_range(self, meta, start=0, end=None):
+        """
+        Stream a byte range of a blob.
+
+        Args:
+            meta (dict): Blob metadata from get_meta
+            start (int, optional): First byte offset
+            end (int, optional): Offset just past the last byte
+
+        Yields:
+            bytes: Consecutive pieces of the range
+        """
+        raw = self.get(meta["content_hash"]) or b""
+        yield raw[start:end]
+
+    def open(self, meta, start=0, end=None):
+        """
+        Open a byte range of a blob as a file-like object that can be handed
+        to the WSGI server's file wrapper.
+
+        Args:
+            meta (dict): Blob metadata from get_meta
+            start (int, optional): First byte offset
+            end (int, optional): Offset just past the last byte
+
+        Returns:
+            file-like: Readable blob, or None if the backend cannot open blobs
+        """
+        return None
+
+    # Garbage collection support
+    def list_blobs(self, after=None, limit=100):
+        """
+        List stored blobs in content hash order, for scans that resume
+        where they stopped.
+
+        Args:
+            after (str, optional): Only list hashes greater than this one
+            limit (int, optional): Maximum number of blobs
+
+        Returns:
+            list: Blob metadata (content_hash, size, created_at)
+        """
+        raise NotImplementedError
+
+    def delete(self, content_hash, created_before=None):
+        """
+        Delete a blob that no version uses. The reference count and age are
+        checked in the same step as the delete, so a blob that a commit
+        stores again or starts using in the meantime is kept.
+
+        Args:
+            content_hash (str): Content hash
+            created_before (datetime, optional): Keep the blob if it was
+                stored (or stored again) since
+
+        Returns:
+            bool: True if the blob was deleted
+        """
+        raise NotImplementedError
+
+    def find_dependents(self, content_hashes):
+        """
+        Find which blobs other stored blobs are encoded against, so they
+        are not deleted while still needed to rebuild them.
+
+        Args:
+            content_hashes (list): Content hashes
+
+        Returns:
+            set: Hashes still used as a base
+        """
+        return set()
+
+    def list_chunks(self, after=None, limit=100):
+        """
+        List the chunks kept apart from the blobs in chunk hash order.
+        Backends that store uploaded chunks as blobs of their own have none;
+        their chunks are swept with the blobs.
+
+        Args:
+            after (str, optional): Only list hashes greater than this one
+            limit (int, optional): Maximum number of chunks
+
+        Returns:
+            list: Chunk metadata (chunk_hash, size, refcount, created_at)
+        """
+        return []
+
+    def delete_chunks(self, chunk_hashes, created_before):
+        """
+        Delete chunks that no blob uses: their reference count is not
+        positive, no manifest lists them and they were stored before
+        created_before.
+
+        Args:
+            chunk_hashes (list): Chunk hashes
+            created_before (datetime): Chunks stored since are kept
+
+        Returns:
+            int: Number of chunks deleted
+        """
+        return 0
+
+    # Reference counting
+    def add_refs(self, counts):
+        """
+        Adjust the reference counts of blobs.
+
+        Args:
+            counts (dict): Amount to add per content hash (negative to release)
+        """
+        raise NotImplementedError
+
+    # Chunk upload protocol
+    def missing_chunks(self, chunk_hashes):
+        """
+        Find which chunks are not stored yet, so clients only upload what is new.
+
+        Args:
+            chunk_hashes (list): Chunk hashes
+
+        Returns:
+            list: Hashes that are not stored, in the given order
+        """
+        unique_hashes = list(dict.fromkeys(chunk_hashes))
+        present = self.exists_many(unique_hashes)
+        return [digest for digest in unique_hashes if digest not in present]
+
+    def put_chunk(self, digest, data):
+        """
+        Store a single uploaded chunk.
+
+        Args:
+            digest (str): Expected SHA-256 of the chunk
+            data (bytes): Chunk content
+
+        Returns:
+            bool: True if stored (or already present), False otherwise
+        """
+        return self.put(digest, IterStream([data])) is not None
+
+    def put_chunked(self, content_hash, chunk_hashes, content_type):
+        """
+        Store a blob assembled from chunks that were already uploaded.
+        The chunks are read back to verify they add up to content_hash, also
+        when the blob is already stored, so a manifest only succeeds for
+        callers that uploaded the content or hold every chunk of it.
+
+        Args:
+            content_hash (str): SHA-256 of the whole content
+            chunk_hashes (list): Chunk hashes in content order
+            content_type (str): MIME type of the content
+
+        Returns:
+            bool: True if the blob exists afterwards, False otherwise
+        """
+        if set(self.missing_chunks(chunk_hashes)):
+            logger.warning(f"Chunks missing for content {content_hash}")
+            return False
+        if not self.exists(content_hash):
+            # put verifies the hash while it stores the blob
+            pieces = (self.get(digest) for digest in chunk_hashes)
+            return self.put(content_hash, IterStream(pieces), content_type) is not None
+
+        hasher = hashlib.sha256()
+        for digest in chunk_hashes:
+            hasher.update(self.get(digest) or b"")
+        if hasher.hexdigest() != content_hash:
+            logger.warning(f"Chunk manifest does not match content hash {content_hash}")
+            return False
+        return True
+
+
+class MemoryBlobStore(BlobStore):
+    """
+    Blob store that keeps blobs in a process-local dict.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty store.
+        """
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def put(self, content_hash, stream, content_type=None, encoding=None, base_hash=None):
+        if content_hash is not None:
+            with self._lock:
+                blob = self._blobs.get(content_hash)
+                if blob:
+                    blob[1]["created_at"] = datetime.utcnow()
+                    return {"content_hash": content_hash, "size": blob[1]["size"], "created": False}
+
+        reader = HashingReader(stream, content_type, encoding)
+        data = reader.read()
+        digest = reader.hexdigest()
+        if content_hash is not None and digest != content_hash:
+            logger.warning(f"Content does not match its hash {content_hash}")
+            return None
+
+        meta = {
+            "content_hash": digest,
+            "content_type": content_type,
+            "size": reader.size,
+            "encoding": reader.encoding(),
+            "created_at": datetime.utcnow(),
+            "refcount": 0
+        }
+        with self._lock:
+            created = digest not in self._blobs
+            if created:
+                self._blobs[digest] = (bytes(data), meta)
+            else:
+                self._blobs[digest][1]["created_at"] = meta["created_at"]
+        return {"content_hash": digest, "size": reader.size, "created": created}
+
+    def get(self, content_hash):
+        blob = self._blobs.get(content_hash)
+        return blob[0] if blob else None
+
+    def get_meta(self, content_hash):
+        blob = self._blobs.get(content_hash)
+        return dict(blob[1]) if blob else None
+
+    def exists_many(self, content_hashes):
+        return {content_hash for content_hash in content_hashes if content_hash in self._blobs}
+
+    def list_blobs(self, after=None, limit=100):
+        hashes = sorted(content_hash for content_hash in self._blobs if after is None or content_hash > after)
+        return [dict(self._blobs[content_hash][1]) for content_hash in hashes[:limit]]
+
+    def delete(self, content_hash, created_before=None):
+        with self._lock:
+            blob = self._blobs.get(content_hash)
+            if not blob or blob[1]["refcount"] > 0:
+                return False
+            if created_before is not None and blob[1]["created_at"] >= created_before:
+                return False
+            del self._blobs[content_hash]
+            return True
+
+    def add_refs(self, counts):
+        with self._lock:
+            for content_hash, amount in counts.items():
+                if content_hash in self._blobs:
+                    self._blobs[content_hash][1]["refcount"] += amount
+
+
+class MappedBlob:
+    """
+    Read-only, memory-mapped view of a byte range of a blob file.
+    Iterating yields slices of the mapping; fileno() lets servers that
+    support it send the file with sendfile.
+    """
+
+    def __init__(self, path, start=0, end=None, buffer_size=READ_SIZE):
+        """
+        Map a blob file.
+
+        Args:
+            path (str): Blob file path
+            start (int, optional): First byte offset
+            end (int, optional): Offset just past the last byte
+            buffer_size (int, optional): Bytes per iteration step
+        """
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # Empty files cannot be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.end = size if end is None else min(end, size)
+        self.position = min(start, self.end)
+        self.buffer_size = buffer_size
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.end - self.position
+        data = self._map[self.position:min(self.position + size, self.end)]
+        self.position += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.end
+        self.position = max(0, min(offset, self.end))
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.buffer_size)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
+class FilesystemBlobStore(BlobStore):
+    """
+    Blob store that keeps each blob in a file under two-level fan-out
+    directories (ab/cdef...). Blobs are written to a temporary file and
+    renamed into place, so readers never see a partial blob. Metadata is
+    kept next to the blob in a small JSON file. Reads go through mmap, so
+    hot blobs are served from the page cache without extra copies.
+
+    Metadata rewrites (reference counts, refreshed created_at) and deletes
+    hold an flock on a lock file in the blob's fan-out directory, so
+    several worker processes sharing the directory do not lose updates.
+    """
+
+    def __init__(self, root):
+        """
+        Initialize the store.
+
+        Args:
+            root (str): Directory holding the blobs
+        """
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def _path(self, content_hash):
+        """
+        Get the file path of a blob.
+        """
+        return os.path.join(self.root, content_hash[:2], content_hash[2:])
+
+    @contextmanager
+    def _locked(self, content_hash):
+        """
+        Hold the inter-process lock of a blob's fan-out directory.
+        """
+        directory = os.path.dirname(self._path(content_hash))
+        os.makedirs(directory, exist_ok=True)
+        # flock conflicts between separate opens, so threads are covered too
+        with open(os.path.join(directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def put(self, content_hash, stream, content_type=None, encoding=None, base_hash=None):
+        if content_hash is not None:
+            if not is_valid_hash(content_hash):
+                logger.warning(f"Invalid content hash {content_hash!r}")
+                return None
+            meta = self._touch(content_hash)
+            if meta:
+                return {"content_hash": content_hash, "size": meta["size"], "created": False}
+
+        reader = HashingReader(stream, content_type, encoding)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                while True:
+                    piece = reader.read(READ_SIZE)
+                    if not piece:
+                        break
+                    tmp_file.write(piece)
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+
+            digest = reader.hexdigest()
+            if content_hash is not None and digest != content_hash:
+                logger.warning(f"Content does not match its hash {content_hash}")
+                os.unlink(tmp_path)
+                return None
+
+            path = self._path(digest)
+            with self._locked(digest):
+                created = not os.path.exists(path)
+                if created:
+                    self._write_meta(path, {
+                        "content_hash": digest,
+                        "content_type": content_type,
+                        "encoding": reader.encoding(),
+                        "created_at": datetime.utcnow().isoformat(),
+                        "refcount": 0
+                    })
+                    # The blob only becomes visible once it is complete
+                    os.replace(tmp_path, path)
+            if not created:
+                os.unlink(tmp_path)
+                self._touch(digest)
+            return {"content_hash": digest, "size": reader.size, "created": created}
+        except Exception as e:
+            logger.error(f"Failed to store blob: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return None
+
+    def _update_meta(self, content_hash, update):
+        """
+        Rewrite the metadata file of a blob.
+
+        Args:
+            content_hash (str): Content hash
+            update (callable): Changes the metadata dict in place
+
+        Returns:
+            dict: Updated metadata, or None if the blob does not exist
+        """
+        if not self.exists(content_hash):
+            return None
+        with self._locked(content_hash):
+            meta = self.get_meta(content_hash)
+            if not meta:
+                return None
+            update(meta)
+            stored = dict(meta, created_at=meta["created_at"].isoformat())
+            del stored["size"]
+            self._write_meta(self._path(content_hash), stored)
+            return meta
+
+    def _touch(self, content_hash):
+        """
+        Refresh the created_at of a blob that is stored again.
+        """
+        return self._update_meta(content_hash, lambda meta: meta.update(created_at=datetime.utcnow()))
+
+    def _write_meta(self, path, meta):
+        """
+        Atomically write the metadata file of a blob.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(meta, tmp_file)
+        os.replace(tmp_path, path + ".json")
+
+    def get(self, content_hash):
+        if not is_valid_hash(content_hash):
+            return None
+        try:
+            blob = MappedBlob(self._path(content_hash))
+        except FileNotFoundError:
+            return None
+        try:
+            return blob.read()
+        finally:
+            blob.close()
+
+    def get_meta(self, content_hash):
+        if not is_valid_hash(content_hash):
+            return None
+        path = self._path(content_hash)
+        try:
+            size = os.stat(path).st_size
+            with open(path + ".json") as meta_file:
+                meta = json.load(meta_file)
+        except FileNotFoundError:
+            return None
+        meta["size"] = size
+        meta["created_at"] = datetime.fromisoformat(meta["created_at"])
+        meta.setdefault("refcount", 0)
+        return meta
+
+    def exists_many(self, content_hashes):
+        return {
+            content_hash for content_hash in content_hashes
+            if is_valid_hash(content_hash) and os.path.exists(self._path(content_hash))
+        }
+
+    def list_blobs(self, after=None, limit=100):
+        metas = []
+        prefixes = sorted(
+            name for name in os.listdir(self.root)
+            if len(name) == 2 and (after is None or name >= after[:2])
+        )
+        for prefix in prefixes:
+            names = sorted(
+                name for name in os.listdir(os.path.join(self.root, prefix))
+                if is_valid_hash(prefix + name) and (after is None or prefix + name > after)
+            )
+            for name in names:
+                meta = self.get_meta(prefix + name)
+                if meta:
+                    metas.append(meta)
+                if len(metas) >= limit:
+                    return metas
+        return metas
+
+    def delete(self, content_hash, created_before=None):
+        if not is_valid_hash(content_hash):
+            return False
+        path = self._path(content_hash)
+        if not os.path.exists(path):
+            return False
+        with self._locked(content_hash):
+            meta = self.get_meta(content_hash)
+            if not meta or meta["refcount"] > 0:
+                return False
+            if created_before is not None and meta["created_at"] >= created_before:
+                return False
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                return False
+            if os.path.exists(path + ".json"):
+                os.unlink(path + ".json")
+        return True
+
+    def add_refs(self, counts):
+        for content_hash, amount in counts.items():
+            self._update_meta(content_hash, lambda meta: meta.update(refcount=meta["refcount"] + amount))
+
+    def iter_range(self, meta, start=0, end=None):
+        blob = self.open(meta, start, end)
+        if blob is None:
+            return
+        try:
+            for data in blob:
+                yield data
+        finally:
+            blob.close()
+
+    def open(self, meta, start=0, end=None):
+        try:
+            return MappedBlob(self._path(meta["content_hash"]), start, end)
+        except FileNotFoundError:
+            return None
+
+
+class MongoBlobStore(BlobStore):
+    """
+    Blob store backed by the file_contents and chunks collections.
+
+    Small blobs are stored whole (compressed per codec) or as a delta
+    against base_hash; blobs of at least CHUNKING_MIN_SIZE are split into
+    shared, refcounted chunks. Each blob document is written with a single
+    upsert on the unique content_hash index, so a blob is stored at most
+    once however many commits race to add it.
+    """
+
+    def __init__(self, db_manager):
+        """
+        Initialize the store.
+
+        Args:
+            db_manager (DatabaseManager): Database manager owning the connection
+        """
+        self.db_manager = db_manager
+        self.blob_cache = BlobCache(DELTA_CACHE_BYTES)
+
+    def put(self, content_hash, stream, content_type=None, encoding=None, base_hash=None):
+        if not self.db_manager.connected:
+            return None
+
+        try:
+            # Known content is not read, compressed or written again
+            if content_hash is not None:
+                existing = self._touch(content_hash)
+                if existing:
+                    return {"content_hash": content_hash, "size": existing.get("size"), "created": False}
+
+            reader = HashingReader(stream, content_type, encoding)
+
+            # Read until the content turns out to be large enough to chunk
+            buffer = bytearray()
+            while True:
+                piece = reader.read(READ_SIZE)
+                if not piece:
+                    break
+                buffer += piece
+                if CHUNKING_ENABLED and len(buffer) >= CHUNKING_MIN_SIZE:
+                    break
+
+            raw = None
+            if CHUNKING_ENABLED and len(buffer) >= CHUNKING_MIN_SIZE:
+                doc = self._encode_chunked(buffer, reader, content_type)
+            else:
+                raw = bytes(buffer)
+                doc = None
+
+            digest = reader.hexdigest()
+            if content_hash is not None and digest != content_hash:
+                logger.warning(f"Content does not match its hash {content_hash}")
+                return None
+
+            if doc is None:
+                doc = self._encode_whole(digest, raw, content_type, base_hash)
+                if doc is None:
+                    # Already stored, found while looking up the delta base
+                    self._touch(digest)
+                    return {"content_hash": digest, "size": reader.size, "created": False}
+
+            doc.update({
+                "content_hash": digest,
+                "content_type": content_type,
+                "size": reader.size,
+                "encoding": reader.encoding(),
+                "refcount": 0
+            })
+            result = self.db_manager.get_collection("file_contents").update_one(
+                {"content_hash": digest},
+                {"$setOnInsert": doc, "$max": {"created_at": datetime.utcnow()}},
+                upsert=True
+            )
+            created = result.upserted_id is not None
+            if created and doc["storage"] == "chunked":
+                self._add_chunk_refs(doc["chunks"])
+            if raw is not None:
+                # The new content is the most likely base for the next commit
+                self.blob_cache.put(digest, raw)
+            return {"content_hash": digest, "size": reader.size, "created": created}
+        except Exception as e:
+            logger.error(f"Failed to store blob: {str(e)}")
+            return None
+
+    def put_many(self, blobs):
+        if not self.db_manager.connected:
+            return {}
+
+        stored = {}
+        docs = {}
+        for content_hash, raw, content_type in blobs:
+            if CHUNKING_ENABLED and len(raw) >= CHUNKING_MIN_SIZE:
+                result = self.put(content_hash, io.BytesIO(raw), content_type)
+                if result:
+                    stored[result["content_hash"]] = {"size": result["size"], "created": result["created"]}
+                continue
+
+            reader = HashingReader(io.BytesIO(raw), content_type)
+            reader.read()
+            if reader.hexdigest() != content_hash:
+                logger.warning(f"Content does not match its hash {content_hash}")
+                continue
+            doc = self._encode_whole(content_hash, raw, content_type, None)
+            doc.update({
+                "content_hash": content_hash,
+                "content_type": content_type,
+                "size": len(raw),
+                "encoding": reader.encoding(),
+                "refcount": 0
+            })
+            docs[content_hash] = doc
+
+        if docs:
+            try:
+                hashes = list(docs)
+                now = datetime.utcnow()
+                result = self.db_manager.get_collection("file_contents").bulk_write([
+                    UpdateOne(
+                        {"content_hash": content_hash},
+                        {"$setOnInsert": docs[content_hash], "$max": {"created_at": now}},
+                        upsert=True
+                    )
+                    for content_hash in hashes
+                ], ordered=False)
+                created = {hashes[index] for index in result.upserted_ids}
+                for content_hash in hashes:
+                    stored[content_hash] = {"size": docs[content_hash]["size"], "created": content_hash in created}
+            except Exception as e:
+                logger.error(f"Failed to store blobs: {str(e)}")
+        return stored
+
+    def _touch(self, content_hash):
+        """
+        Refresh the created_at of a blob that is stored again, in the same
+        step that finds it.
+
+        Returns:
+            dict: The blob's size, or None if it is not stored
+        """
+        return self.db_manager.get_collection("file_contents").find_one_and_update(
+            {"content_hash": content_hash},
+            {"$max": {"created_at": datetime.utcnow()}},
+            {"size": 1}
+        )
+
+    def _encode_chunked(self, buffer, reader, content_type):
+        """
+        Split the rest of a large stream into chunks and build the manifest
+        document.
+        """
+        def read_chunks():
+            chunker = StreamChunker()
+            for chunk in chunker.update(bytes(buffer)):
+                yield chunk
+            while True:
+                piece = reader.read(READ_SIZE)
+                if not piece:
+                    break
+                for chunk in chunker.update(piece):
+                    yield chunk
+            for chunk in chunker.flush():
+                yield chunk
+
+        chunk_hashes, chunk_sizes = self._store_chunks(read_chunks(), content_type)
+        return {
+            "storage": "chunked",
+            "chunks": chunk_hashes,
+            "chunk_sizes": chunk_sizes,
+            "chain_depth": 0,
+            "codec": CODEC_NONE
+        }
+
+    def _encode_whole(self, content_hash, raw, content_type, base_hash):
+        """
+        Build the document of a blob small enough to store in one piece,
+        delta-encoded against base_hash when that saves enough space.
+
+        Returns:
+            dict: Document fields, or None if the blob is already stored
+        """
+        if not (DELTA_STORAGE_ENABLED and base_hash) or not raw or base_hash == content_hash:
+            return self._keyframe(raw, content_type)
+
+        # One query tells whether the blob exists and how deep the base is
+        docs = {
+            doc["content_hash"]: doc
+            for doc in self.db_manager.get_collection("file_contents").find(
+                {"content_hash": {"$in": [content_hash, base_hash]}},
+                {"content_hash": 1, "chain_depth": 1}
+            )
+        }
+        if content_hash in docs:
+            return None
+        base_doc = docs.get(base_hash)
+        if not base_doc:
+            return self._keyframe(raw, content_type)
+
+        # Cap the chain length with periodic full keyframes
+        chain_depth = base_doc.get("chain_depth", 0) + 1
+        if chain_depth >= DELTA_KEYFRAME_INTERVAL:
+            return self._keyframe(raw, content_type)
+
+        base_raw = self._load_raw(base_hash)
+        if base_raw is None:
+            return self._keyframe(raw, content_type)
+
+        delta = create_delta(base_raw, raw, max_size=int(len(raw) * DELTA_MAX_RATIO))
+        if delta is None:
+            return self._keyframe(raw, content_type)
+
+        return {
+            "storage": "delta",
+            "base_hash": base_hash,
+            "delta": Binary(delta),
+            "chain_depth": chain_depth,
+            "codec": CODEC_NONE
+        }
+
+    def _keyframe(self, raw, content_type):
+        """
+        Build the document fields of a blob stored whole. Compression is
+        only paid for here, once a keyframe is actually written.
+        """
+        codec = choose_codec(content_type, raw)
+        return {
+            "storage": "full",
+            "content": Binary(compress(raw, codec)),
+            "codec": codec,
+            "chain_depth": 0
+        }
+
+    def get(self, content_hash):
+        if not self.db_manager.connected:
+            return None
+        return self._load_raw(content_hash)
+
+    def _load_raw(self, content_hash):
+        """
+        Load the raw bytes of a stored content, rebuilding delta chains.
+
+        Args:
+            content_hash (str): Content hash
+
+        Returns:
+            bytes: Raw content or None if the content or its chain is missing
+        """
+        file_contents = self.db_manager.get_collection("file_contents")
+
+        # Walk back until we reach a keyframe or a cached base
+        chain = []
+        raw = None
+        current_hash = content_hash
+        while raw is None:
+            raw = self.blob_cache.get(current_hash)
+            if raw is not None:
+                break
+
+            doc = file_contents.find_one(
+                {"content_hash": current_hash},
+                {"content": 1, "delta": 1, "base_hash": 1, "storage": 1, "codec": 1, "encoding": 1, "chunks": 1}
+            )
+            if not doc:
+                return None
+
+            if doc.get("storage") == "chunked":
+                try:
+                    raw = b"".join(self._iter_chunk_data(doc["chunks"]))
+                except KeyError as e:
+                    logger.error(f"Broken chunk manifest for {current_hash}: {str(e)}")
+                    return None
+                self.blob_cache.put(current_hash, raw)
+            elif doc.get("storage") == "delta":
+                chain.append((current_hash, doc["delta"]))
+                current_hash = doc["base_hash"]
+                if len(chain) > DELTA_KEYFRAME_INTERVAL * 2:
+                    logger.error(f"Delta chain too long for {content_hash}")
+                    return None
+            else:
+                raw = FileContent.from_dict(doc).get_raw()
+                self.blob_cache.put(current_hash, raw)
+
+        # Apply the deltas from the oldest base forward
+        for chain_hash, delta in reversed(chain):
+            try:
+                raw = apply_delta(raw, bytes(delta))
+            except ValueError as e:
+                logger.error(f"Corrupt delta for {chain_hash}: {str(e)}")
+                return None
+            self.blob_cache.put(chain_hash, raw)
+
+        return raw
+
+    def get_meta(self, content_hash):
+        if not self.db_manager.connected:
+            return None
+        return self.db_manager.get_collection("file_contents").find_one(
+            {"content_hash": content_hash},
+            {"content": 0, "delta": 0}
+        )
+
+    def get_many(self, content_hashes):
+        if not self.db_manager.connected:
+            return {}
+
+        found = {}
+        docs = self.db_manager.get_collection("file_contents").find(
+            {"content_hash": {"$in": list(content_hashes)}},
+            {"content_hash": 1, "content": 1, "codec": 1, "encoding": 1, "storage": 1}
+        )
+        for doc in docs:
+            if doc.get("storage") in ("delta", "chunked"):
+                raw = self._load_raw(doc["content_hash"])
+            else:
+                raw = FileContent.from_dict(doc).get_raw()
+            if raw is not None:
+                found[doc["content_hash"]] = raw
+        return found
+
+    def get_meta_many(self, content_hashes):
+        if not self.db_manager.connected:
+            return {}
+        return {
+            doc["content_hash"]: doc
+            for doc in self.db_manager.get_collection("file_contents").find(
+                {"content_hash": {"$in": list(content_hashes)}},
+                {"content": 0, "delta": 0}
+            )
+        }
+
+    def exists_many(self, content_hashes):
+        if not self.db_manager.connected:
+            return set()
+
+        present = set()
+        file_contents = self.db_manager.get_collection("file_contents")
+        unique_hashes = list(dict.fromkeys(content_hashes))
+        for i in range(0, len(unique_hashes), EXISTS_BATCH_SIZE):
+            present.update(
+                doc["content_hash"]
+                for doc in file_contents.find(
+                    {"content_hash": {"$in": unique_hashes[i:i + EXISTS_BATCH_SIZE]}},
+                    {"content_hash": 1}
+                )
+            )
+        return present
+
+    def list_blobs(self, after=None, limit=100):
+        if not self.db_manager.connected:
+            return []
+        query = {"content_hash": {"$gt": after}} if after is not None else {}
+        return list(self.db_manager.get_collection("file_contents").find(
+            query,
+            {"content_hash": 1, "size": 1, "created_at": 1, "storage": 1, "refcount": 1}
+        ).sort("content_hash", 1).limit(limit))
+
+    def delete(self, content_hash, created_before=None):
+        if not self.db_manager.connected:
+            return False
+
+        query = {"content_hash": content_hash, "refcount": {"$not": {"$gt": 0}}}
+        if created_before is not None:
+            query["created_at"] = {"$lt": created_before}
+        doc = self.db_manager.get_collection("file_contents").find_one_and_delete(
+            query,
+            {"storage": 1, "chunks": 1}
+        )
+        if not doc:
+            return False
+        self.blob_cache.discard(content_hash)
+
+        # The chunks are only released here: a put sharing them may have
+        # stored them without taking its references yet, so unused chunks
+        # are left to the chunk sweep and its grace period
+        if doc.get("storage") == "chunked":
+            self._add_chunk_refs(doc["chunks"], -1)
+        return True
+
+    def find_dependents(self, content_hashes):
+        if not self.db_manager.connected:
+            return set(content_hashes)
+        return {
+            doc["base_hash"]
+            for doc in self.db_manager.get_collection("file_contents").find(
+                {"base_hash": {"$in": list(content_hashes)}},
+                {"base_hash": 1}
+            )
+        }
+
+    def list_chunks(self, after=None, limit=100):
+        if not self.db_manager.connected:
+            return []
+        query = {"chunk_hash": {"$gt": after}} if after is not None else {}
+        return list(self.db_manager.get_collection("chunks").find(
+            query,
+            {"chunk_hash": 1, "size": 1, "refcount": 1, "created_at": 1}
+        ).sort("chunk_hash", 1).limit(limit))
+
+    def delete_chunks(self, chunk_hashes, created_before):
+        if not self.db_manager.connected or not chunk_hashes:
+            return 0
+
+        # Counts can drift, so chunks a manifest lists are kept regardless
+        used = set()
+        for doc in self.db_manager.get_collection("file_contents").find(
+            {"chunks": {"$in": list(chunk_hashes)}},
+            {"chunks": 1}
+        ):
+            used.update(doc["chunks"])
+        unused = [digest for digest in chunk_hashes if digest not in used]
+        if not unused:
+            return 0
+        return self.db_manager.get_collection("chunks").delete_many({
+            "chunk_hash": {"$in": unused},
+            "refcount": {"$not": {"$gt": 0}},
+            "created_at": {"$lt": created_before}
+        }).deleted_count
+
+    def add_refs(self, counts):
+        if not self.db_manager.connected:
+            return
+        operations = [
+            UpdateOne({"content_hash": content_hash}, {"$inc": {"refcount": amount}})
+            for content_hash, amount in counts.items() if amount
+        ]
+        if operations:
+            self.db_manager.get_collection("file_contents").bulk_write(operations, ordered=False)
+
+    def iter_range(self, meta, start=0, end=None):
+        """
+        Stream a byte range of a blob. Chunked blobs are read chunk by
+        chunk, so only the chunks overlapping the range are fetched.
+        """
+        if meta.get("storage") != "chunked":
+            raw = self._load_raw(meta["content_hash"]) or b""
+            yield raw[start:end]
+            return
+
+        if end is None:
+            end = sum(meta["chunk_sizes"])
+
+        selected = []
+        offset = 0
+        for digest, size in zip(meta["chunks"], meta["chunk_sizes"]):
+            if offset + size > start and offset < end:
+                selected.append((digest, offset))
+            offset += size
+            if offset >= end:
+                break
+
+        chunk_data = self._iter_chunk_data([digest for digest, _ in selected])
+        for (_, chunk_offset), data in zip(selected, chunk_data):
+            yield data[max(start - chunk_offset, 0):min(end - chunk_offset, len(data))]
+
+    # Chunk store operations
+    def _store_chunks(self, chunks, content_type=None):
+        """
+        Store chunks in the shared chunk store, skipping ones that already exist.
+        Reference counts are not changed; see _add_chunk_refs.
+
+        Args:
+            chunks (iterable): Chunk contents in order
+            content_type (str, optional): MIME type of the whole content
+
+        Returns:
+            tuple: (list of chunk hashes, list of chunk sizes)
+        """
+        hashes, sizes, pending = [], [], []
+
+        for chunk in chunks:
+            digest = chunk_hash(chunk)
+            hashes.append(digest)
+            sizes.append(len(chunk))
+            pending.append((digest, chunk))
+            if len(pending) >= CHUNK_BATCH_SIZE:
+                self._write_chunks(pending, content_type)
+                pending = []
+
+        if pending:
+            self._write_chunks(pending, content_type)
+        return hashes, sizes
+
+    def _write_chunks(self, pending, content_type=None):
+        """
+        Write a batch of chunks. Chunks already stored are only touched, so
+        they are not compressed again.
+        """
+        chunk_store = self.db_manager.get_collection("chunks")
+        existing = {
+            doc["chunk_hash"]
+            for doc in chunk_store.find(
+                {"chunk_hash": {"$in": [digest for digest, _ in pending]}},
+                {"chunk_hash": 1}
+            )
+        }
+        if existing:
+            touched = chunk_store.update_many(
+                {"chunk_hash": {"$in": list(existing)}},
+                {"$max": {"created_at": datetime.utcnow()}}
+            )
+            # A chunk swept in between is written again in full
+            if touched.matched_count < len(existing):
+                existing = set()
+        operations = [
+            self._chunk_upsert(digest, chunk, content_type)
+            for digest, chunk in pending if digest not in existing
+        ]
+        if operations:
+            chunk_store.bulk_write(operations, ordered=False)
+
+    def _chunk_upsert(self, digest, chunk, content_type=None):
+        """
+        Build an upsert that inserts a chunk only if it is not stored yet.
+        """
+        codec = choose_codec(content_type, chunk)
+        return UpdateOne(
+            {"chunk_hash": digest},
+            {
+                "$setOnInsert": {
+                    "chunk_hash": digest,
+                    "data": Binary(compress(bytes(chunk), codec)),
+                    "codec": codec,
+                    "size": len(chunk),
+                    "refcount": 0
+                },
+                # Uploading a chunk again restarts its grace period
+                "$max": {"created_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+
+    def _add_chunk_refs(self, chunk_hashes, amount=1):
+        """
+        Adjust the reference counts of chunks used by a content manifest.
+
+        Args:
+            chunk_hashes (list): Chunk hashes of the manifest
+            amount (int, optional): Amount to add per reference
+        """
+        counts = Counter(chunk_hashes)
+        if not counts:
+            return
+        self.db_manager.get_collection("chunks").bulk_write([
+            UpdateOne({"chunk_hash": digest}, {"$inc": {"refcount": count * amount}})
+            for digest, count in counts.items()
+        ], ordered=False)
+
+    def _iter_chunk_data(self, chunk_hashes):
+        """
+        Read chunks in order, fetching them in batches.
+
+        Args:
+            chunk_hashes (list): Chunk hashes in content order
+
+        Yields:
+            bytes: Decompressed chunk contents
+        """
+        chunk_store = self.db_manager.get_collection("chunks")
+        for i in range(0, len(chunk_hashes), CHUNK_BATCH_SIZE):
+            batch = chunk_hashes[i:i + CHUNK_BATCH_SIZE]
+            found = {
+                doc["chunk_hash"]: doc
+                for doc in chunk_store.find(
+                    {"chunk_hash": {"$in": batch}},
+                    {"chunk_hash": 1, "data": 1, "codec": 1}
+                )
+            }
+            for digest in batch:
+                doc = found.get(digest)
+                if doc is None:
+                    raise KeyError(f"Missing chunk {digest}")
+                yield decompress(bytes(doc["data"]), doc.get("codec"))
+
+    def missing_chunks(self, chunk_hashes):
+        if not self.db_manager.connected:
+            return list(chunk_hashes)
+
+        present = set()
+        chunk_store = self.db_manager.get_collection("chunks")
+        unique_hashes = list(dict.fromkeys(chunk_hashes))
+        for i in range(0, len(unique_hashes), EXISTS_BATCH_SIZE):
+            present.update(
+                doc["chunk_hash"]
+                for doc in chunk_store.find(
+                    {"chunk_hash": {"$in": unique_hashes[i:i + EXISTS_BATCH_SIZE]}},
+                    {"chunk_hash": 1}
+                )
+            )
+        return [digest for digest in unique_hashes if digest not in present]
+
+    def put_chunk(self, digest, data):
+        if not self.db_manager.connected:
+            return False
+
+        if chunk_hash(data) != digest:
+            logger.warning(f"Chunk hash mismatch for {digest}")
+            return False
+
+        try:
+            self.db_manager.get_collection("chunks").bulk_write([self._chunk_upsert(digest, data)])
+            return True
+        except Exception as e:
+            logger.error(f"Failed to store chunk: {str(e)}")
+            return False
+
+    def put_chunked(self, content_hash, chunk_hashes, content_type):
+        if not self.db_manager.connected:
+            return False
+
+        created = False
+        try:
+            # Referenced chunks are never swept, so the references are taken
+            # before the chunks are read; they are released again unless a
+            # new manifest ends up using them
+            self._add_chunk_refs(chunk_hashes)
+
+            # Verified even if the blob exists, so knowing a hash is not
+            # enough to commit its content
+            hasher = hashlib.sha256()
+            chunk_sizes = []
+            for data in self._iter_chunk_data(chunk_hashes):
+                hasher.update(data)
+                chunk_sizes.append(len(data))
+            if hasher.hexdigest() != content_hash:
+                logger.warning(f"Chunk manifest does not match content hash {content_hash}")
+                return False
+
+            result = self.db_manager.get_collection("file_contents").update_one(
+                {"content_hash": content_hash},
+                {
+                    "$setOnInsert": {
+                        "content_hash": content_hash,
+                        "content_type": content_type,
+                        "size": sum(chunk_sizes),
+                        "codec": CODEC_NONE,
+                        "encoding": None,
+                        "storage": "chunked",
+                        "chunks": list(chunk_hashes),
+                        "chunk_sizes": chunk_sizes,
+                        "chain_depth": 0,
+                        "refcount": 0
+                    },
+                    "$max": {"created_at": datetime.utcnow()}
+                },
+                upsert=True
+            )
+            created = result.upserted_id is not None
+            return True
+        except KeyError as e:
+            logger.warning(f"Failed to create chunked content: {str(e)}")
+            return False
+        except Exception as e:
+            logger.error(f"Failed to create chunked content: {str(e)}")
+            return False
+        finally:
+            if not created:
+                self._add_chunk_refs(chunk_hashes, -1)
+
+
+class MirroredBlobStore(BlobStore):
+    """
+    Blob store that writes through to a local mirror of the primary store.
+    New blobs are written to the mirror first and copied from it into the
+    primary, and content reads are served from the mirror, which is filled
+    from the primary on a miss. Metadata lookups never copy content; on a
+    mirror miss they return the primary's metadata. The primary stays
+    authoritative for existence checks and the chunk upload protocol.
+    """
+
+    def __init__(self, primary, mirror):
+        """
+        Initialize the store.
+
+        Args:
+            primary (BlobStore): Authoritative store
+            mirror (FilesystemBlobStore): Local mirror serving the reads
+        """
+        self.primary = primary
+        self.mirror = mirror
+
+    def put(self, content_hash, stream, content_type=None, encoding=None, base_hash=None):
+        mirrored = self.mirror.put(content_hash, stream, content_type, encoding)
+        if not mirrored:
+            return None
+        meta = self.mirror.get_meta(mirrored["content_hash"])
+        blob = self.mirror.open(meta)
+        try:
+            return self.primary.put(
+                mirrored["content_hash"], blob, content_type, meta.get("encoding"), base_hash
+            )
+        finally:
+            blob.close()
+
+    def put_many(self, blobs):
+        blobs = [blob for blob in blobs if blob[0] in self.mirror.put_many(blobs)]
+        return self.primary.put_many(blobs)
+
+    def _fill(self, content_hash, primary_meta=None):
+        """
+        Copy a blob from the primary into the mirror.
+
+        Args:
+            content_hash (str): Content hash
+            primary_meta (dict, optional): Primary metadata, looked up if None
+
+        Returns:
+            bool: True if the mirror has the blob afterwards
+        """
+        primary_meta = primary_meta or self.primary.get_meta(content_hash)
+        if not primary_meta:
+            return False
+        stored = self.mirror.put(
+            content_hash,
+            IterStream(self.primary.iter_range(primary_meta)),
+            primary_meta.get("content_type"),
+            primary_meta.get("encoding")
+        )
+        return stored is not None
+
+    def _mirrored(self, meta):
+        """
+        Make sure a blob is in the mirror before its content is read.
+
+        Returns:
+            bool: True if the content can be read from the mirror
+        """
+        return self.mirror.exists(meta["content_hash"]) or self._fill(meta["content_hash"], meta)
+
+    def get(self, content_hash):
+        raw = self.mirror.get(content_hash)
+        if raw is None and self._fill(content_hash):
+            raw = self.mirror.get(content_hash)
+        return raw if raw is not None else self.primary.get(content_hash)
+
+    def exists_many(self, content_hashes):
+        return self.primary.exists_many(content_hashes)
+
+    def iter_range(self, meta, start=0, end=None):
+        if self._mirrored(meta):
+            return self.mirror.iter_range(meta, start, end)
+        return self.primary.iter_range(meta, start, end)
+
+    def open(self, meta, start=0, end=None):
+        if self._mirrored(meta):
+            return self.mirror.open(meta, start, end)
+        return None
+
+    def list_blobs(self, after=None, limit=100):
+        return self.primary.list_blobs(after, limit)
+
+    def delete(self, content_hash, created_before=None):
+        if not self.primary.delete(content_hash, created_before):
+            return False
+        self.mirror.delete(content_hash)
+        return True
+
+    def find_dependents(self, content_hashes):
+        return self.primary.find_dependents(content_hashes)
+
+    def list_chunks(self, after=None, limit=100):
+        return self.primary.list_chunks(after, limit)
+
+    def delete_chunks(self, chunk_hashes, created_before):
+        return self.primary.delete_chunks(chunk_hashes, created_before)
+
+    def add_refs(self, counts):
+        self.primary.add_refs(counts)
+
+    def get_meta(self, content_hash):
+        meta = self.mirror.get_meta(content_hash)
+        if meta is None:
+            return self.primary.get_meta(content_hash)
+        # Reference counts are only maintained in the primary
+        meta.pop("refcount", None)
+        return meta
+
+    def get_meta_many(self, content_hashes):
+        return self.primary.get_meta_many(content_hashes)
+
+    def missing_chunks(self, chunk_hashes):
+        return self.primary.missing_chunks(chunk_hashes)
+
+    def put_chunk(self, digest, data):
+        return self.primary.put_chunk(digest, data)
+
+    def put_chunked(self, content_hash, chunk_hashes, content_type):
+        return self.primary.put_chunked(content_hash, chunk_hashes, content_type)
+
+
+def create_blob_store(db_manager, backend=None):
+    """
+    Create the blob store configured by BLOB_STORE_BACKEND.
+
+    Args:
+        db_manager (DatabaseManager): Database manager for the mongo backend
+        backend (str, optional): Backend name, overrides BLOB_STORE_BACKEND
+
+    Returns:
+        BlobStore: The blob store
+    """
+    backend = backend or BLOB_STORE_BACKEND
+    if backend == "filesystem":
+        return FilesystemBlobStore(BLOB_STORE_PATH)
+    if backend == "memory":
+        return MemoryBlobStore()
+    if backend == "mirror":
+        return MirroredBlobStore(MongoBlobStore(db_manager), FilesystemBlobStore(BLOB_STORE_PATH))
+    if backend != "mongo":
+        raise ValueError(f"Unknown blob store backend: {backend}")
+    return MongoBlobStore(db_manager)
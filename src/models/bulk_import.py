@@ -0,0 +1,511 @@
+"""
+Parallel bulk import of a directory tree or a bare git repository into a
+workspace.
+
+Files are hashed in a process pool. The resulting hashes are checked
+against the blob store in one batched query, only the missing blobs are
+uploaded (small ones with one bulk write per batch), and every changed
+file becomes a version of a single workspace commit. Files whose content
+equals their current head are skipped. Progress is logged as files/sec
+and bytes/sec.
+
+Imports started through the API run as background jobs: start_import
+records the job in import_jobs and returns its ID right away, and the job
+document is updated with the statistics or the failure once the import
+ends.
+
+Usage:
+    python -m src.models.bulk_import <workspace_id> <path> <author_id> [message]
+"""
+import os
+import sys
+import time
+import codecs
+import hashlib
+import logging
+import mimetypes
+import threading
+import multiprocessing
+import subprocess
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from bson import ObjectId
+from src.models.blobstore import READ_SIZE, IterStream
+from src.models.search import load_batches
+from src.models.version import Version
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Import configuration
+IMPORT_ROOT = os.getenv('IMPORT_ROOT')  # directory the API may import from; API imports are off if unset
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', os.cpu_count() or 1))
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 256))  # blobs per bulk write
+IMPORT_BATCH_BYTES = int(os.getenv('IMPORT_BATCH_BYTES', 16 * 1024 * 1024))  # and at most this much content
+IMPORT_INLINE_MAX_SIZE = 1024 * 1024  # larger blobs are streamed into the store one by one
+IMPORT_PROGRESS_INTERVAL = 2.0  # seconds between progress log lines
+
+# git ls-tree modes of entries that are not regular files
+_GIT_SKIPPED_MODES = {"120000", "160000"}
+
+
+def is_bare_repository(path):
+    """
+    Check whether a directory is a bare git repository.
+
+    Args:
+        path (str): Directory path
+
+    Returns:
+        bool: True if the directory has HEAD, objects and refs
+    """
+    return (os.path.isfile(os.path.join(path, "HEAD"))
+            and os.path.isdir(os.path.join(path, "objects"))
+            and os.path.isdir(os.path.join(path, "refs")))
+
+
+def iter_directory(root):
+    """
+    List the regular files below a directory, skipping .git and symlinks.
+
+    Args:
+        root (str): Directory path
+
+    Yields:
+        tuple: (workspace file path, source) where source is the file path on disk
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if name != ".git")
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            yield os.path.relpath(path, root).replace(os.sep, "/"), path
+
+
+def is_valid_ref(ref):
+    """
+    Check that a git ref from a request cannot be taken for an option.
+
+    Args:
+        ref (str): Branch, tag or commit to import
+
+    Returns:
+        bool: True if the ref is a non-empty string not starting with "-"
+    """
+    return isinstance(ref, str) and bool(ref) and not ref.startswith("-") and "\0" not in ref
+
+
+def iter_git_tree(git_dir, ref="HEAD"):
+    """
+    List the files of a commit of a git repository.
+
+    Args:
+        git_dir (str): Path of the (bare) repository
+        ref (str, optional): Commit to list
+
+    Yields:
+        tuple: (workspace file path, source) where source is (git_dir, object id)
+
+    Raises:
+        ValueError: If the ref could be taken for an option
+    """
+    if not is_valid_ref(ref):
+        raise ValueError(f"Invalid ref: {ref!r}")
+    listing = subprocess.run(
+        ["git", "--git-dir", git_dir, "ls-tree", "-r", "-z", "--full-tree", ref],
+        capture_output=True, check=True
+    ).stdout
+    for record in listing.split(b"\0"):
+        if not record:
+            continue
+        info, path = record.split(b"\t", 1)
+        mode, object_type, object_id = info.decode().split()
+        if object_type != "blob" or mode in _GIT_SKIPPED_MODES:
+            continue
+        yield path.decode("utf-8", "surrogateescape"), (git_dir, object_id)
+
+
+def iter_source(source):
+    """
+    Read the content of a file or git blob piece by piece.
+
+    Args:
+        source: File path, or (git_dir, object id) tuple
+
+    Yields:
+        bytes: Consecutive pieces of the content
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            while True:
+                piece = f.read(READ_SIZE)
+                if not piece:
+                    return
+                yield piece
+
+    git_dir, object_id = source
+    process = subprocess.Popen(
+        ["git", "--git-dir", git_dir, "cat-file", "blob", object_id],
+        stdout=subprocess.PIPE
+    )
+    try:
+        while True:
+            piece = process.stdout.read(READ_SIZE)
+            if not piece:
+                break
+            yield piece
+    finally:
+        process.stdout.close()
+        if process.wait() != 0:
+            raise OSError(f"git cat-file failed for {object_id}")
+
+
+def hash_source(source):
+    """
+    Hash a file or git blob. Runs in the worker processes.
+
+    Args:
+        source: File path, or (git_dir, object id) tuple
+
+    Returns:
+        tuple: (SHA-256 hex digest, size in bytes, whether it is UTF-8 text)
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    text = True
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for piece in iter_source(source):
+        hasher.update(piece)
+        size += len(piece)
+        if text:
+            try:
+                decoder.decode(piece)
+            except UnicodeDecodeError:
+                text = False
+    if text:
+        try:
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            text = False
+    return hasher.hexdigest(), size, text
+
+
+def _content_type(file_path, text):
+    """
+    Guess the MIME type of an imported file from its name, falling back to
+    plain text or binary.
+    """
+    guessed = mimetypes.guess_type(file_path)[0]
+    if guessed:
+        return guessed
+    return "text/plain" if text else "application/octet-stream"
+
+
+def resolve_import_path(path, root=None):
+    """
+    Resolve a path requested through the API inside IMPORT_ROOT.
+
+    Args:
+        path (str): Path relative to the import root
+        root (str, optional): Import root, defaults to IMPORT_ROOT
+
+    Returns:
+        str: Absolute path, or None if imports are disabled or the path
+            leaves the import root
+    """
+    root = root or IMPORT_ROOT
+    if not root:
+        return None
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root or not os.path.isdir(resolved):
+        return None
+    return resolved
+
+
+class _Progress:
+    """
+    Logs files/sec and bytes/sec of one import phase at most every
+    IMPORT_PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.started = time.monotonic()
+        self.logged = self.started
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, files, size):
+        self.files += files
+        self.bytes += size
+        now = time.monotonic()
+        if now - self.logged >= IMPORT_PROGRESS_INTERVAL:
+            self.logged = now
+            self.log()
+
+    def rates(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return self.files / elapsed, self.bytes / elapsed
+
+    def log(self):
+        files_per_second, bytes_per_second = self.rates()
+        logger.info(f"Import {self.phase}: {self.files} files, {self.bytes} bytes "
+                    f"({files_per_second:.1f} files/s, {bytes_per_second / 1e6:.2f} MB/s)")
+
+
+class BulkImporter:
+    """
+    Imports a directory tree or bare git repository as one commit.
+    """
+
+    def __init__(self, db_manager, workers=IMPORT_WORKERS, batch_size=IMPORT_BATCH_SIZE,
+                 batch_bytes=IMPORT_BATCH_BYTES):
+        """
+        Initialize the importer.
+
+        Args:
+            db_manager (DatabaseManager): Connected database manager
+            workers (int, optional): Hashing processes
+            batch_size (int, optional): Blobs per bulk write
+            batch_bytes (int, optional): Content bytes per bulk write
+        """
+        self.db_manager = db_manager
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+
+    def run(self, workspace_id, path, author_id, message=None, ref="HEAD"):
+        """
+        Import the files below path into a workspace.
+
+        Args:
+            workspace_id (str): Workspace ID
+            path (str): Directory or bare git repository
+            author_id (str): User ID recorded as the author
+            message (str, optional): Commit message
+            ref (str, optional): Commit to import from a git repository
+
+        Returns:
+            dict: Import statistics with the commit_id (None if nothing
+                changed), or None if the import failed
+        """
+        if not self.db_manager.connected:
+            return None
+
+        started = time.monotonic()
+        try:
+            if is_bare_repository(path):
+                entries = list(iter_git_tree(path, ref))
+            else:
+                entries = list(iter_directory(path))
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            logger.error(f"Failed to list {path}: {str(e)}")
+            return None
+
+        try:
+            hashed = self._hash_entries(entries)
+            heads = {
+                head["file_path"]: head
+                for head in self.db_manager.list_file_heads(workspace_id)
+            }
+            changed = [
+                item for item in hashed
+                if heads.get(item["file_path"], {}).get("content_hash") != item["content_hash"]
+            ]
+            new_blobs = self._upload_missing(changed)
+        except Exception as e:
+            logger.error(f"Failed to import {path}: {str(e)}")
+            return None
+
+        commit_id = None
+        if changed:
+            message = message or f"Import {os.path.basename(os.path.normpath(path))}"
+            changes = []
+            for item in changed:
+                head = heads.get(item["file_path"])
+                version = Version(
+                    workspace_id=workspace_id,
+                    file_path=item["file_path"],
+                    content_hash=item["content_hash"],
+                    author_id=author_id,
+                    message=message,
+                    parent_version_id=head["head_version_id"] if head else None
+                )
+                changes.append((version.to_dict(), None))
+            commit_id = self.db_manager.create_commit(workspace_id, author_id, message, changes)
+            if not commit_id:
+                return None
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        total_bytes = sum(item["size"] for item in hashed)
+        stats = {
+            "commit_id": commit_id,
+            "files": len(hashed),
+            "changed": len(changed),
+            "new_blobs": new_blobs,
+            "bytes": total_bytes,
+            "seconds": round(elapsed, 3),
+            "files_per_second": round(len(hashed) / elapsed, 1),
+            "bytes_per_second": round(total_bytes / elapsed)
+        }
+        logger.info(f"Import of {path} finished: {stats}")
+        return stats
+
+    def _hash_entries(self, entries):
+        """
+        Hash all entries in the process pool.
+
+        Returns:
+            list: Dicts with file_path, source, content_hash, size and content_type
+        """
+        progress = _Progress("hashing")
+        hashed = []
+        sources = [source for _, source in entries]
+        # Spawn rather than fork: imports run in a thread of a multithreaded
+        # web worker, and a forked child can inherit locks held by other
+        # threads (the MongoClient's among them) and deadlock
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            results = pool.map(hash_source, sources, chunksize=max(1, len(sources) // (self.workers * 8)))
+            for (file_path, source), (content_hash, size, text) in zip(entries, results):
+                hashed.append({
+                    "file_path": file_path,
+                    "source": source,
+                    "content_hash": content_hash,
+                    "size": size,
+                    "content_type": _content_type(file_path, text)
+                })
+                progress.add(1, size)
+        progress.log()
+        return hashed
+
+    def _upload_missing(self, items):
+        """
+        Upload the blobs the store does not have yet. Small blobs go in bulk
+        writes of at most batch_size blobs and batch_bytes bytes, large ones
+        are streamed.
+
+        Returns:
+            int: Number of blobs created
+        """
+        unique = {}
+        for item in items:
+            unique.setdefault(item["content_hash"], item)
+        present = self.db_manager.blob_store.exists_many(list(unique))
+        missing = [item for content_hash, item in unique.items() if content_hash not in present]
+
+        progress = _Progress("upload")
+        created = 0
+        small = []
+        for item in missing:
+            if item["size"] <= IMPORT_INLINE_MAX_SIZE:
+                small.append(item)
+                continue
+            stored = self.db_manager.blob_store.put(
+                item["content_hash"], IterStream(iter_source(item["source"])), item["content_type"]
+            )
+            if not stored:
+                raise ValueError(f"Failed to store {item['file_path']}")
+            created += stored["created"]
+            progress.add(1, item["size"])
+
+        sizes = [item["size"] for item in small]
+        for batch in load_batches(small, sizes, self.batch_size, self.batch_bytes):
+            created += self._put_batch(batch)
+            progress.add(len(batch), sum(entry["size"] for entry in batch))
+        progress.log()
+        return created
+
+    def _put_batch(self, batch):
+        """
+        Store a batch of small blobs with one bulk write.
+        """
+        stored = self.db_manager.blob_store.put_many([
+            (item["content_hash"], b"".join(iter_source(item["source"])), item["content_type"])
+            for item in batch
+        ])
+        for item in batch:
+            if item["content_hash"] not in stored:
+                raise ValueError(f"Failed to store {item['file_path']}")
+        return sum(1 for result in stored.values() if result["created"])
+
+
+def start_import(db_manager, workspace_id, path, author_id, message=None, ref="HEAD"):
+    """
+    Run an import in a background thread, tracked by a job document.
+
+    Args:
+        db_manager (DatabaseManager): Connected database manager
+        workspace_id (str): Workspace ID
+        path (str): Directory or bare git repository
+        author_id (str): User ID recorded as the author
+        message (str, optional): Commit message
+        ref (str, optional): Commit to import from a git repository
+
+    Returns:
+        str: Job ID, or None if the job could not be recorded
+    """
+    jobs = db_manager.get_collection("import_jobs")
+    if jobs is None:
+        return None
+
+    job_id = jobs.insert_one({
+        "workspace_id": workspace_id,
+        "author_id": author_id,
+        "status": "running",
+        "created_at": datetime.utcnow(),
+        "finished_at": None,
+        "stats": None
+    }).inserted_id
+
+    def run_job():
+        try:
+            stats = BulkImporter(db_manager).run(workspace_id, path, author_id, message, ref)
+        except Exception as e:
+            logger.error(f"Import job {job_id} failed: {str(e)}")
+            stats = None
+        jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "finished" if stats else "failed",
+            "finished_at": datetime.utcnow(),
+            "stats": stats
+        }})
+
+    threading.Thread(target=run_job, name=f"import-{job_id}", daemon=True).start()
+    return str(job_id)
+
+
+def get_import_job(db_manager, job_id):
+    """
+    Get the job document of an import.
+
+    Args:
+        db_manager (DatabaseManager): Connected database manager
+        job_id (str): Job ID from start_import
+
+    Returns:
+        dict: Job document, or None if not found
+    """
+    jobs = db_manager.get_collection("import_jobs")
+    if jobs is None or not ObjectId.is_valid(job_id):
+        return None
+    return jobs.find_one({"_id": ObjectId(job_id)})
+
+
+if __name__ == "__main__":
+    from src.models.database import db_manager
+
+    if len(sys.argv) < 4:
+        print(__doc__)
+        sys.exit(2)
+
+    if not db_manager.connect():
+        sys.exit(1)
+
+    result = BulkImporter(db_manager).run(
+        sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None
+    )
+    print(result)
+    sys.exit(0 if result else 1)
@@ -0,0 +1,240 @@
+"""
+Content-defined chunking for file content deduplication.
+
+Implements a FastCDC-style chunker: a gear rolling hash picks cut points
+from the content itself, so inserting or removing bytes only changes the
+chunks around the edit and every other chunk keeps its SHA-256 address.
+
+The cut test only looks at the low bits of the hash, which depend on the
+last 18 bytes alone, so with numpy the hash is computed for a whole block
+of positions at once as a sum of 18 shifted gear values. Without numpy the
+same cut points are found one byte at a time.
+
+Usage:
+    python -m src.models.chunking [megabytes]   # measure chunking throughput
+"""
+import os
+import sys
+import time
+import hashlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Chunk size configuration (bytes)
+MIN_CHUNK_SIZE = 16 * 1024
+AVG_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+
+# Normalized chunking: a stricter mask before the average size and a looser
+# one after it keeps chunk sizes close to the average
+_MASK_S = (1 << 18) - 1  # 18 bits, harder to match
+_MASK_L = (1 << 14) - 1  # 14 bits, easier to match
+_HASH_MASK = (1 << 64) - 1
+
+# Gear table derived from SHA-256 so cut points are stable across processes
+_GEAR = [
+    int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "big")
+    for i in range(256)
+]
+
+# Bytes that reach the bits under _MASK_S; older ones are shifted past them
+_WINDOW = 18
+
+# Positions hashed per numpy pass, small enough to stay in cache
+_SCAN_BLOCK = 16384
+
+if numpy is not None:
+    # Low bits of the gear table; uint32 wraparound keeps them exact
+    _GEAR_LOW = numpy.array([value & _MASK_S for value in _GEAR], dtype=numpy.uint32)
+
+
+def find_cut_point(data, start=0, end=None):
+    """
+    Find the end of the chunk starting at start.
+
+    Args:
+        data (bytes): Buffer to scan
+        start (int, optional): Offset of the chunk start
+        end (int, optional): Offset of the end of available data
+
+    Returns:
+        int: Offset just past the chunk, or None if no cut point was found
+            before end and end is less than MAX_CHUNK_SIZE past start
+    """
+    if end is None:
+        end = len(data)
+    length = end - start
+    if length <= MIN_CHUNK_SIZE:
+        return None
+
+    normal = start + min(AVG_CHUNK_SIZE, length)
+    limit = start + min(MAX_CHUNK_SIZE, length)
+    if numpy is not None:
+        cut = _find_mask_match(data, start + MIN_CHUNK_SIZE, start + MIN_CHUNK_SIZE, normal, _MASK_S)
+        if cut is None:
+            cut = _find_mask_match(data, start + MIN_CHUNK_SIZE, normal, limit, _MASK_L)
+    else:
+        cut = _find_cut_point_python(data, start, normal, limit)
+    if cut is not None:
+        return cut
+
+    if limit - start >= MAX_CHUNK_SIZE:
+        return limit
+    return None
+
+
+def _find_mask_match(data, hash_start, lo, hi, mask):
+    """
+    Find the first position in [lo, hi) after which the gear hash started
+    at hash_start has no bits of mask set.
+
+    Returns:
+        int: Offset just past the matching byte, or None
+    """
+    view = numpy.frombuffer(data, dtype=numpy.uint8, count=hi)
+    for block in range(lo, hi, _SCAN_BLOCK):
+        count = min(_SCAN_BLOCK, hi - block)
+
+        # Gear values of the block and the window before it, bytes before
+        # the hash start counting as zero
+        first = max(hash_start, block - _WINDOW + 1)
+        gear = numpy.zeros(count + _WINDOW - 1, dtype=numpy.uint32)
+        gear[first - block + _WINDOW - 1:] = _GEAR_LOW[view[first:block + count]]
+
+        # h[p] = sum of gear[p - k] << k for k < 18, built by doubling:
+        # each sum covers twice the window of the one before
+        sum2 = gear[1:] + (gear[:-1] << 1)
+        sum4 = sum2[2:] + (sum2[:-2] << 2)
+        sum8 = sum4[4:] + (sum4[:-4] << 4)
+        sum16 = sum8[8:] + (sum8[:-8] << 8)
+        h = sum16[2:] + (sum2[:count] << 16)
+
+        matches = numpy.flatnonzero((h & mask) == 0)
+        if len(matches):
+            return block + int(matches[0]) + 1
+    return None
+
+
+def _find_cut_point_python(data, start, normal, limit):
+    """
+    Find the first cut point between the minimum chunk size and limit one
+    byte at a time.
+
+    Returns:
+        int: Offset just past the chunk, or None
+    """
+    gear = _GEAR
+    h = 0
+
+    pos = start + MIN_CHUNK_SIZE
+    while pos < normal:
+        h = ((h << 1) + gear[data[pos]]) & _HASH_MASK
+        pos += 1
+        if not h & _MASK_S:
+            return pos
+    while pos < limit:
+        h = ((h << 1) + gear[data[pos]]) & _HASH_MASK
+        pos += 1
+        if not h & _MASK_L:
+            return pos
+    return None
+
+
+def iter_chunks(data):
+    """
+    Split content into content-defined chunks.
+
+    Args:
+        data (bytes): Content to split
+
+    Yields:
+        bytes: Consecutive chunks of the content
+    """
+    start = 0
+    while start < len(data):
+        cut = find_cut_point(data, start) or len(data)
+        yield data[start:cut]
+        start = cut
+
+
+def chunk_hash(chunk):
+    """
+    Compute the address of a chunk.
+
+    Args:
+        chunk (bytes): Chunk content
+
+    Returns:
+        str: Hex SHA-256 of the chunk
+    """
+    return hashlib.sha256(chunk).hexdigest()
+
+
+class StreamChunker:
+    """
+    Incremental chunker for content that arrives in pieces.
+    Holds at most MAX_CHUNK_SIZE plus one input piece in memory.
+    """
+
+    def __init__(self):
+        """
+        Initialize a new StreamChunker.
+        """
+        self._buffer = bytearray()
+
+    def update(self, data):
+        """
+        Feed more content into the chunker.
+
+        Args:
+            data (bytes): Next piece of content
+
+        Returns:
+            list: Chunks completed by this piece
+        """
+        self._buffer += data
+        chunks = []
+        start = 0
+        # More data never moves a cut point, so wait for a full window
+        # rather than rescanning the same partial chunk on every piece
+        while len(self._buffer) - start >= MAX_CHUNK_SIZE:
+            cut = find_cut_point(self._buffer, start)
+            chunks.append(bytes(self._buffer[start:cut]))
+            start = cut
+        if start:
+            del self._buffer[:start]
+        return chunks
+
+    def flush(self):
+        """
+        Finish the stream.
+
+        Returns:
+            list: Remaining chunks
+        """
+        chunks = list(iter_chunks(bytes(self._buffer)))
+        self._buffer = bytearray()
+        return chunks
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    content = os.urandom(size * 1024 * 1024)
+
+    started = time.perf_counter()
+    count = sum(1 for _ in iter_chunks(content))
+    elapsed = time.perf_counter() - started
+    print(f"iter_chunks:   {size / elapsed:8.1f} MB/s, {count} chunks")
+
+    started = time.perf_counter()
+    chunker = StreamChunker()
+    count = 0
+    for i in range(0, len(content), 64 * 1024):
+        count += len(chunker.update(content[i:i + 64 * 1024]))
+    count += len(chunker.flush())
+    elapsed = time.perf_counter() - started
+    print(f"StreamChunker: {size / elapsed:8.1f} MB/s, {count} chunks")
+    print(f"numpy: {'yes' if numpy is not None else 'no'}")
@@ -0,0 +1,259 @@
+"""
+History compaction for files with long runs of versions, such as editor
+autosaves.
+
+Versions younger than the keep-all age are left alone. Older versions are
+grouped into hourly, then daily, then weekly buckets by age, and only the
+newest version of each bucket is kept as its checkpoint. The head of a
+file, as recorded in file_heads, is always kept. Deleted versions release
+their blob references, and kept versions whose parent was deleted are
+relinked to the nearest kept ancestor so ancestry queries stay intact.
+
+Usage:
+    python -m src.models.compaction                 # compact every workspace
+    python -m src.models.compaction <workspace_id>  # compact one workspace
+"""
+import os
+import sys
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from src.models.garbage_collector import Throttle
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Compaction configuration
+COMPACTION_KEEP_ALL_HOURS = int(os.getenv('COMPACTION_KEEP_ALL_HOURS', 24))  # every version younger than this is kept
+COMPACTION_HOURLY_DAYS = int(os.getenv('COMPACTION_HOURLY_DAYS', 7))  # then one version per hour up to this age
+COMPACTION_DAILY_DAYS = int(os.getenv('COMPACTION_DAILY_DAYS', 30))  # then one per day, older ones one per week
+COMPACTION_BATCH_SIZE = int(os.getenv('COMPACTION_BATCH_SIZE', 1000))
+COMPACTION_OPS_PER_SECOND = float(os.getenv('COMPACTION_OPS_PER_SECOND', 5000))
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+# Tiers of (maximum age, bucket length in seconds); None keeps every version
+DEFAULT_POLICY = [
+    (timedelta(hours=COMPACTION_KEEP_ALL_HOURS), None),
+    (timedelta(days=COMPACTION_HOURLY_DAYS), HOUR),
+    (timedelta(days=COMPACTION_DAILY_DAYS), DAY),
+    (None, WEEK)
+]
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def checkpoint_bucket(created_at, now, policy=None):
+    """
+    Find the compaction bucket a version falls into.
+
+    Args:
+        created_at (datetime): Creation time of the version
+        now (datetime): Time the compaction started
+        policy (list, optional): Tiers, defaults to DEFAULT_POLICY
+
+    Returns:
+        tuple: (tier index, bucket number), or None if the version is kept
+            unconditionally
+    """
+    policy = DEFAULT_POLICY if policy is None else policy
+    age = now - created_at
+    for tier, (max_age, bucket_seconds) in enumerate(policy):
+        if max_age is None or age < max_age:
+            if bucket_seconds is None:
+                return None
+            return tier, int((created_at - _EPOCH).total_seconds() // bucket_seconds)
+    return None
+
+
+def select_checkpoints(versions, head_version_id, now, policy=None):
+    """
+    Split the versions of a file into the ones compaction keeps and the
+    ones it deletes. The head is always kept, wherever its created_at
+    falls; without a head the newest version is kept in its place.
+
+    Args:
+        versions (iterable): Versions of one file, newest first
+        head_version_id (str): version_id the file head points at, or None
+        now (datetime): Reference time for version ages
+        policy (list, optional): Tiers, defaults to DEFAULT_POLICY
+
+    Returns:
+        tuple: (kept versions, deleted versions), both newest first
+    """
+    kept = []
+    deleted = []
+    seen_buckets = set()
+    for version_data in versions:
+        if head_version_id is None and not kept and not deleted:
+            bucket = None
+        elif version_data["version_id"] == head_version_id:
+            bucket = None
+        else:
+            bucket = checkpoint_bucket(version_data["created_at"], now, policy)
+        # Newest first, so the first version of a bucket is its checkpoint
+        if bucket is None or bucket not in seen_buckets:
+            if bucket is not None:
+                seen_buckets.add(bucket)
+            kept.append(version_data)
+        else:
+            deleted.append(version_data)
+    return kept, deleted
+
+
+class HistoryCompactor:
+    """
+    Squashes old versions of files into hourly, daily and weekly checkpoints.
+    """
+
+    def __init__(self, db_manager, policy=None, batch_size=COMPACTION_BATCH_SIZE,
+                 ops_per_second=COMPACTION_OPS_PER_SECOND):
+        """
+        Initialize the compactor.
+
+        Args:
+            db_manager (DatabaseManager): Connected database manager
+            policy (list, optional): Tiers, defaults to DEFAULT_POLICY
+            batch_size (int, optional): Versions deleted per round trip
+            ops_per_second (float, optional): Throttle rate
+        """
+        self.db_manager = db_manager
+        self.policy = DEFAULT_POLICY if policy is None else policy
+        self.batch_size = batch_size
+        self.throttle = Throttle(ops_per_second)
+
+    def compact_file(self, workspace_id, file_path, now=None):
+        """
+        Compact the history of one file.
+
+        Args:
+            workspace_id (str): Workspace ID
+            file_path (str): Path of the file
+            now (datetime, optional): Reference time for version ages
+
+        Returns:
+            dict: versions_scanned, versions_deleted and versions_relinked
+        """
+        now = now or datetime.utcnow()
+        versions = self.db_manager.get_collection("versions")
+
+        # The head is whatever file_heads points at; a commit racing on the
+        # head can leave it on a version that is not the newest by created_at
+        head = self.db_manager.get_file_head(workspace_id, file_path)
+        cursor = versions.find(
+            {"workspace_id": workspace_id, "file_path": file_path},
+            {"created_at": 1, "version_id": 1, "parent_version_id": 1, "content_hash": 1}
+        ).sort([("created_at", -1), ("_id", -1)]).batch_size(self.batch_size)
+
+        kept, deleted = select_checkpoints(cursor, head["head_version_id"] if head else None, now, self.policy)
+        scanned = len(kept) + len(deleted)
+        self.throttle.wait(scanned + 1)
+
+        stats = {"versions_scanned": scanned, "versions_deleted": 0, "versions_relinked": 0}
+        if not deleted:
+            return stats
+
+        # Point kept versions past their deleted parents
+        deleted_parents = {version_data["version_id"]: version_data.get("parent_version_id") for version_data in deleted}
+        relinks = []
+        for version_data in kept:
+            parent_id = version_data.get("parent_version_id")
+            if parent_id not in deleted_parents:
+                continue
+            hops = 0
+            while parent_id in deleted_parents and hops <= len(deleted_parents):
+                parent_id = deleted_parents[parent_id]
+                hops += 1
+            relinks.append(UpdateOne({"_id": version_data["_id"]}, {"$set": {"parent_version_id": parent_id}}))
+        if relinks:
+            versions.bulk_write(relinks, ordered=False)
+            stats["versions_relinked"] = len(relinks)
+
+        for i in range(0, len(deleted), self.batch_size):
+            batch = deleted[i:i + self.batch_size]
+            result = versions.delete_many({"_id": {"$in": [version_data["_id"] for version_data in batch]}})
+            refs = Counter(version_data["content_hash"] for version_data in batch)
+            self.db_manager.blob_store.add_refs({content_hash: -count for content_hash, count in refs.items()})
+            stats["versions_deleted"] += result.deleted_count
+            self.throttle.wait(len(batch) + len(refs))
+        return stats
+
+    def compact_workspace(self, workspace_id, now=None):
+        """
+        Compact the history of every file in a workspace.
+
+        Args:
+            workspace_id (str): Workspace ID
+            now (datetime, optional): Reference time for version ages
+
+        Returns:
+            dict: Summed per-file statistics and the number of files
+        """
+        now = now or datetime.utcnow()
+        stats = Counter()
+        for head in self.db_manager.list_file_heads(workspace_id):
+            stats.update(self.compact_file(workspace_id, head["file_path"], now))
+            stats["files"] += 1
+        return dict(stats)
+
+    def _collection_sizes(self):
+        """
+        Get the data and index size of the versions collection in bytes.
+        """
+        try:
+            info = self.db_manager.db.command("collStats", "versions")
+            return info.get("size", 0), info.get("totalIndexSize", 0)
+        except Exception:
+            return 0, 0
+
+    def run(self, workspace_id=None, file_path=None):
+        """
+        Compact one file, one workspace or every workspace, and report the
+        space reclaimed in the versions collection.
+
+        Args:
+            workspace_id (str, optional): Workspace ID, all workspaces if None
+            file_path (str, optional): Only compact this file of the workspace
+
+        Returns:
+            dict: Compaction statistics with bytes_reclaimed and
+                index_bytes_reclaimed, or None if not connected
+        """
+        if not self.db_manager.connected:
+            return None
+
+        now = datetime.utcnow()
+        size_before, index_size_before = self._collection_sizes()
+
+        if workspace_id:
+            workspace_ids = [workspace_id]
+        else:
+            workspace_ids = self.db_manager.get_collection("file_heads").distinct("workspace_id")
+
+        stats = Counter()
+        if workspace_id and file_path:
+            stats.update(self.compact_file(workspace_id, file_path, now))
+            stats["files"] += 1
+        else:
+            for current_id in workspace_ids:
+                stats.update(self.compact_workspace(current_id, now))
+                stats["workspaces"] += 1
+
+        size_after, index_size_after = self._collection_sizes()
+        stats["bytes_reclaimed"] = max(size_before - size_after, 0)
+        stats["index_bytes_reclaimed"] = max(index_size_before - index_size_after, 0)
+        logger.info(f"History compaction finished: {dict(stats)}")
+        return dict(stats)
+
+
+if __name__ == "__main__":
+    from src.models.database import db_manager
+
+    if not db_manager.connect():
+        sys.exit(1)
+
+    print(HistoryCompactor(db_manager).run(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,386 @@
+"""
+Compression codecs for stored file contents.
+
+Each stored blob carries a codec tag ("none", "zlib" or "lzma"). The codec
+is picked from the content type and a sampled compressibility check, so
+media that is already compressed is not compressed a second time.
+
+Contents stored before codecs existed are migrated by
+recompress_file_contents, and text sizes counted in characters are
+corrected by fix_text_sizes. DatabaseManager starts it in the background when
+it connects (MIGRATE_CONTENTS_ON_STARTUP) until it has finished once; it can
+also be run by hand:
+
+    python -m src.models.compression
+"""
+import os
+import zlib
+import lzma
+import time
+import logging
+import threading
+from datetime import datetime
+from bson import Binary
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CODEC_NONE = "none"
+CODEC_ZLIB = "zlib"
+CODEC_LZMA = "lzma"
+
+# Compression configuration
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 512))  # smaller blobs are stored as-is
+COMPRESSION_MAX_RATIO = float(os.getenv('COMPRESSION_MAX_RATIO', 0.9))  # sample must shrink below this
+LZMA_MAX_SIZE = int(os.getenv('LZMA_MAX_SIZE', 8 * 1024 * 1024))  # larger text falls back to zlib
+ZLIB_LEVEL = 6
+
+# Bumped whenever recompress_file_contents learns to fix more documents, so
+# startup runs it again once
+MIGRATION_VERSION = 2
+MIGRATION_STATE_ID = "file_contents"
+SAMPLE_SIZE = 16 * 1024
+
+# Content types that are already compressed
+COMPRESSED_TYPE_PREFIXES = ('image/', 'video/', 'audio/')
+UNCOMPRESSED_MEDIA_TYPES = {
+    'image/bmp', 'image/svg+xml', 'image/tiff',
+    'audio/wav', 'audio/x-wav', 'audio/aiff', 'audio/x-aiff'
+}
+COMPRESSED_TYPES = {
+    'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/x-bzip2', 'application/x-xz', 'application/x-7z-compressed',
+    'application/x-rar-compressed', 'application/pdf', 'application/octet-stream+zstd'
+}
+
+# Content types that get the stronger (and slower) lzma codec
+TEXT_TYPES = {
+    'application/json', 'application/xml', 'application/javascript',
+    'application/x-edl', 'application/x-subrip', 'application/x-fcpxml'
+}
+
+
+def is_text_type(content_type):
+    """
+    Check whether a content type is text-like.
+
+    Args:
+        content_type (str): MIME type of the content
+
+    Returns:
+        bool: True if the content type is text-like
+    """
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return (content_type.startswith('text/') or content_type in TEXT_TYPES
+            or content_type.endswith('+xml') or content_type.endswith('+json'))
+
+
+def _is_compressed_type(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in UNCOMPRESSED_MEDIA_TYPES:
+        return False
+    return content_type in COMPRESSED_TYPES or content_type.startswith(COMPRESSED_TYPE_PREFIXES)
+
+
+def _sample(data):
+    """
+    Take up to three slices (start, middle, end) of the data for a quick
+    compressibility check.
+    """
+    if len(data) <= SAMPLE_SIZE * 3:
+        return data
+    middle = len(data) // 2
+    return (data[:SAMPLE_SIZE]
+            + data[middle:middle + SAMPLE_SIZE]
+            + data[-SAMPLE_SIZE:])
+
+
+def choose_codec(content_type, data):
+    """
+    Pick a codec for a blob.
+
+    Args:
+        content_type (str): MIME type of the content
+        data (bytes): Raw content
+
+    Returns:
+        str: Codec tag
+    """
+    if not COMPRESSION_ENABLED or len(data) < COMPRESSION_MIN_SIZE:
+        return CODEC_NONE
+
+    if _is_compressed_type(content_type):
+        return CODEC_NONE
+
+    sample = _sample(data)
+    if len(zlib.compress(sample, 1)) > len(sample) * COMPRESSION_MAX_RATIO:
+        return CODEC_NONE
+
+    if is_text_type(content_type) and len(data) <= LZMA_MAX_SIZE:
+        return CODEC_LZMA
+    return CODEC_ZLIB
+
+
+def compress(data, codec):
+    """
+    Compress data with the given codec.
+
+    Args:
+        data (bytes): Raw content
+        codec (str): Codec tag
+
+    Returns:
+        bytes: Compressed content
+    """
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, ZLIB_LEVEL)
+    if codec == CODEC_LZMA:
+        return lzma.compress(data)
+    if codec in (CODEC_NONE, None):
+        return data
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decompress(data, codec):
+    """
+    Decompress data stored with the given codec.
+
+    Args:
+        data (bytes): Stored content
+        codec (str): Codec tag
+
+    Returns:
+        bytes: Raw content
+    """
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == CODEC_LZMA:
+        return lzma.decompress(data)
+    if codec in (CODEC_NONE, None):
+        return data
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def encode_content(content, content_type):
+    """
+    Encode content for storage.
+
+    Args:
+        content (bytes/str): Content as committed
+        content_type (str): MIME type of the content
+
+    Returns:
+        tuple: (stored content, codec tag, text encoding or None). The
+            stored content is always binary; text is stored as its UTF-8
+            bytes and marked with the encoding.
+    """
+    encoding = "utf-8" if isinstance(content, str) else None
+    raw = content.encode("utf-8") if encoding else content
+    if raw is None:
+        return content, CODEC_NONE, encoding
+
+    codec = choose_codec(content_type, raw)
+    if codec == CODEC_NONE:
+        return Binary(bytes(raw)), codec, encoding
+    return Binary(compress(bytes(raw), codec)), codec, encoding
+
+
+def recompress_file_contents(db_manager, batch_size=100, pause=0.1):
+    """
+    One-off migration that compresses file contents stored before codecs
+    were introduced, and rewrites contents stored as strings as binary with
+    their size in bytes. Works in batches ordered by _id so it can be
+    stopped and restarted at any time.
+
+    Args:
+        db_manager (DatabaseManager): Connected database manager
+        batch_size (int, optional): Number of blobs per batch
+        pause (float, optional): Seconds to sleep between batches
+
+    Returns:
+        dict: Migration statistics
+    """
+    from pymongo import UpdateOne
+
+    stats = {"scanned": 0, "compressed": 0, "binary": 0, "bytes_before": 0, "bytes_after": 0}
+    file_contents = db_manager.get_collection("file_contents")
+    if file_contents is None:
+        return stats
+
+    query = {
+        "$or": [{"codec": {"$exists": False}}, {"content": {"$type": "string"}}],
+        "storage": {"$ne": "delta"}
+    }
+    last_id = None
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+        batch = list(file_contents.find(
+            batch_query,
+            {"content": 1, "content_type": 1, "codec": 1, "encoding": 1}
+        ).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        updates = []
+        for doc in batch:
+            last_id = doc["_id"]
+            stats["scanned"] += 1
+            content = doc.get("content")
+            if content is None:
+                continue
+
+            # Contents that already have a codec only need the string
+            # rewritten as bytes, not another compression pass
+            if doc.get("codec") is not None:
+                raw = content.encode(doc.get("encoding") or "utf-8")
+                updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+                    "content": Binary(raw), "codec": CODEC_NONE, "encoding": doc.get("encoding") or "utf-8",
+                    "size": len(raw)
+                }}))
+                stats["binary"] += 1
+                continue
+
+            stored, codec, encoding = encode_content(content, doc.get("content_type"))
+            raw_size = len(content.encode("utf-8") if encoding else content)
+            update = {"content": stored, "codec": codec, "encoding": encoding, "size": raw_size}
+            if codec != CODEC_NONE:
+                stats["compressed"] += 1
+                stats["bytes_before"] += raw_size
+                stats["bytes_after"] += len(stored)
+            if encoding:
+                stats["binary"] += 1
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+
+        if updates:
+            file_contents.bulk_write(updates, ordered=False)
+        logger.info(f"Compression migration: {stats['scanned']} blobs scanned, {stats['compressed']} compressed, "
+                    f"{stats['binary']} converted to binary")
+        time.sleep(pause)
+
+    logger.info(f"Compression migration finished: {stats}")
+    return stats
+
+
+def fix_text_sizes(db_manager, batch_size=100, pause=0.1):
+    """
+    One-off migration that corrects the size of text contents stored while
+    sizes were counted in characters, so readers can trust the stored size
+    instead of decoding the content to measure it. Chunked contents were
+    always measured in bytes and are skipped.
+
+    Args:
+        db_manager (DatabaseManager): Connected database manager
+        batch_size (int, optional): Number of blobs per batch
+        pause (float, optional): Seconds to sleep between batches
+
+    Returns:
+        dict: Number of text contents scanned and resized
+    """
+    from pymongo import UpdateOne
+    from src.models.version import FileContent
+
+    stats = {"text_scanned": 0, "resized": 0}
+    file_contents = db_manager.get_collection("file_contents")
+    if file_contents is None:
+        return stats
+
+    query = {"encoding": {"$ne": None}, "storage": {"$ne": "chunked"}}
+    last_id = None
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+        batch = list(file_contents.find(
+            batch_query,
+            {"content_hash": 1, "content": 1, "codec": 1, "encoding": 1, "storage": 1, "size": 1}
+        ).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        updates = []
+        for doc in batch:
+            last_id = doc["_id"]
+            stats["text_scanned"] += 1
+            if doc.get("storage") == "delta":
+                raw = db_manager.blob_store.get(doc["content_hash"])
+            else:
+                raw = FileContent.from_dict(doc).get_raw() if doc.get("content") is not None else None
+            if raw is None or len(raw) == doc.get("size"):
+                continue
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"size": len(raw)}}))
+            stats["resized"] += 1
+
+        if updates:
+            file_contents.bulk_write(updates, ordered=False)
+        logger.info(f"Size migration: {stats['text_scanned']} text blobs scanned, {stats['resized']} resized")
+        time.sleep(pause)
+
+    logger.info(f"Size migration finished: {stats}")
+    return stats
+
+
+def migrate_file_contents(db_manager, batch_size=100, pause=0.1):
+    """
+    Run recompress_file_contents and fix_text_sizes unless the current
+    migration version has already finished, and record that it has. Nothing but the migration
+    itself writes documents that need it, so later startups skip the scan.
+
+    Args:
+        db_manager (DatabaseManager): Connected database manager
+        batch_size (int, optional): Number of blobs per batch
+        pause (float, optional): Seconds to sleep between batches
+
+    Returns:
+        dict: Migration statistics, or None if it had already run
+    """
+    migrations = db_manager.get_collection("migrations")
+    if migrations is None:
+        return None
+
+    state = migrations.find_one({"_id": MIGRATION_STATE_ID})
+    if state and state.get("version", 0) >= MIGRATION_VERSION:
+        return None
+
+    stats = recompress_file_contents(db_manager, batch_size, pause)
+    stats.update(fix_text_sizes(db_manager, batch_size, pause))
+    migrations.update_one(
+        {"_id": MIGRATION_STATE_ID},
+        {"$set": {"version": MIGRATION_VERSION, "finished_at": datetime.utcnow(), "stats": stats}},
+        upsert=True
+    )
+    return stats
+
+
+def start_compression_migration(db_manager, batch_size=100, pause=0.1):
+    """
+    Run the compression migration in a background thread if it has not
+    finished yet.
+
+    Args:
+        db_manager (DatabaseManager): Connected database manager
+        batch_size (int, optional): Number of blobs per batch
+        pause (float, optional): Seconds to sleep between batches
+
+    Returns:
+        threading.Thread: The started migration thread
+    """
+    thread = threading.Thread(
+        target=migrate_file_contents,
+        args=(db_manager, batch_size, pause),
+        name="compression-migration",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    from src.models.database import db_manager
+
+    if db_manager.connect():
+        recompress_file_contents(db_manager)
+        fix_text_sizes(db_manager)
@@ -1,15 +1,153 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ReplaceOne, DeleteOne
+from pymongo.errors import BulkWriteError
 import os
 import hashlib
 import logging
-from datetime import datetime, timedelta
+import io
+import base64
+import json
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 import secrets
 from bson import ObjectId
+from src.models.version import Version, FileContent
+from src.models.tree import Tree, Commit, split_path
+from src.models.compression import CODEC_NONE, start_compression_migration
+from src.models.blobstore import create_blob_store
+from src.models.indexes import IndexManager
+from src.models.search import SearchIndex, path_trigrams
+from src.models.events import EventHub, EVENTS_CHANGE_STREAMS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Build missing indexes in the background when connecting
+ENSURE_INDEXES_ON_STARTUP = os.getenv('ENSURE_INDEXES_ON_STARTUP', 'true').lower() == 'true'  # the required unique indexes are always built
+
+# Migrate file contents stored before codecs in the background when connecting
+MIGRATE_CONTENTS_ON_STARTUP = os.getenv('MIGRATE_CONTENTS_ON_STARTUP', 'true').lower() == 'true'
+
+# Attempts to move the workspace head before a commit gives up
+COMMIT_MAX_RETRIES = 10
+
+# Deepest ancestry walked by one $graphLookup
+ANCESTRY_MAX_DEPTH = int(os.getenv('ANCESTRY_MAX_DEPTH', 1000))
+
+# Page sizes for history listings
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class VersionConflictError(Exception):
+    """
+    Raised when a commit expects a file head that another commit has
+    already moved.
+    """
+    
+    def __init__(self, file_path, current_head):
+        """
+        Initialize the error.
+        
+        Args:
+            file_path (str): Path of the conflicting file
+            current_head (dict): Current file head, or None if the file has none
+        """
+        super().__init__(f"Head of {file_path} is not the expected parent")
+        self.file_path = file_path
+        self.current_head = current_head
+    
+    def to_dict(self):
+        """
+        Describe the conflict for the client that has to rebase.
+        
+        Returns:
+            dict: File path and the current head version, content hash,
+                author and update time (None if the file has no head)
+        """
+        head = self.current_head
+        return {
+            "file_path": self.file_path,
+            "head": {
+                "version_id": head["head_version_id"],
+                "content_hash": head["content_hash"],
+                "author_id": head.get("author_id"),
+                "message": head.get("message"),
+                "updated_at": head.get("updated_at")
+            } if head else None
+        }
+
+
+def encode_page_cursor(version_data):
+    """
+    Encode the position after a version as an opaque page cursor.
+    
+    Args:
+        version_data (dict): Last version of the current page
+        
+    Returns:
+        str: URL-safe cursor token
+    """
+    position = {"t": version_data["created_at"].isoformat(), "id": str(version_data["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_page_cursor(cursor):
+    """
+    Decode a page cursor into a keyset filter on (created_at, _id).
+    
+    Args:
+        cursor (str): Cursor token from encode_page_cursor
+        
+    Returns:
+        dict: Query filter selecting versions after the cursor, newest first
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = datetime.fromisoformat(position["t"])
+        last_id = ObjectId(position["id"])
+    except Exception:
+        raise ValueError("Invalid page cursor")
+    
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": last_id}}
+    ]}
+
+
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 timestamp into the naive UTC datetime stored in
+    version documents.
+    
+    Args:
+        value (str): Timestamp, with or without a UTC offset
+        
+    Returns:
+        datetime: Naive UTC datetime
+        
+    Raises:
+        ValueError: If the timestamp is malformed
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _page_size(limit):
+    """
+    Clamp a requested page size to the allowed range.
+    """
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
 class DatabaseManager:
     """
     Database manager for MongoDB connection and operations.
@@ -28,6 +166,10 @@ class DatabaseManager:
         self.client = None
         self.db = None
         self.connected = False
+        self.commits_enabled = False
+        self.blob_store = create_blob_store(self)
+        self.search_index = SearchIndex(self)
+        self.event_hub = EventHub()
         
     def connect(self, db_name="community_platform"):
         """
@@ -46,6 +188,17 @@ class DatabaseManager:
             self.db = self.client[db_name]
             self.connected = True
             logger.info(f"Connected to MongoDB: {db_name}")
+            # Commits depend on the unique indexes, so they are built first
+            # and commits are refused without them
+            self.commits_enabled = IndexManager(self).ensure_required_indexes()
+            if not self.commits_enabled:
+                logger.error("Required indexes could not be built, commits are refused")
+            if ENSURE_INDEXES_ON_STARTUP:
+                IndexManager(self).ensure_indexes_in_background()
+            if MIGRATE_CONTENTS_ON_STARTUP:
+                start_compression_migration(self)
+            if EVENTS_CHANGE_STREAMS:
+                self.event_hub.start_change_stream(self)
             return True
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {str(e)}")
@@ -348,6 +501,52 @@ class DatabaseManager:
             logger.error(f"Failed to remove workspace member: {str(e)}")
             return False
     
+    def delete_workspace(self, workspace_id):
+        """
+        Delete a workspace with its history, releasing its blob references.
+        Blobs no longer used by any version are left for garbage collection.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not self.connected:
+            return False
+        
+        try:
+            # Remove the workspace first so no new commits can start
+            workspace = self.get_collection("workspaces").find_one_and_delete(
+                {"_id": ObjectId(workspace_id)},
+                {"members": 1}
+            )
+            if not workspace:
+                return False
+            
+            versions = self.get_collection("versions")
+            refs = {
+                item["_id"]: -item["count"]
+                for item in versions.aggregate([
+                    {"$match": {"workspace_id": workspace_id}},
+                    {"$group": {"_id": "$content_hash", "count": {"$sum": 1}}}
+                ])
+            }
+            versions.delete_many({"workspace_id": workspace_id})
+            self.blob_store.add_refs(refs)
+            
+            self.get_collection("file_heads").delete_many({"workspace_id": workspace_id})
+            self.get_collection("commits").delete_many({"workspace_id": workspace_id})
+            self.search_index.remove_workspace(workspace_id)
+            self.get_collection("users").update_many(
+                {"_id": {"$in": [ObjectId(member) for member in workspace.get("members", [])]}},
+                {"$pull": {"workspaces": workspace_id}}
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to delete workspace: {str(e)}")
+            return False
+    
     def create_invite_link(self, workspace_id, expiry_days=7):
         """
         Create an invite link for a workspace.
@@ -381,37 +580,736 @@ class DatabaseManager:
             return None
     
     # Version control operations
-    def create_version(self, version_data, file_content_data=None):
+    def create_version(self, version_data, file_content_data=None, rebase=True):
         """
         Create a new version and store file content.
+        The version is recorded as a single-file workspace commit.
         
         Args:
-            version_data (dict): Version metadata
+            version_data (dict): Version metadata; parent_version_id is the
+                expected head of the file
             file_content_data (dict, optional): File content data
+            rebase (bool, optional): Reparent onto the current head instead
+                of failing if the file head moved
             
         Returns:
             str: Version ID or None if failed
+            
+        Raises:
+            VersionConflictError: If rebase is False and the file head is
+                not the expected parent
         """
         if not self.connected:
             return None
         
+        commit_id = self.create_commit(
+            version_data["workspace_id"],
+            version_data.get("author_id"),
+            version_data.get("message"),
+            [(version_data, file_content_data)],
+            rebase
+        )
+        return version_data.get("version_id") if commit_id else None
+    
+    def create_commit(self, workspace_id, author_id, message, changes, rebase=True):
+        """
+        Create an atomic commit of one or more file versions.
+        The parent_version_id of each version is the head its author expects
+        the file to have. File heads are advanced with a compare-and-swap on
+        that head, and the new versions only become part of the workspace
+        snapshot once the workspace head is moved to the commit, which
+        happens in one update.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            author_id (str): User ID of the commit author
+            message (str): Commit message
+            changes (list): List of (version_data, file_content_data) tuples;
+                file_content_data may be None when the content already exists
+            rebase (bool, optional): On a head mismatch, reparent the version
+                onto the current head and retry instead of failing
+            
+        Returns:
+            str: Commit ID or None if failed
+            
+        Raises:
+            VersionConflictError: If rebase is False and a file head is not
+                the expected parent
+        """
+        if not self.connected:
+            return None
+        if not self.commits_enabled:
+            logger.error("Commit refused: the required unique indexes are missing")
+            return None
+        
+        versions = self.get_collection("versions")
+        commits = self.get_collection("commits")
+        workspaces = self.get_collection("workspaces")
+        commit = None
+        refs = None
+        advanced = []
+        
         try:
-            # First store the file content if provided
-            if file_content_data:
-                file_contents = self.get_collection("file_contents")
-                # Check if content with this hash already exists
-                existing_content = file_contents.find_one({"content_hash": file_content_data["content_hash"]})
-                if not existing_content:
-                    file_contents.insert_one(file_content_data)
-            
-            # Then store the version metadata
-            versions = self.get_collection("versions")
-            result = versions.insert_one(version_data)
+            # First store the file contents and take their references. The
+            # garbage collector never deletes a blob with references, so
+            # contents stored beforehand are looked up (in one round trip)
+            # only once they have one
+            stored_sizes = {
+                version_data["content_hash"]: self._store_file_content(version_data, file_content_data)
+                for version_data, file_content_data in changes
+                if file_content_data
+            }
+            refs = Counter(version_data["content_hash"] for version_data, _ in changes)
+            self.blob_store.add_refs(refs)
+            stored_metas = self.blob_store.get_meta_many([
+                content_hash for content_hash in refs if content_hash not in stored_sizes
+            ])
+            sizes = []
+            for version_data, _ in changes:
+                content_hash = version_data["content_hash"]
+                if content_hash in stored_sizes:
+                    sizes.append(stored_sizes[content_hash])
+                elif content_hash in stored_metas:
+                    sizes.append(stored_metas[content_hash].get("size"))
+                else:
+                    raise ValueError(f"File content not found: {content_hash}")
+            
+            # Then store the version metadata, tagged with the commit
+            commit = Commit(workspace_id, None, author_id, message)
+            commit.changed_paths = [version_data["file_path"] for version_data, _ in changes]
+            for version_data, _ in changes:
+                version_data["commit_id"] = commit.commit_id
+            versions.insert_many([version_data for version_data, _ in changes])
+            
+            # Move the file heads from the expected parents to the new versions
+            self._advance_file_heads(workspace_id, changes, sizes, rebase, advanced)
+            
+            # Build the new snapshot on top of the current head and move the
+            # head with a compare-and-swap, rebuilding if another commit won
+            tree_changes = {
+                version_data["file_path"]: version_data["content_hash"]
+                for version_data, _ in changes
+            }
+            for attempt in range(COMMIT_MAX_RETRIES):
+                workspace = workspaces.find_one({"_id": ObjectId(workspace_id)}, {"head_commit_id": 1})
+                if not workspace:
+                    raise ValueError(f"Workspace {workspace_id} not found")
+                head_commit_id = workspace.get("head_commit_id")
+                
+                if head_commit_id:
+                    head_commit = commits.find_one({"commit_id": head_commit_id}, {"tree_hash": 1})
+                    base_tree_hash = head_commit["tree_hash"] if head_commit else None
+                else:
+                    # Files committed before snapshots existed form the first base tree
+                    base_tree_hash = self._write_tree_changes(None, {
+                        head["file_path"]: head["content_hash"]
+                        for head in self.get_collection("file_heads").find(
+                            {"workspace_id": workspace_id},
+                            {"file_path": 1, "content_hash": 1}
+                        )
+                    })
+                
+                commit.tree_hash = self._write_tree_changes(base_tree_hash, tree_changes)
+                commit.parent_commit_id = head_commit_id
+                commits.replace_one({"commit_id": commit.commit_id}, commit.to_dict(), upsert=True)
+                
+                result = workspaces.update_one(
+                    {"_id": ObjectId(workspace_id), "head_commit_id": head_commit_id},
+                    {"$set": {"head_commit_id": commit.commit_id}}
+                )
+                if result.modified_count:
+                    break
+            else:
+                raise RuntimeError("Workspace head kept moving, giving up")
+            
+            # Keep full-text search on the new heads; failures are only logged
+            self.search_index.index_commit(workspace_id, changes)
+            self.event_hub.publish_commit(workspace_id, [version_data for version_data, _ in changes])
+            
+            return commit.commit_id
+        except Exception as e:
+            if isinstance(e, VersionConflictError):
+                logger.info(f"Commit rejected: {str(e)}")
+            else:
+                logger.error(f"Failed to create commit: {str(e)}")
+            self._rollback_commit(workspace_id, commit.commit_id if commit else None, advanced, refs)
+            if isinstance(e, VersionConflictError):
+                raise
+            return None
+    
+    def _rollback_commit(self, workspace_id, commit_id, advanced, refs):
+        """
+        Undo the writes of a commit that failed. Each step is attempted even
+        if an earlier one fails, and failures are only logged so they cannot
+        replace the error that caused the rollback.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            commit_id (str): ID of the commit, or None if it was not written
+            advanced (list): (version_data, previous head) of the moved heads
+            refs (dict): Blob references the commit added
+        """
+        if advanced:
+            self._restore_file_heads(workspace_id, advanced)
+        if commit_id:
+            try:
+                self.get_collection("versions").delete_many({"commit_id": commit_id})
+            except Exception as e:
+                logger.error(f"Failed to delete the versions of commit {commit_id}: {str(e)}")
+            try:
+                self.get_collection("commits").delete_one({"commit_id": commit_id})
+            except Exception as e:
+                logger.error(f"Failed to delete commit {commit_id}: {str(e)}")
+        if refs:
+            try:
+                self.blob_store.add_refs({content_hash: -count for content_hash, count in refs.items()})
+            except Exception as e:
+                # The refcounts stay too high until reconcile_refcounts runs
+                logger.error(f"Failed to release the blob references of a failed commit: {str(e)}")
+    
+    def _advance_file_heads(self, workspace_id, changes, sizes, rebase, advanced):
+        """
+        Move the heads of the changed files to the new versions, each only
+        if it still points at the version's parent. All heads are swapped in
+        one bulk write; with the unique workspace_file index, a head that
+        moved on fails its upsert with a duplicate key error instead of
+        being overwritten.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            changes (list): (version_data, file_content_data) tuples
+            sizes (list): Content size of each change
+            rebase (bool): Reparent conflicting versions onto the current
+                head and retry instead of raising
+            advanced (list): Filled with (version_data, previous head) for
+                every head that was moved, for rollback
             
-            return version_data.get("version_id")
+        Raises:
+            VersionConflictError: If a head is not the expected parent
+        """
+        file_heads = self.get_collection("file_heads")
+        paths = [version_data["file_path"] for version_data, _ in changes]
+        previous = {
+            head["file_path"]: head
+            for head in file_heads.find({"workspace_id": workspace_id, "file_path": {"$in": paths}})
+        }
+        pending = list(zip([version_data for version_data, _ in changes], sizes))
+        
+        for attempt in range(COMMIT_MAX_RETRIES):
+            operations = []
+            for version_data, size in pending:
+                operations.append(self._file_head_update(version_data, size, check_parent=True))
+            
+            failed = set()
+            try:
+                file_heads.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    if error.get("code") != 11000:
+                        raise
+                    failed.add(error["index"])
+            
+            advanced.extend(
+                (version_data, previous.get(version_data["file_path"]))
+                for index, (version_data, _) in enumerate(pending) if index not in failed
+            )
+            if not failed:
+                return
+            
+            pending = [item for index, item in enumerate(pending) if index in failed]
+            current = {
+                head["file_path"]: head
+                for head in file_heads.find({
+                    "workspace_id": workspace_id,
+                    "file_path": {"$in": [version_data["file_path"] for version_data, _ in pending]}
+                })
+            }
+            if not rebase:
+                version_data = pending[0][0]
+                raise VersionConflictError(version_data["file_path"], current.get(version_data["file_path"]))
+            
+            # Reparent the versions onto the heads that won and try again
+            reparent = []
+            for version_data, _ in pending:
+                head = current.get(version_data["file_path"])
+                version_data["parent_version_id"] = head["head_version_id"] if head else None
+                previous[version_data["file_path"]] = head
+                reparent.append(UpdateOne(
+                    {"_id": version_data["_id"]},
+                    {"$set": {"parent_version_id": version_data["parent_version_id"]}}
+                ))
+            self.get_collection("versions").bulk_write(reparent, ordered=False)
+        
+        version_data = pending[0][0]
+        raise VersionConflictError(version_data["file_path"], file_heads.find_one({
+            "workspace_id": workspace_id, "file_path": version_data["file_path"]
+        }))
+    
+    def _restore_file_heads(self, workspace_id, advanced):
+        """
+        Undo _advance_file_heads for a commit that failed, leaving heads
+        that other commits have moved on since untouched.
+        """
+        operations = []
+        for version_data, previous in advanced:
+            head_filter = {
+                "workspace_id": workspace_id,
+                "file_path": version_data["file_path"],
+                "head_version_id": version_data["version_id"]
+            }
+            if previous:
+                previous = {field: value for field, value in previous.items() if field != "_id"}
+                operations.append(ReplaceOne(head_filter, previous))
+            else:
+                operations.append(DeleteOne(head_filter))
+        try:
+            self.get_collection("file_heads").bulk_write(operations, ordered=False)
         except Exception as e:
-            logger.error(f"Failed to create version: {str(e)}")
+            logger.error(f"Failed to restore file heads: {str(e)}")
+    
+    def _store_file_content(self, version_data, file_content_data):
+        """
+        Store the file content of a new version in the blob store unless it
+        already exists. The parent version's content is passed as the delta
+        base hint.
+        
+        Args:
+            version_data (dict): Version metadata
+            file_content_data (dict): File content data, preferably
+                uncompressed so the blob store only encodes it once
+            
+        Returns:
+            int: Size of the version's content
+        """
+        base_hash = None
+        if version_data.get("parent_version_id"):
+            parent = self.get_collection("versions").find_one(
+                {"version_id": version_data["parent_version_id"], "workspace_id": version_data.get("workspace_id")},
+                {"content_hash": 1}
+            )
+            base_hash = parent["content_hash"] if parent else None
+        
+        file_content = FileContent.from_dict(file_content_data)
+        stored = self.blob_store.put(
+            file_content_data["content_hash"],
+            io.BytesIO(file_content.get_raw()),
+            file_content_data.get("content_type"),
+            file_content.encoding,
+            base_hash
+        )
+        if not stored:
+            raise ValueError(f"Failed to store content {file_content_data['content_hash']}")
+        return stored["size"]
+    
+    # Snapshot tree operations
+    def _write_tree_changes(self, tree_hash, changes):
+        """
+        Apply file changes to a tree, writing only the trees on changed paths.
+        
+        Args:
+            tree_hash (str): Hash of the tree to change, or None for an empty tree
+            changes (dict): Mapping of file path to content hash
+            
+        Returns:
+            str: Hash of the new root tree
+        """
+        new_trees = []
+        root_hash = self._rewrite_tree(tree_hash, {
+            tuple(split_path(file_path)): content_hash
+            for file_path, content_hash in changes.items()
+        }, new_trees)
+        
+        if new_trees:
+            self.get_collection("trees").bulk_write([
+                UpdateOne({"tree_hash": tree["tree_hash"]}, {"$setOnInsert": tree}, upsert=True)
+                for tree in new_trees
+            ], ordered=False)
+        return root_hash
+    
+    def _rewrite_tree(self, tree_hash, changes, new_trees):
+        """
+        Recursive helper for _write_tree_changes. Changes are keyed by path
+        component tuples relative to this tree.
+        """
+        tree = self.get_tree(tree_hash) if tree_hash else Tree()
+        if tree is None:
+            raise ValueError(f"Missing tree {tree_hash}")
+        
+        subtree_changes = {}
+        for parts, content_hash in changes.items():
+            if len(parts) == 1:
+                tree.entries[parts[0]] = {"type": "blob", "hash": content_hash}
+            elif parts:
+                subtree_changes.setdefault(parts[0], {})[parts[1:]] = content_hash
+        
+        for name, sub_changes in subtree_changes.items():
+            entry = tree.entries.get(name)
+            sub_hash = entry["hash"] if entry and entry["type"] == "tree" else None
+            tree.entries[name] = {
+                "type": "tree",
+                "hash": self._rewrite_tree(sub_hash, sub_changes, new_trees)
+            }
+        
+        tree_data = tree.to_dict()
+        new_trees.append(tree_data)
+        return tree_data["tree_hash"]
+    
+    def get_tree(self, tree_hash):
+        """
+        Get a tree by hash.
+        
+        Args:
+            tree_hash (str): Tree hash
+            
+        Returns:
+            Tree: Tree object or None if not found
+        """
+        if not self.connected:
             return None
+        
+        tree_data = self.get_collection("trees").find_one({"tree_hash": tree_hash})
+        return Tree.from_dict(tree_data) if tree_data else None
+    
+    def _get_trees(self, tree_hashes):
+        """
+        Get several trees in one round trip.
+        
+        Args:
+            tree_hashes (iterable): Tree hashes
+            
+        Returns:
+            dict: Mapping of tree hash to Tree object
+        """
+        tree_hashes = list(set(tree_hashes))
+        if not tree_hashes:
+            return {}
+        return {
+            tree_data["tree_hash"]: Tree.from_dict(tree_data)
+            for tree_data in self.get_collection("trees").find({"tree_hash": {"$in": tree_hashes}})
+        }
+    
+    def _resolve_tree_path(self, tree_hash, path):
+        """
+        Find the tree of a directory inside a snapshot.
+        
+        Args:
+            tree_hash (str): Root tree hash
+            path (str): Directory path, empty for the root
+            
+        Returns:
+            str: Tree hash of the directory or None if it does not exist
+        """
+        for name in split_path(path or ""):
+            tree = self.get_tree(tree_hash)
+            entry = tree.entries.get(name) if tree else None
+            if not entry or entry["type"] != "tree":
+                return None
+            tree_hash = entry["hash"]
+        return tree_hash
+    
+    def get_commit(self, workspace_id, commit_id):
+        """
+        Get a commit by ID and workspace ID.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            commit_id (str): Commit ID
+            
+        Returns:
+            dict: Commit data or None if not found
+        """
+        if not self.connected:
+            return None
+        
+        return self.get_collection("commits").find_one({
+            "commit_id": commit_id,
+            "workspace_id": workspace_id
+        })
+    
+    def get_workspace_commits(self, workspace_id, limit=20):
+        """
+        Get recent commits in a workspace, following the head's parent chain
+        so commits that lost the race for the head are not included.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            limit (int, optional): Maximum number of commits to return
+            
+        Returns:
+            list: List of commit data, newest first
+        """
+        if not self.connected:
+            return []
+        
+        workspace = self.get_workspace(workspace_id)
+        commit_id = workspace.get("head_commit_id") if workspace else None
+        
+        result = []
+        commits = self.get_collection("commits")
+        while commit_id and len(result) < limit:
+            commit_data = commits.find_one({"commit_id": commit_id, "workspace_id": workspace_id})
+            if not commit_data:
+                break
+            result.append(commit_data)
+            commit_id = commit_data.get("parent_commit_id")
+        return result
+    
+    def get_snapshot_files(self, tree_hash, path=""):
+        """
+        List every file in a snapshot, or in one directory of it.
+        Trees are loaded one directory level per round trip.
+        
+        Args:
+            tree_hash (str): Root tree hash of the snapshot
+            path (str, optional): Only list files below this directory
+            
+        Returns:
+            dict: Mapping of file path to content hash, or None if path does not exist
+        """
+        if not self.connected:
+            return {}
+        
+        prefix = "/".join(split_path(path or ""))
+        tree_hash = self._resolve_tree_path(tree_hash, prefix)
+        if tree_hash is None:
+            return None
+        
+        files = {}
+        level = {tree_hash: [prefix]}
+        while level:
+            trees = self._get_trees(level)
+            next_level = {}
+            for level_hash, dir_paths in level.items():
+                tree = trees.get(level_hash)
+                if tree is None:
+                    continue
+                for dir_path in dir_paths:
+                    for name, entry in tree.entries.items():
+                        entry_path = f"{dir_path}/{name}" if dir_path else name
+                        if entry["type"] == "tree":
+                            next_level.setdefault(entry["hash"], []).append(entry_path)
+                        else:
+                            files[entry_path] = entry["hash"]
+            level = next_level
+        return files
+    
+    def diff_snapshots(self, old_tree_hash, new_tree_hash):
+        """
+        Compare two snapshots. Subtrees with equal hashes are skipped, so the
+        cost depends on the number of changed paths, not the number of files.
+        
+        Args:
+            old_tree_hash (str): Root tree hash of the old snapshot, or None
+            new_tree_hash (str): Root tree hash of the new snapshot, or None
+            
+        Returns:
+            list: List of changes with path, status, old_hash and new_hash
+        """
+        if not self.connected:
+            return []
+        
+        changes = []
+        level = [("", old_tree_hash, new_tree_hash)]
+        while level:
+            trees = self._get_trees(
+                [h for _, old_hash, new_hash in level for h in (old_hash, new_hash) if h]
+            )
+            next_level = []
+            for dir_path, old_hash, new_hash in level:
+                if old_hash == new_hash:
+                    continue
+                old_entries = trees[old_hash].entries if old_hash in trees else {}
+                new_entries = trees[new_hash].entries if new_hash in trees else {}
+                for name in sorted(set(old_entries) | set(new_entries)):
+                    old_entry = old_entries.get(name)
+                    new_entry = new_entries.get(name)
+                    if old_entry == new_entry:
+                        continue
+                    entry_path = f"{dir_path}/{name}" if dir_path else name
+                    old_sub = old_entry["hash"] if old_entry and old_entry["type"] == "tree" else None
+                    new_sub = new_entry["hash"] if new_entry and new_entry["type"] == "tree" else None
+                    if old_sub or new_sub:
+                        next_level.append((entry_path, old_sub, new_sub))
+                    old_blob = old_entry["hash"] if old_entry and old_entry["type"] == "blob" else None
+                    new_blob = new_entry["hash"] if new_entry and new_entry["type"] == "blob" else None
+                    if old_blob or new_blob:
+                        changes.append({
+                            "path": entry_path,
+                            "status": "added" if not old_blob else "removed" if not new_blob else "modified",
+                            "old_hash": old_blob,
+                            "new_hash": new_blob
+                        })
+            level = next_level
+        return sorted(changes, key=lambda change: change["path"])
+    
+    def _head_from_version(self, version_data, size):
+        """
+        Build the file head fields for a version.
+        """
+        return {
+            "head_version_id": version_data["version_id"],
+            "content_hash": version_data["content_hash"],
+            "size": size,
+            "path_trigrams": path_trigrams(version_data["file_path"]),
+            "author_id": version_data.get("author_id"),
+            "message": version_data.get("message"),
+            "updated_at": version_data.get("created_at", datetime.utcnow())
+        }
+    
+    def _file_head_update(self, version_data, size, check_parent=False):
+        """
+        Build the upsert that points the file head of a version's file at
+        that version.
+        
+        Args:
+            version_data (dict): Version metadata
+            size (int): Size of the version's content
+            check_parent (bool, optional): Only match a head that points at
+                the version's parent
+            
+        Returns:
+            UpdateOne: Bulk write operation for the file_heads collection
+        """
+        head_filter = {
+            "workspace_id": version_data["workspace_id"],
+            "file_path": version_data["file_path"]
+        }
+        if check_parent:
+            head_filter["head_version_id"] = version_data.get("parent_version_id")
+        return UpdateOne(
+            head_filter,
+            {
+                "$set": self._head_from_version(version_data, size),
+                "$setOnInsert": {"created_at": version_data.get("created_at", datetime.utcnow())}
+            },
+            upsert=True
+        )
+    
+    def _update_file_head(self, version_data, size):
+        """
+        Point the file head of a version's file at that version.
+        
+        Args:
+            version_data (dict): Version metadata
+            size (int): Size of the version's content
+        """
+        self.get_collection("file_heads").bulk_write([self._file_head_update(version_data, size)])
+    
+    def get_file_head(self, workspace_id, file_path):
+        """
+        Get the head (latest version metadata) of a file.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            file_path (str): File path
+            
+        Returns:
+            dict: File head data or None if the file does not exist
+        """
+        if not self.connected:
+            return None
+        
+        file_heads = self.get_collection("file_heads")
+        head = file_heads.find_one({"workspace_id": workspace_id, "file_path": file_path})
+        if head:
+            return head
+        
+        # Files committed before heads were maintained get their head backfilled
+        latest_version = self.get_collection("versions").find_one(
+            {"workspace_id": workspace_id, "file_path": file_path},
+            sort=[("created_at", -1)]
+        )
+        if not latest_version:
+            return None
+        
+        content_meta = self.blob_store.get_meta(latest_version["content_hash"])
+        self._update_file_head(latest_version, content_meta.get("size") if content_meta else None)
+        return file_heads.find_one({"workspace_id": workspace_id, "file_path": file_path})
+    
+    def list_file_heads(self, workspace_id):
+        """
+        List the heads of all files in a workspace.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            
+        Returns:
+            list: List of file head data, sorted by file path
+        """
+        if not self.connected:
+            return []
+        
+        file_heads = self.get_collection("file_heads")
+        heads = list(file_heads.find({"workspace_id": workspace_id}).sort("file_path", 1))
+        
+        # Workspaces committed before heads were maintained get them backfilled
+        if not heads and self.get_collection("versions").find_one({"workspace_id": workspace_id}, {"_id": 1}):
+            self.rebuild_file_heads(workspace_id)
+            heads = list(file_heads.find({"workspace_id": workspace_id}).sort("file_path", 1))
+        
+        return heads
+    
+    def _write_file_heads(self, versions):
+        """
+        Point the file heads of several files at the given versions. Sizes
+        come from the blob store, whatever backend holds the contents.
+        
+        Args:
+            versions (list): Version metadata, one per file
+        """
+        metas = self.blob_store.get_meta_many(list({version_data["content_hash"] for version_data in versions}))
+        self.get_collection("file_heads").bulk_write([
+            UpdateOne(
+                {"workspace_id": version_data["workspace_id"], "file_path": version_data["file_path"]},
+                {
+                    "$set": self._head_from_version(
+                        version_data, metas.get(version_data["content_hash"], {}).get("size")
+                    ),
+                    "$setOnInsert": {"created_at": version_data.get("created_at", datetime.utcnow())}
+                },
+                upsert=True
+            )
+            for version_data in versions
+        ], ordered=False)
+    
+    def rebuild_file_heads(self, workspace_id=None):
+        """
+        Rebuild file heads from the versions collection.
+        
+        Args:
+            workspace_id (str, optional): Only rebuild this workspace
+            
+        Returns:
+            int: Number of file heads written
+        """
+        if not self.connected:
+            return 0
+        
+        pipeline = []
+        if workspace_id:
+            pipeline.append({"$match": {"workspace_id": workspace_id}})
+        pipeline += [
+            {"$sort": {"created_at": -1}},
+            {"$group": {
+                "_id": {"workspace_id": "$workspace_id", "file_path": "$file_path"},
+                "version": {"$first": "$$ROOT"}
+            }}
+        ]
+        
+        batch = []
+        for item in self.get_collection("versions").aggregate(pipeline, allowDiskUse=True):
+            batch.append(item["version"])
+            if len(batch) >= 1000:
+                self._write_file_heads(batch)
+                batch = []
+        if batch:
+            self._write_file_heads(batch)
+        
+        count = self.get_collection("file_heads").count_documents(
+            {"workspace_id": workspace_id} if workspace_id else {}
+        )
+        logger.info(f"Rebuilt file heads: {count} files")
+        return count
     
     def get_version(self, version_id, workspace_id):
         """
@@ -433,6 +1331,200 @@ class DatabaseManager:
             "workspace_id": workspace_id
         })
     
+    def _ancestry_pipeline(self, workspace_id, version_ids, max_depth):
+        """
+        Build the aggregation that loads versions together with their
+        ancestors, following parent_version_id inside the workspace.
+        """
+        return [
+            {"$match": {"workspace_id": workspace_id, "version_id": {"$in": version_ids}}},
+            {"$graphLookup": {
+                "from": "versions",
+                "startWith": "$parent_version_id",
+                "connectFromField": "parent_version_id",
+                "connectToField": "version_id",
+                "as": "ancestors",
+                "maxDepth": max_depth - 1,
+                "depthField": "depth",
+                "restrictSearchWithMatch": {"workspace_id": workspace_id}
+            }}
+        ]
+    
+    def _ancestry_chain(self, version_data, max_depth):
+        """
+        Order the result of the ancestry pipeline from the version back to
+        its oldest loaded ancestor.
+        
+        Returns:
+            tuple: (list of versions, whether the depth cap cut the chain)
+        """
+        ancestors = sorted(version_data.pop("ancestors", []), key=lambda ancestor: ancestor["depth"])
+        for ancestor in ancestors:
+            ancestor["depth"] += 1
+        version_data["depth"] = 0
+        chain = [version_data] + ancestors
+        truncated = len(ancestors) >= max_depth and bool(chain[-1].get("parent_version_id"))
+        return chain, truncated
+    
+    def get_versions_after(self, workspace_id, commit_id, version_object_id, limit=DEFAULT_PAGE_SIZE):
+        """
+        Get the versions of a workspace committed after a version, in commit
+        order. Used to resume event streams, and to poll for commits of other
+        processes when change streams are off. The commits that followed are
+        found by walking the workspace's commit chain back from its head in
+        one round trip, so commits that finished after later ones are still
+        found and versions of commits that were rolled back never are.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            commit_id (str): Commit of the last version seen, or None if no
+                version was seen yet
+            version_object_id (ObjectId): _id of the last version seen
+            limit (int, optional): Commits walked; at most limit + 1
+                versions are returned
+            
+        Returns:
+            list: Versions after the given one, oldest first, or None if its
+                commit is not among the last limit commits of the workspace
+        """
+        if not self.connected:
+            return []
+        
+        workspace = self.get_collection("workspaces").find_one({"_id": ObjectId(workspace_id)}, {"head_commit_id": 1})
+        head_commit_id = workspace.get("head_commit_id") if workspace else None
+        if not head_commit_id:
+            return [] if commit_id is None else None
+        
+        # Nothing was committed since, so skip the walk (streams poll this)
+        if head_commit_id == commit_id:
+            found = [{"ancestors": []}]
+        else:
+            found = list(self.get_collection("commits").aggregate([
+                {"$match": {"commit_id": head_commit_id}},
+                {"$graphLookup": {
+                    "from": "commits",
+                    "startWith": "$parent_commit_id",
+                    "connectFromField": "parent_commit_id",
+                    "connectToField": "commit_id",
+                    "as": "ancestors",
+                    "maxDepth": max(limit - 1, 0),
+                    "depthField": "depth",
+                    "restrictSearchWithMatch": {"workspace_id": workspace_id}
+                }},
+                {"$project": {"commit_id": 1, "ancestors.commit_id": 1, "ancestors.depth": 1}}
+            ]))
+        if not found:
+            return None
+        
+        # Newest first; the commits before the client's one are the missed ones
+        chain = [head_commit_id] + [
+            ancestor["commit_id"]
+            for ancestor in sorted(found[0]["ancestors"], key=lambda ancestor: ancestor["depth"])
+        ]
+        if commit_id is None:
+            # The whole chain was missed, unless it is longer than the walk
+            if len(chain) > limit:
+                return None
+            missed = chain
+        elif commit_id in chain:
+            missed = chain[:chain.index(commit_id)]
+        else:
+            return None
+        order = {missed_id: position for position, missed_id in enumerate(reversed(missed))}
+        order[commit_id] = -1
+        
+        query = {"commit_id": {"$in": missed}}
+        if commit_id is not None:
+            query = {"$or": [query, {"commit_id": commit_id, "_id": {"$gt": version_object_id}}]}
+        versions = list(self.get_collection("versions").find(query).limit(limit + 1))
+        versions.sort(key=lambda version_data: (order[version_data["commit_id"]], version_data["_id"]))
+        return versions
+    
+    def get_version_ancestry(self, workspace_id, version_id, max_depth=ANCESTRY_MAX_DEPTH):
+        """
+        Get the chain of versions from a version back to its root in one
+        round trip.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            version_id (str): Version ID to start from
+            max_depth (int, optional): Most ancestors to return, capped at
+                ANCESTRY_MAX_DEPTH
+            
+        Returns:
+            dict: versions (the version first, each with its depth) and
+                truncated (True if older ancestors exist beyond max_depth),
+                or None if the version was not found
+        """
+        if not self.connected:
+            return None
+        
+        max_depth = max(1, min(max_depth, ANCESTRY_MAX_DEPTH))
+        try:
+            found = list(self.get_collection("versions").aggregate(
+                self._ancestry_pipeline(workspace_id, [version_id], max_depth)
+            ))
+        except Exception as e:
+            logger.error(f"Failed to load ancestry of {version_id}: {str(e)}")
+            return None
+        
+        if not found:
+            return None
+        chain, truncated = self._ancestry_chain(found[0], max_depth)
+        return {"versions": chain, "truncated": truncated}
+    
+    def get_merge_base(self, workspace_id, version_id, other_version_id, max_depth=ANCESTRY_MAX_DEPTH):
+        """
+        Find the nearest common ancestor of two versions in one round trip.
+        A version counts as its own ancestor.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            version_id (str): First version ID
+            other_version_id (str): Second version ID
+            max_depth (int, optional): Most ancestors to search per version
+            
+        Returns:
+            dict: merge_base (version data, or None if the histories do not
+                meet within max_depth) and the distance from each version;
+                None if a version was not found
+        """
+        if not self.connected:
+            return None
+        
+        max_depth = max(1, min(max_depth, ANCESTRY_MAX_DEPTH))
+        try:
+            found = {
+                version_data["version_id"]: version_data
+                for version_data in self.get_collection("versions").aggregate(
+                    self._ancestry_pipeline(workspace_id, [version_id, other_version_id], max_depth)
+                )
+            }
+        except Exception as e:
+            logger.error(f"Failed to find merge base of {version_id} and {other_version_id}: {str(e)}")
+            return None
+        
+        if version_id not in found or other_version_id not in found:
+            return None
+        
+        chain, _ = self._ancestry_chain(found[version_id], max_depth)
+        if version_id == other_version_id:
+            other_chain = chain
+        else:
+            other_chain, _ = self._ancestry_chain(found[other_version_id], max_depth)
+        depths = {version_data["version_id"]: version_data["depth"] for version_data in chain}
+        
+        # Each version has one parent, so the common ancestors form one chain
+        # and the first one reached from either side is the nearest
+        for version_data in other_chain:
+            if version_data["version_id"] in depths:
+                return {
+                    "merge_base": version_data,
+                    "distance": depths[version_data["version_id"]],
+                    "other_distance": version_data["depth"]
+                }
+        return {"merge_base": None, "distance": None, "other_distance": None}
+    
     def get_file_content(self, content_hash):
         """
         Get file content by hash.
@@ -443,50 +1535,148 @@ class DatabaseManager:
         Returns:
             dict: File content data or None if not found
         """
-        if not self.connected:
+        file_content_meta = self.blob_store.get_meta(content_hash)
+        if not file_content_meta:
             return None
         
-        file_contents = self.get_collection("file_contents")
-        return file_contents.find_one({"content_hash": content_hash})
+        raw = self.blob_store.get(content_hash)
+        if raw is None:
+            logger.error(f"Failed to read content for {content_hash}")
+            return None
+        
+        file_content_data = dict(file_content_meta)
+        file_content_data["content"] = raw
+        file_content_data["codec"] = CODEC_NONE
+        return file_content_data
     
-    def get_file_versions(self, workspace_id, file_path):
+    def get_file_content_meta(self, content_hash):
         """
-        Get all versions of a file.
+        Get file content metadata by hash without loading the content itself.
+        
+        Args:
+            content_hash (str): Content hash
+            
+        Returns:
+            dict: File content metadata or None if not found
+        """
+        return self.blob_store.get_meta(content_hash)
+    
+    def is_content_accessible(self, content_hash, user_id):
+        """
+        Check whether a user may read a content, i.e. whether a version in
+        one of the user's workspaces references it.
+        
+        Args:
+            content_hash (str): Content hash
+            user_id (str): User ID
+        
+        Returns:
+            bool: True if the content is referenced by one of the user's workspaces
+        """
+        if not self.connected:
+            return False
+        
+        try:
+            user_data = self.get_user(user_id=user_id)
+            workspace_ids = user_data.get("workspaces", []) if user_data else []
+            if not workspace_ids:
+                return False
+        
+            versions = self.get_collection("versions")
+            return versions.find_one(
+                {"content_hash": content_hash, "workspace_id": {"$in": workspace_ids}},
+                {"_id": 1}
+            ) is not None
+        except Exception as e:
+            logger.error(f"Failed to check access to content {content_hash}: {str(e)}")
+            return False
+    
+    def get_file_versions(self, workspace_id, file_path, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """
+        Get one page of the versions of a file, newest first.
+        Pages are keyset-paginated on (created_at, _id), so deep pages cost
+        the same as the first one.
         
         Args:
             workspace_id (str): Workspace ID
             file_path (str): File path
+            limit (int, optional): Page size, capped at MAX_PAGE_SIZE
+            cursor (str, optional): Cursor from the previous page
             
         Returns:
             list: List of version data
+            
+        Raises:
+            ValueError: If the cursor is malformed
         """
         if not self.connected:
             return []
         
+        query = {"workspace_id": workspace_id, "file_path": file_path}
+        if cursor:
+            query.update(decode_page_cursor(cursor))
+        
         versions = self.get_collection("versions")
-        return list(versions.find({
-            "workspace_id": workspace_id,
-            "file_path": file_path
-        }).sort("created_at", -1))
+        return list(versions.find(query).sort([("created_at", -1), ("_id", -1)]).limit(_page_size(limit)))
     
-    def get_workspace_versions(self, workspace_id, limit=20):
+    def prune_file_history(self, workspace_id, file_path, keep):
         """
-        Get recent versions in a workspace.
+        Delete all but the newest versions of a file, releasing their blob
+        references. Snapshots of older commits keep listing the pruned
+        files, but their content is left for garbage collection.
         
         Args:
             workspace_id (str): Workspace ID
-            limit (int, optional): Maximum number of versions to return
+            file_path (str): Path of the file
+            keep (int): Number of newest versions to keep, at least 1
+            
+        Returns:
+            int: Number of versions deleted, or None if failed
+        """
+        if not self.connected:
+            return None
+        
+        try:
+            versions = self.get_collection("versions")
+            pruned = list(versions.find(
+                {"workspace_id": workspace_id, "file_path": file_path},
+                {"content_hash": 1}
+            ).sort([("created_at", -1), ("_id", -1)]).skip(max(keep, 1)))
+            if not pruned:
+                return 0
+            
+            result = versions.delete_many({"_id": {"$in": [version_data["_id"] for version_data in pruned]}})
+            refs = Counter(version_data["content_hash"] for version_data in pruned)
+            self.blob_store.add_refs({content_hash: -count for content_hash, count in refs.items()})
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"Failed to prune file history: {str(e)}")
+            return None
+    
+    def get_workspace_versions(self, workspace_id, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """
+        Get one page of recent versions in a workspace, newest first.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            limit (int, optional): Page size, capped at MAX_PAGE_SIZE
+            cursor (str, optional): Cursor from the previous page
             
         Returns:
             list: List of version data
+            
+        Raises:
+            ValueError: If the cursor is malformed
         """
         if not self.connected:
             return []
         
+        query = {"workspace_id": workspace_id}
+        if cursor:
+            query.update(decode_page_cursor(cursor))
+        
         versions = self.get_collection("versions")
-        return list(versions.find({
-            "workspace_id": workspace_id
-        }).sort("created_at", -1).limit(limit))
+        return list(versions.find(query).sort([("created_at", -1), ("_id", -1)]).limit(_page_size(limit)))
     
     def list_workspace_files(self, workspace_id):
         """
@@ -501,16 +1691,103 @@ class DatabaseManager:
         if not self.connected:
             return []
         
-        versions = self.get_collection("versions")
-        # Use aggregation to get unique file paths
-        pipeline = [
-            {"$match": {"workspace_id": workspace_id}},
-            {"$group": {"_id": "$file_path"}},
-            {"$project": {"file_path": "$_id", "_id": 0}}
-        ]
+        return [head["file_path"] for head in self.list_file_heads(workspace_id)]
+
+    def get_files_at(self, workspace_id, at=None):
+        """
+        List the files of a workspace as they were at a point in time.
+
+        Args:
+            workspace_id (str): Workspace ID
+            at (datetime, optional): Point in time, defaults to the current heads
+
+        Returns:
+            list: Dicts with file_path, version_id, content_hash and updated_at,
+                sorted by file path
+        """
+        if not self.connected:
+            return []
+
+        if at is None:
+            return [
+                {"file_path": head["file_path"], "version_id": head["head_version_id"],
+                 "content_hash": head["content_hash"], "updated_at": head.get("updated_at")}
+                for head in self.list_file_heads(workspace_id)
+            ]
+
+        try:
+            versions = self.get_collection("versions")
+            return [
+                {"file_path": item["_id"], "version_id": item["version_id"],
+                 "content_hash": item["content_hash"], "updated_at": item["updated_at"]}
+                for item in versions.aggregate([
+                    {"$match": {"workspace_id": workspace_id, "created_at": {"$lte": at}}},
+                    {"$sort": {"created_at": -1, "_id": -1}},
+                    {"$group": {
+                        "_id": "$file_path",
+                        "version_id": {"$first": "$version_id"},
+                        "content_hash": {"$first": "$content_hash"},
+                        "updated_at": {"$first": "$created_at"}
+                    }},
+                    {"$sort": {"_id": 1}}
+                ])
+            ]
+        except Exception as e:
+            logger.error(f"Failed to list files at {at}: {str(e)}")
+            return []
+
+    def restore_workspace(self, workspace_id, at, author_id):
+        """
+        Restore every file of a workspace to its version at a point in time.
+        The versions are found with one aggregation and the revert versions
+        are written as a single commit reusing the stored contents. Files
+        created after that time are left untouched.
+        
+        Args:
+            workspace_id (str): Workspace ID
+            at (datetime): Point in time to restore
+            author_id (str): User ID recorded as the author
+            
+        Returns:
+            dict: commit_id (None if nothing changed), restored and
+                unchanged file counts and the paths created after `at`,
+                or None if failed
+        """
+        if not self.connected:
+            return None
+        
+        targets = self.get_files_at(workspace_id, at)
+        heads = {head["file_path"]: head for head in self.list_file_heads(workspace_id)}
+        message = f"Restored workspace to {at.isoformat()}"
+        
+        changes = []
+        for target in targets:
+            head = heads.get(target["file_path"])
+            if head and head["content_hash"] == target["content_hash"]:
+                continue
+            version = Version(
+                workspace_id=workspace_id,
+                file_path=target["file_path"],
+                content_hash=target["content_hash"],
+                author_id=author_id,
+                message=message,
+                parent_version_id=head["head_version_id"] if head else None
+            )
+            changes.append((version.to_dict(), None))
+        
+        commit_id = None
+        if changes:
+            commit_id = self.create_commit(workspace_id, author_id, message, changes)
+            if not commit_id:
+                return None
         
-        result = list(versions.aggregate(pipeline))
-        return [item["file_path"] for item in result]
+        restored_paths = {target["file_path"] for target in targets}
+        return {
+            "commit_id": commit_id,
+            "restored": len(changes),
+            "unchanged": len(targets) - len(changes),
+            "created_after": sorted(path for path in heads if path not in restored_paths)
+        }
     
     def _hash_password(self, password):
         """
@@ -0,0 +1,192 @@
+"""
+Binary delta encoding for file content storage.
+
+Deltas are modelled on git packfile deltas: a delta describes the target
+blob as a sequence of "copy from base" and "insert literal" instructions,
+so a small edit to a large file costs only a few bytes of storage.
+
+Delta layout:
+    varint(base_size) varint(target_size) op*
+
+    op := 0x00 varint(length) <length literal bytes>     (insert)
+        | 0x01 varint(offset) varint(length)             (copy from base)
+"""
+
+# Size of the blocks used to index the base content. Smaller blocks find
+# more matches but make the index larger and the scan slower.
+BLOCK_SIZE = 16
+
+# Granularity used when extending a match forward
+_COMPARE_STEP = 4096
+
+_OP_INSERT = 0x00
+_OP_COPY = 0x01
+
+
+def _encode_varint(value):
+    """
+    Encode a non-negative integer as a little-endian base-128 varint.
+
+    Args:
+        value (int): Value to encode
+
+    Returns:
+        bytes: Encoded varint
+    """
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _decode_varint(data, pos):
+    """
+    Decode a varint from data starting at pos.
+
+    Args:
+        data (bytes): Buffer containing the varint
+        pos (int): Offset of the first varint byte
+
+    Returns:
+        tuple: (value, new position)
+    """
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("Truncated varint in delta")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _match_length(base, base_offset, target, target_offset):
+    """
+    Count how many bytes match going forward from the given offsets.
+    """
+    limit = min(len(base) - base_offset, len(target) - target_offset)
+    length = 0
+    while length < limit:
+        size = min(_COMPARE_STEP, limit - length)
+        b_start = base_offset + length
+        t_start = target_offset + length
+        if base[b_start:b_start + size] == target[t_start:t_start + size]:
+            length += size
+            continue
+        # Mismatch somewhere inside this step, find it byte by byte
+        for i in range(size):
+            if base[b_start + i] != target[t_start + i]:
+                return length + i
+    return length
+
+
+def create_delta(base, target, max_size=None):
+    """
+    Create a delta that rebuilds target from base.
+
+    Args:
+        base (bytes): Base content the delta is computed against
+        target (bytes): Content to encode
+        max_size (int, optional): Give up once the delta would exceed this size
+
+    Returns:
+        bytes: Encoded delta, or None if it would exceed max_size
+    """
+    out = bytearray()
+    out += _encode_varint(len(base))
+    out += _encode_varint(len(target))
+
+    # Index every aligned block of the base by its content
+    index = {}
+    for offset in range(0, len(base) - BLOCK_SIZE + 1, BLOCK_SIZE):
+        index.setdefault(base[offset:offset + BLOCK_SIZE], offset)
+
+    def emit_insert(start, end):
+        if end > start:
+            out.append(_OP_INSERT)
+            out.extend(_encode_varint(end - start))
+            out.extend(target[start:end])
+
+    literal_start = 0
+    pos = 0
+    last = len(target) - BLOCK_SIZE
+    while pos <= last:
+        base_offset = index.get(target[pos:pos + BLOCK_SIZE])
+        if base_offset is None:
+            pos += 1
+            if max_size is not None and len(out) + pos - literal_start > max_size:
+                return None
+            continue
+
+        length = _match_length(base, base_offset, target, pos)
+
+        # Grow the match backwards into any pending literal bytes
+        while (pos > literal_start and base_offset > 0
+               and target[pos - 1] == base[base_offset - 1]):
+            pos -= 1
+            base_offset -= 1
+            length += 1
+
+        emit_insert(literal_start, pos)
+        out.append(_OP_COPY)
+        out.extend(_encode_varint(base_offset))
+        out.extend(_encode_varint(length))
+
+        pos += length
+        literal_start = pos
+
+    emit_insert(literal_start, len(target))
+    if max_size is not None and len(out) > max_size:
+        return None
+    return bytes(out)
+
+
+def apply_delta(base, delta):
+    """
+    Rebuild the target content from a base and a delta.
+
+    Args:
+        base (bytes): Base content the delta was computed against
+        delta (bytes): Delta produced by create_delta
+
+    Returns:
+        bytes: Rebuilt target content
+
+    Raises:
+        ValueError: If the delta is corrupt or does not match the base
+    """
+    base_size, pos = _decode_varint(delta, 0)
+    target_size, pos = _decode_varint(delta, pos)
+    if base_size != len(base):
+        raise ValueError("Delta base size mismatch")
+
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op == _OP_INSERT:
+            length, pos = _decode_varint(delta, pos)
+            if pos + length > len(delta):
+                raise ValueError("Truncated insert in delta")
+            out += delta[pos:pos + length]
+            pos += length
+        elif op == _OP_COPY:
+            offset, pos = _decode_varint(delta, pos)
+            length, pos = _decode_varint(delta, pos)
+            if offset + length > len(base):
+                raise ValueError("Copy out of range in delta")
+            out += base[offset:offset + length]
+        else:
+            raise ValueError(f"Unknown delta opcode: {op}")
+
+    if len(out) != target_size:
+        raise ValueError("Delta target size mismatch")
+    return bytes(out)
@@ -0,0 +1,241 @@
+"""
+Fan-out of workspace events to server-sent event streams.
+
+Every stream subscribes to the EventHub for its workspace and gets a
+bounded queue. New versions are published to the hub either from a MongoDB
+change stream that watches workspace heads move, which also sees commits
+made by other processes, or, when change streams are not available
+(standalone servers), directly from the commit path of this process.
+Either way a commit is only published once it has succeeded.
+
+Without change streams the hub never sees the commits of other processes,
+such as the other gunicorn workers. Streams then read their events from the
+workspace's commit chain instead, every EVENTS_POLL_SECONDS and whenever
+the hub signals a commit of this process.
+
+Events carry the commit ID and the ObjectId of their version document as
+id. A client that reconnects sends the last id it saw as Last-Event-ID and
+is first sent the versions of the commits that followed it on the
+workspace's commit chain. Commits only join the chain once they succeed,
+so a commit that finished after a later one is still replayed and the
+versions of a commit that was rolled back never are.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Event configuration
+EVENTS_CHANGE_STREAMS = os.getenv('EVENTS_CHANGE_STREAMS', 'true').lower() == 'true'
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 1000))  # events buffered per stream
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+EVENTS_POLL_SECONDS = float(os.getenv('EVENTS_POLL_SECONDS', 2))  # commit chain polls without change streams
+EVENTS_BACKFILL_LIMIT = int(os.getenv('EVENTS_BACKFILL_LIMIT', 1000))  # more missed events ask for a resync
+EVENTS_RETRY_MS = 3000  # reconnect delay suggested to clients
+EVENTS_MAX_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS', 0))  # open streams per process, 0 for no limit
+
+# Version fields sent in an event
+_EVENT_FIELDS = ("version_id", "file_path", "author_id", "message", "parent_version_id", "commit_id", "content_hash")
+
+
+def version_event(version_data):
+    """
+    Build the event for a new version.
+
+    Args:
+        version_data (dict): Version document
+
+    Returns:
+        dict: Event with id, type and data
+    """
+    data = {field: version_data.get(field) for field in _EVENT_FIELDS}
+    created_at = version_data.get("created_at")
+    data["created_at"] = created_at.isoformat() + "Z" if created_at else None
+    return {"id": f"{version_data.get('commit_id')}:{version_data['_id']}", "type": "version", "data": data}
+
+
+class Subscription:
+    """
+    Queue of the events of one workspace for one stream.
+    """
+
+    def __init__(self, workspace_id, size=EVENTS_QUEUE_SIZE):
+        self.workspace_id = workspace_id
+        self.queue = queue.Queue(maxsize=size)
+        self.overflowed = False
+
+    def put(self, event):
+        """
+        Queue an event. A stream that falls too far behind is marked as
+        overflowed instead of blocking the publisher; its client resumes
+        from the versions collection after reconnecting.
+        """
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """
+        Wait for the next event.
+
+        Returns:
+            dict: Event, or None if none arrived within the timeout
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    """
+    In-process publish/subscribe of workspace events, optionally fed by a
+    change stream.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self.change_stream_active = False
+
+    def subscribe(self, workspace_id):
+        """
+        Start receiving the events of a workspace.
+
+        Args:
+            workspace_id (str): Workspace ID
+
+        Returns:
+            Subscription: Queue of the workspace's events
+        """
+        subscription = Subscription(workspace_id)
+        with self._lock:
+            self._subscriptions.setdefault(workspace_id, set()).add(subscription)
+        return subscription
+
+    def subscriber_count(self):
+        """
+        Get the number of open subscriptions of all workspaces.
+
+        Returns:
+            int: Number of subscriptions
+        """
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def unsubscribe(self, subscription):
+        """
+        Stop receiving events.
+
+        Args:
+            subscription (Subscription): Subscription from subscribe
+        """
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.workspace_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.workspace_id]
+
+    def publish(self, workspace_id, events):
+        """
+        Send events to every subscriber of a workspace.
+
+        Args:
+            workspace_id (str): Workspace ID
+            events (list): Events to send, in order
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(workspace_id, ()))
+        for subscription in subscriptions:
+            for event in events:
+                subscription.put(event)
+
+    def publish_commit(self, workspace_id, versions):
+        """
+        Publish the versions of a commit made by this process, unless a
+        change stream already delivers them.
+
+        Args:
+            workspace_id (str): Workspace ID
+            versions (list): Version documents of the commit
+        """
+        if not self.change_stream_active:
+            self.publish(workspace_id, [version_event(version_data) for version_data in versions])
+
+    def start_change_stream(self, db_manager):
+        """
+        Feed the hub from a change stream on workspace head updates in a
+        daemon thread. On servers without change streams the hub stays fed
+        from the commit path, and streams poll for the commits of other
+        processes.
+
+        Args:
+            db_manager (DatabaseManager): Connected database manager
+
+        Returns:
+            threading.Thread: The started thread
+        """
+        thread = threading.Thread(target=self._watch, args=(db_manager,), name="event-change-stream", daemon=True)
+        thread.start()
+        return thread
+
+    def _watch(self, db_manager):
+        """
+        Publish the versions of every commit that becomes a workspace head,
+        resuming after errors from the last change seen.
+        """
+        pipeline = [{"$match": {
+            "operationType": "update",
+            "updateDescription.updatedFields.head_commit_id": {"$exists": True}
+        }}]
+        resume_token = None
+        while db_manager.connected:
+            try:
+                workspaces = db_manager.get_collection("workspaces")
+                versions = db_manager.get_collection("versions")
+                with workspaces.watch(pipeline, resume_after=resume_token) as stream:
+                    if not self.change_stream_active:
+                        logger.info("Workspace events are fed from a change stream")
+                    self.change_stream_active = True
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        commit_id = change["updateDescription"]["updatedFields"]["head_commit_id"]
+                        committed = sorted(versions.find({"commit_id": commit_id}), key=lambda version_data: version_data["_id"])
+                        self.publish(str(change["documentKey"]["_id"]), [
+                            version_event(version_data) for version_data in committed
+                        ])
+            except OperationFailure as e:
+                if not self.change_stream_active:
+                    logger.info(f"Change streams unavailable, workspace events are published in-process: {str(e)}")
+                    return
+                logger.error(f"Change stream failed, resuming: {str(e)}")
+                time.sleep(1)
+            except Exception as e:
+                logger.error(f"Change stream failed, resuming: {str(e)}")
+                time.sleep(1)
+
+
+def parse_event_id(event_id):
+    """
+    Parse a Last-Event-ID header.
+
+    Args:
+        event_id (str): Event ID sent by the client
+
+    Returns:
+        tuple: (commit ID, version document ObjectId), or None if the ID is
+            missing or malformed
+    """
+    commit_id, _, version_object_id = (event_id or "").partition(":")
+    if not ObjectId.is_valid(commit_id) or not ObjectId.is_valid(version_object_id):
+        return None
+    return commit_id, ObjectId(version_object_id)
@@ -0,0 +1,204 @@
+"""
+Streaming tar and zip archives of workspace snapshots.
+
+The archive generators fetch file metadata and small blobs in batches and
+yield archive bytes as soon as each entry is written, so the first bytes
+go out before the last blob is fetched and memory use stays bounded by
+one batch. Large blobs are streamed piece by piece.
+
+Entry headers are written before the content is read, so an entry whose
+content turns out shorter than its size (a chunk or blob file that went
+missing) is padded with zeros to keep the archive readable, and the
+failure is logged.
+"""
+import os
+import time
+import posixpath
+import logging
+import tarfile
+import zipfile
+from src.models.compression import is_text_type
+from src.models.tree import split_path
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Export configuration
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 32))  # files per blob store round trip
+EXPORT_INLINE_MAX_SIZE = 1024 * 1024  # larger blobs are streamed instead of fetched in a batch
+
+ARCHIVE_FORMATS = {
+    "tar": "application/x-tar",
+    "zip": "application/zip"
+}
+
+_TAR_BLOCK_SIZE = 512
+
+
+def _archive_path(file_path):
+    """
+    Make a workspace file path safe to use as an archive member name.
+    """
+    return "/".join(part for part in split_path(file_path) if part not in (".", ".."))
+
+
+def _unique_path(path, used):
+    """
+    Rename an archive path that is already taken, such as "a/../b" after
+    "b", to "name~1.ext", "name~2.ext" and so on, and mark it as taken.
+    """
+    candidate = path
+    root, ext = posixpath.splitext(path)
+    count = 0
+    while candidate in used:
+        count += 1
+        candidate = f"{root}~{count}{ext}"
+    used.add(candidate)
+    return candidate
+
+
+def _exact_pieces(pieces, size, path):
+    """
+    Yield exactly size bytes of an entry's content, padding content that
+    ends early or fails to read with zeros and dropping any excess.
+    """
+    written = 0
+    try:
+        for piece in pieces:
+            piece = piece[:size - written]
+            written += len(piece)
+            if piece:
+                yield piece
+    except Exception as e:
+        logger.error(f"Failed to read {path} for export: {str(e)}")
+    if written < size:
+        logger.error(f"Content of {path} ended after {written} of {size} bytes; padded with zeros in export")
+        yield b"\0" * (size - written)
+
+
+def iter_entries(blob_store, files, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Resolve the files of a snapshot to their content, batch by batch.
+
+    Args:
+        blob_store (BlobStore): Store holding the contents
+        files (list): Dicts with file_path, content_hash and updated_at
+        batch_size (int, optional): Files per batch
+
+    Yields:
+        tuple: (archive path, modification datetime, size, content type,
+            iterable of exactly size bytes)
+    """
+    used = set()
+    for i in range(0, len(files), batch_size):
+        batch = files[i:i + batch_size]
+        metas = blob_store.get_meta_many({entry["content_hash"] for entry in batch})
+        inline = blob_store.get_many([
+            content_hash for content_hash, meta in metas.items()
+            if meta.get("storage") != "chunked" and (meta.get("size") or 0) <= EXPORT_INLINE_MAX_SIZE
+        ])
+
+        for entry in batch:
+            content_hash = entry["content_hash"]
+            meta = metas.get(content_hash)
+            path = _archive_path(entry["file_path"])
+            if not meta or not path:
+                logger.warning(f"Skipping {entry['file_path']} in export: content {content_hash} not found")
+                continue
+
+            if content_hash in inline:
+                raw = inline[content_hash]
+                yield _unique_path(path, used), entry.get("updated_at"), len(raw), meta.get("content_type"), [raw]
+            else:
+                size = blob_store.content_length(meta)
+                if size is None:
+                    logger.warning(f"Skipping {entry['file_path']} in export: content {content_hash} not found")
+                    continue
+                pieces = _exact_pieces(blob_store.iter_range(meta, 0, size), size, entry["file_path"])
+                yield _unique_path(path, used), entry.get("updated_at"), size, meta.get("content_type"), pieces
+
+
+def _mtime(modified):
+    return time.mktime(modified.timetuple()) if modified else time.time()
+
+
+def iter_tar(blob_store, files, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Stream a tar archive of the given files.
+
+    Args:
+        blob_store (BlobStore): Store holding the contents
+        files (list): Dicts with file_path, content_hash and updated_at
+        batch_size (int, optional): Files per batch
+
+    Yields:
+        bytes: Consecutive pieces of the archive
+    """
+    for path, modified, size, _, pieces in iter_entries(blob_store, files, batch_size):
+        info = tarfile.TarInfo(path)
+        info.size = size
+        info.mode = 0o644
+        info.mtime = _mtime(modified)
+        yield info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        for piece in pieces:
+            yield piece
+        if size % _TAR_BLOCK_SIZE:
+            yield b"\0" * (_TAR_BLOCK_SIZE - size % _TAR_BLOCK_SIZE)
+
+    # End of archive marker
+    yield b"\0" * (_TAR_BLOCK_SIZE * 2)
+
+
+class _ArchiveSink:
+    """
+    Write-only, non-seekable file object that collects archive bytes until
+    they are drained.
+    """
+
+    def __init__(self):
+        self._pieces = []
+
+    def write(self, data):
+        self._pieces.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._pieces)
+        self._pieces = []
+        return data
+
+
+def iter_zip(blob_store, files, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Stream a zip archive of the given files. Text is deflated, everything
+    else is stored as-is.
+
+    Args:
+        blob_store (BlobStore): Store holding the contents
+        files (list): Dicts with file_path, content_hash and updated_at
+        batch_size (int, optional): Files per batch
+
+    Yields:
+        bytes: Consecutive pieces of the archive
+    """
+    sink = _ArchiveSink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as archive:
+        for path, modified, size, content_type, pieces in iter_entries(blob_store, files, batch_size):
+            info = zipfile.ZipInfo(path, time.localtime(_mtime(modified))[:6])
+            info.file_size = size
+            info.external_attr = 0o644 << 16
+            info.compress_type = zipfile.ZIP_DEFLATED if is_text_type(content_type) else zipfile.ZIP_STORED
+            with archive.open(info, "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as member:
+                for piece in pieces:
+                    member.write(piece)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
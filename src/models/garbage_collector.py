@@ -0,0 +1,358 @@
+"""
+Incremental mark-and-sweep garbage collection of unreferenced blobs.
+
+The mark phase scans versions in _id order and records every referenced
+content hash in gc_marks. The sweep phase walks the blob store in content
+hash order and deletes blobs that were not marked, are older than the
+grace period, are not referenced by a version created since marking
+started, and are not the delta base of another stored blob. A last phase
+sweeps the chunk store the same way: chunks that no manifest lists and
+whose reference count is not positive, such as chunks uploaded for a
+manifest that was never committed, are deleted once past the grace period.
+
+All phases work in small batches, throttle themselves to a number of
+database operations per second and save their position in the gc_state
+checkpoint document after every batch, so a collection can be stopped at
+any time and resumes where it left off.
+
+Blobs also carry a reference count maintained by commits, history pruning
+and workspace deletion. A blob whose count is still positive is never
+swept; reconcile_refcounts repairs counts that drifted from versions.
+
+Usage:
+    python -m src.models.garbage_collector             # run or resume a collection
+    python -m src.models.garbage_collector status      # print the checkpoint
+    python -m src.models.garbage_collector reconcile   # repair reference counts
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import UpdateOne
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Garbage collection configuration
+GC_BATCH_SIZE = int(os.getenv('GC_BATCH_SIZE', 500))
+GC_OPS_PER_SECOND = float(os.getenv('GC_OPS_PER_SECOND', 1000))  # documents read or written per second
+GC_GRACE_SECONDS = int(os.getenv('GC_GRACE_SECONDS', 24 * 60 * 60))  # younger blobs are never swept
+
+CHECKPOINT_ID = "blobs"
+
+
+class Throttle:
+    """
+    Keeps a loop at or below a number of operations per second by
+    sleeping once it gets ahead.
+    """
+
+    def __init__(self, ops_per_second):
+        """
+        Initialize the throttle.
+
+        Args:
+            ops_per_second (float): Allowed rate, 0 or less for no limit
+        """
+        self.ops_per_second = ops_per_second
+        self.started = time.monotonic()
+        self.ops = 0
+
+    def wait(self, ops):
+        """
+        Account for operations and sleep if the rate is exceeded.
+
+        Args:
+            ops (int): Number of operations just performed
+        """
+        if self.ops_per_second <= 0:
+            return
+        self.ops += ops
+        ahead = self.ops / self.ops_per_second - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+class GarbageCollector:
+    """
+    Resumable mark-and-sweep collector for the blob store.
+    """
+
+    def __init__(self, db_manager, batch_size=GC_BATCH_SIZE, ops_per_second=GC_OPS_PER_SECOND,
+                 grace_seconds=GC_GRACE_SECONDS):
+        """
+        Initialize the collector.
+
+        Args:
+            db_manager (DatabaseManager): Connected database manager
+            batch_size (int, optional): Documents per batch
+            ops_per_second (float, optional): Throttle rate
+            grace_seconds (int, optional): Minimum blob age before it can be swept
+        """
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.throttle = Throttle(ops_per_second)
+        self.grace = timedelta(seconds=grace_seconds)
+
+    def get_checkpoint(self):
+        """
+        Get the checkpoint of the current or last collection.
+
+        Returns:
+            dict: Checkpoint document or None if no collection ever ran
+        """
+        return self.db_manager.get_collection("gc_state").find_one({"_id": CHECKPOINT_ID})
+
+    def _save_checkpoint(self, state):
+        state["updated_at"] = datetime.utcnow()
+        self.db_manager.get_collection("gc_state").replace_one({"_id": CHECKPOINT_ID}, state, upsert=True)
+
+    def _new_run(self):
+        return {
+            "_id": CHECKPOINT_ID,
+            "run_id": str(ObjectId()),
+            "phase": "mark",
+            "mark_after": None,
+            "sweep_after": None,
+            "chunk_after": None,
+            "started_at": datetime.utcnow(),
+            "finished_at": None,
+            "stats": {"versions_scanned": 0, "blobs_scanned": 0, "blobs_swept": 0,
+                      "bytes_freed": 0, "kept_as_base": 0, "chunks_scanned": 0, "chunks_swept": 0}
+        }
+
+    def run(self, max_batches=None):
+        """
+        Run a collection, resuming an unfinished one from its checkpoint.
+
+        Args:
+            max_batches (int, optional): Stop after this many batches
+
+        Returns:
+            dict: Checkpoint after the last batch
+        """
+        if not self.db_manager.connected:
+            return None
+
+        state = self.get_checkpoint()
+        if not state or state["phase"] == "done":
+            state = self._new_run()
+            self._save_checkpoint(state)
+            logger.info(f"Garbage collection {state['run_id']} started")
+        else:
+            logger.info(f"Garbage collection {state['run_id']} resumed in {state['phase']} phase")
+
+        batches = 0
+        while state["phase"] != "done":
+            if max_batches is not None and batches >= max_batches:
+                break
+            if state["phase"] == "mark":
+                self._mark_batch(state)
+            elif state["phase"] == "sweep":
+                self._sweep_batch(state)
+            else:
+                self._sweep_chunks_batch(state)
+            self._save_checkpoint(state)
+            batches += 1
+
+        if state["phase"] == "done":
+            logger.info(f"Garbage collection {state['run_id']} finished: {state['stats']}")
+        return state
+
+    def _mark_batch(self, state):
+        """
+        Mark the content hashes of the next batch of versions.
+        """
+        query = {"_id": {"$gt": state["mark_after"]}} if state["mark_after"] else {}
+        batch = list(self.db_manager.get_collection("versions").find(
+            query,
+            {"content_hash": 1}
+        ).sort("_id", 1).limit(self.batch_size))
+
+        if not batch:
+            state["phase"] = "sweep"
+            return
+
+        hashes = {doc["content_hash"] for doc in batch}
+        self.db_manager.get_collection("gc_marks").bulk_write([
+            UpdateOne({"_id": content_hash}, {"$set": {"run_id": state["run_id"]}}, upsert=True)
+            for content_hash in hashes
+        ], ordered=False)
+
+        state["mark_after"] = batch[-1]["_id"]
+        state["stats"]["versions_scanned"] += len(batch)
+        self.throttle.wait(len(batch) + len(hashes))
+
+    def _sweep_batch(self, state):
+        """
+        Delete the unreachable blobs of the next batch of the blob store.
+        """
+        blob_store = self.db_manager.blob_store
+        metas = blob_store.list_blobs(state["sweep_after"], self.batch_size)
+
+        if not metas:
+            state["phase"] = "chunks"
+            self.db_manager.get_collection("gc_marks").delete_many({})
+            return
+
+        hashes = [meta["content_hash"] for meta in metas]
+        marked = {
+            doc["_id"]
+            for doc in self.db_manager.get_collection("gc_marks").find(
+                {"_id": {"$in": hashes}, "run_id": state["run_id"]},
+                {"_id": 1}
+            )
+        }
+        cutoff = state["started_at"] - self.grace
+        candidates = [
+            meta for meta in metas
+            if meta["content_hash"] not in marked
+            and meta.get("created_at", cutoff) < cutoff
+            and (meta.get("refcount") or 0) <= 0
+        ]
+        ops = len(metas) + len(marked)
+
+        if candidates:
+            candidate_hashes = [meta["content_hash"] for meta in candidates]
+            # Versions created after marking started are not in gc_marks
+            referenced = {
+                doc["content_hash"]
+                for doc in self.db_manager.get_collection("versions").find(
+                    {"content_hash": {"$in": candidate_hashes}},
+                    {"content_hash": 1}
+                )
+            }
+            # A delta base is kept until the blobs encoded against it are gone
+            bases = blob_store.find_dependents(candidate_hashes)
+            state["stats"]["kept_as_base"] += len(bases - referenced)
+
+            for meta in candidates:
+                content_hash = meta["content_hash"]
+                if content_hash in referenced or content_hash in bases:
+                    continue
+                # The store rechecks the count and age as it deletes, so a
+                # commit that took the blob in the meantime keeps it
+                if blob_store.delete(content_hash, cutoff):
+                    state["stats"]["blobs_swept"] += 1
+                    state["stats"]["bytes_freed"] += meta.get("size") or 0
+                    ops += 1
+            ops += len(candidates) * 2
+
+        state["sweep_after"] = hashes[-1]
+        state["stats"]["blobs_scanned"] += len(metas)
+        self.throttle.wait(ops)
+
+    def _sweep_chunks_batch(self, state):
+        """
+        Delete the unused chunks of the next batch of the chunk store.
+        """
+        blob_store = self.db_manager.blob_store
+        chunks = blob_store.list_chunks(state.get("chunk_after"), self.batch_size)
+
+        if not chunks:
+            state["phase"] = "done"
+            state["finished_at"] = datetime.utcnow()
+            return
+
+        cutoff = state["started_at"] - self.grace
+        candidates = [
+            chunk["chunk_hash"] for chunk in chunks
+            if (chunk.get("refcount") or 0) <= 0 and chunk.get("created_at", cutoff) < cutoff
+        ]
+        swept = blob_store.delete_chunks(candidates, cutoff) if candidates else 0
+
+        state["chunk_after"] = chunks[-1]["chunk_hash"]
+        state["stats"]["chunks_scanned"] = state["stats"].get("chunks_scanned", 0) + len(chunks)
+        state["stats"]["chunks_swept"] = state["stats"].get("chunks_swept", 0) + swept
+        self.throttle.wait(len(chunks) + len(candidates) * 2)
+
+
+def reconcile_refcounts(db_manager, batch_size=GC_BATCH_SIZE, ops_per_second=GC_OPS_PER_SECOND):
+    """
+    Repair blob reference counts from a scan of versions. Blobs are walked
+    in content hash order and each batch is counted with one aggregation;
+    counts are fixed with relative increments, so references added by
+    concurrent commits are kept.
+
+    Args:
+        db_manager (DatabaseManager): Connected database manager
+        batch_size (int, optional): Blobs per batch
+        ops_per_second (float, optional): Throttle rate
+
+    Returns:
+        dict: Reconciliation statistics
+    """
+    stats = {"scanned": 0, "repaired": 0}
+    if not db_manager.connected:
+        return stats
+
+    blob_store = db_manager.blob_store
+    throttle = Throttle(ops_per_second)
+    after = None
+    while True:
+        metas = blob_store.list_blobs(after, batch_size)
+        if not metas:
+            break
+
+        hashes = [meta["content_hash"] for meta in metas]
+        actual = {
+            item["_id"]: item["count"]
+            for item in db_manager.get_collection("versions").aggregate([
+                {"$match": {"content_hash": {"$in": hashes}}},
+                {"$group": {"_id": "$content_hash", "count": {"$sum": 1}}}
+            ])
+        }
+        drift = {
+            meta["content_hash"]: actual.get(meta["content_hash"], 0) - (meta.get("refcount") or 0)
+            for meta in metas
+        }
+        drift = {content_hash: amount for content_hash, amount in drift.items() if amount}
+        if drift:
+            blob_store.add_refs(drift)
+
+        stats["scanned"] += len(metas)
+        stats["repaired"] += len(drift)
+        after = hashes[-1]
+        throttle.wait(len(metas) + len(drift))
+
+    logger.info(f"Reference count reconciliation finished: {stats}")
+    return stats
+
+
+def start_garbage_collection(db_manager, **kwargs):
+    """
+    Run a garbage collection in a background thread.
+
+    Args:
+        db_manager (DatabaseManager): Connected database manager
+        **kwargs: Options passed to GarbageCollector
+
+    Returns:
+        threading.Thread: The started collector thread
+    """
+    thread = threading.Thread(
+        target=GarbageCollector(db_manager, **kwargs).run,
+        name="blob-gc",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    from src.models.database import db_manager
+
+    if not db_manager.connect():
+        sys.exit(1)
+
+    collector = GarbageCollector(db_manager)
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        print(collector.get_checkpoint())
+    elif len(sys.argv) > 1 and sys.argv[1] == "reconcile":
+        reconcile_refcounts(db_manager)
+    else:
+        collector.run()
@@ -0,0 +1,333 @@
+"""
+Index registry for the collections used by DatabaseManager.
+
+INDEX_REGISTRY declares every index the application needs and
+QUERY_SHAPES lists every query DatabaseManager runs. Indexes marked
+required are unique indexes that commits rely on for correctness; they
+are built before commits are accepted, the others in the background. find_uncovered_queries
+checks that each query shape is served by a registered index, and
+IndexManager builds the indexes and reports drift against a live database.
+
+Usage:
+    python -m src.models.indexes ensure   # build missing indexes
+    python -m src.models.indexes report   # missing/extra indexes and sizes
+    python -m src.models.indexes check    # exit 1 on uncovered queries or missing indexes
+"""
+import sys
+import logging
+import threading
+from pymongo import ASCENDING, DESCENDING
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_REGISTRY = {
+    "users": [
+        {"name": "username_unique", "keys": [("username", ASCENDING)], "unique": True},
+        {"name": "email_unique", "keys": [("email", ASCENDING)], "unique": True}
+    ],
+    "workspaces": [],
+    "versions": [
+        {"name": "file_history", "keys": [
+            ("workspace_id", ASCENDING), ("file_path", ASCENDING),
+            ("created_at", DESCENDING), ("_id", DESCENDING)
+        ]},
+        {"name": "workspace_history", "keys": [
+            ("workspace_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)
+        ]},
+        {"name": "workspace_version", "keys": [("workspace_id", ASCENDING), ("version_id", ASCENDING)]},
+        {"name": "commit_versions", "keys": [("commit_id", ASCENDING)]},
+        {"name": "content_versions", "keys": [("content_hash", ASCENDING), ("workspace_id", ASCENDING)]}
+    ],
+    "file_contents": [
+        {"name": "content_hash_unique", "keys": [("content_hash", ASCENDING)], "unique": True, "required": True},
+        {"name": "delta_base", "keys": [("base_hash", ASCENDING)], "sparse": True},
+        {"name": "manifest_chunks", "keys": [("chunks", ASCENDING)], "sparse": True}
+    ],
+    "chunks": [
+        {"name": "chunk_hash_unique", "keys": [("chunk_hash", ASCENDING)], "unique": True, "required": True}
+    ],
+    "file_heads": [
+        # The compare-and-swap on file heads depends on this index
+        {"name": "workspace_file_unique", "keys": [
+            ("workspace_id", ASCENDING), ("file_path", ASCENDING)
+        ], "unique": True, "required": True},
+        {"name": "workspace_path_trigrams", "keys": [
+            ("workspace_id", ASCENDING), ("path_trigrams", ASCENDING)
+        ]}
+    ],
+    "commits": [
+        {"name": "commit_id_unique", "keys": [("commit_id", ASCENDING)], "unique": True},
+        {"name": "workspace_commits", "keys": [("workspace_id", ASCENDING)]}
+    ],
+    "trees": [
+        {"name": "tree_hash_unique", "keys": [("tree_hash", ASCENDING)], "unique": True}
+    ],
+    "search_postings": [
+        {"name": "workspace_term", "keys": [
+            ("workspace_id", ASCENDING), ("term", ASCENDING), ("tf", DESCENDING)
+        ]},
+        {"name": "workspace_file", "keys": [("workspace_id", ASCENDING), ("file_path", ASCENDING)]}
+    ],
+    "search_docs": [
+        {"name": "workspace_file_unique", "keys": [
+            ("workspace_id", ASCENDING), ("file_path", ASCENDING)
+        ], "unique": True}
+    ],
+    "search_stats": [],
+    "gc_marks": [],
+    "gc_state": [],
+    "migrations": [],
+    "import_jobs": []
+}
+
+# Every query DatabaseManager runs: equality fields, then sort fields in order
+QUERY_SHAPES = [
+    {"collection": "users", "filter": ["username"], "sort": [], "source": "create_user/update_user/get_user"},
+    {"collection": "users", "filter": ["email"], "sort": [], "source": "create_user/update_user/get_user"},
+    {"collection": "users", "filter": ["_id"], "sort": [], "source": "get_user/update_user"},
+    {"collection": "workspaces", "filter": ["_id"], "sort": [], "source": "get_workspace/create_commit"},
+    {"collection": "versions", "filter": ["workspace_id", "file_path"], "sort": ["created_at", "_id"],
+     "source": "get_file_versions/get_file_head/HistoryCompactor.compact_file"},
+    {"collection": "versions", "filter": ["workspace_id"], "sort": ["created_at", "_id"],
+     "source": "get_workspace_versions/list_file_heads"},
+    {"collection": "versions", "filter": ["workspace_id", "version_id"], "sort": [],
+     "source": "get_version/_store_file_content/get_version_ancestry/get_merge_base"},
+    {"collection": "versions", "filter": ["commit_id"], "sort": [], "source": "create_commit/EventHub._watch"},
+    {"collection": "commits", "filter": ["commit_id"], "sort": [], "source": "get_versions_after"},
+    {"collection": "versions", "filter": ["commit_id"], "sort": [], "source": "get_versions_after"},
+    {"collection": "versions", "filter": ["workspace_id"], "sort": ["created_at", "_id"], "source": "get_files_at/restore_workspace"},
+    {"collection": "file_contents", "filter": ["content_hash"], "sort": [],
+     "source": "MongoBlobStore.put/put_many/get/get_meta/exists_many"},
+    {"collection": "file_contents", "filter": [], "sort": ["_id"], "source": "recompress_file_contents/fix_text_sizes"},
+    {"collection": "migrations", "filter": ["_id"], "sort": [], "source": "migrate_file_contents"},
+    {"collection": "import_jobs", "filter": ["_id"], "sort": [], "source": "start_import/get_import_job"},
+    {"collection": "file_contents", "filter": [], "sort": ["content_hash"], "source": "MongoBlobStore.list_blobs"},
+    {"collection": "file_contents", "filter": ["base_hash"], "sort": [], "source": "MongoBlobStore.find_dependents"},
+    {"collection": "versions", "filter": [], "sort": ["_id"], "source": "GarbageCollector._mark_batch"},
+    {"collection": "versions", "filter": ["content_hash"], "sort": [], "source": "GarbageCollector._sweep_batch"},
+    {"collection": "versions", "filter": ["workspace_id"], "sort": [], "source": "delete_workspace"},
+    {"collection": "versions", "filter": ["content_hash"], "sort": [], "source": "reconcile_refcounts"},
+    {"collection": "versions", "filter": ["content_hash", "workspace_id"], "sort": [], "source": "is_content_accessible"},
+    {"collection": "commits", "filter": ["workspace_id"], "sort": [], "source": "delete_workspace"},
+    {"collection": "gc_marks", "filter": ["_id"], "sort": [], "source": "GarbageCollector"},
+    {"collection": "gc_state", "filter": ["_id"], "sort": [], "source": "GarbageCollector"},
+    {"collection": "chunks", "filter": ["chunk_hash"], "sort": [], "source": "MongoBlobStore._iter_chunk_data/missing_chunks/_write_chunks"},
+    {"collection": "chunks", "filter": [], "sort": ["chunk_hash"], "source": "MongoBlobStore.list_chunks"},
+    {"collection": "chunks", "filter": ["chunk_hash"], "sort": [], "source": "MongoBlobStore.delete_chunks"},
+    {"collection": "file_contents", "filter": ["chunks"], "sort": [], "source": "MongoBlobStore.delete_chunks"},
+    {"collection": "file_heads", "filter": ["workspace_id", "file_path"], "sort": [], "source": "get_file_head"},
+    {"collection": "file_heads", "filter": ["workspace_id"], "sort": ["file_path"], "source": "list_file_heads"},
+    {"collection": "file_heads", "filter": [], "sort": ["workspace_id"], "source": "HistoryCompactor.run/SearchIndex.rebuild"},
+    {"collection": "commits", "filter": ["commit_id"], "sort": [], "source": "get_commit/create_commit"},
+    {"collection": "trees", "filter": ["tree_hash"], "sort": [], "source": "get_tree/_get_trees"},
+    {"collection": "file_heads", "filter": ["workspace_id", "file_path"], "sort": [], "source": "SearchIndex._index_files"},
+    {"collection": "search_postings", "filter": ["workspace_id", "term"], "sort": ["tf"], "source": "SearchIndex.search"},
+    {"collection": "search_postings", "filter": ["workspace_id", "file_path"], "sort": [], "source": "SearchIndex._index_files"},
+    {"collection": "search_postings", "filter": ["workspace_id"], "sort": [], "source": "SearchIndex.remove_workspace"},
+    {"collection": "search_docs", "filter": ["workspace_id", "file_path"], "sort": [], "source": "SearchIndex._index_files"},
+    {"collection": "search_docs", "filter": ["workspace_id"], "sort": [], "source": "SearchIndex.remove_workspace"},
+    {"collection": "search_stats", "filter": ["_id"], "sort": [], "source": "SearchIndex.search/_index_files"},
+    {"collection": "file_heads", "filter": ["workspace_id", "path_trigrams"], "sort": [],
+     "source": "SearchIndex.search_paths/backfill_path_trigrams"},
+    {"collection": "file_heads", "filter": ["workspace_id"], "sort": ["file_path"], "source": "SearchIndex.search_paths"}
+]
+
+
+def index_covers(index_keys, filter_fields, sort_fields):
+    """
+    Check whether an index can serve a query without a collection scan
+    or an in-memory sort.
+    
+    Args:
+        index_keys (list): Index key fields in order
+        filter_fields (list): Equality filter fields
+        sort_fields (list): Sort fields in order
+    
+    Returns:
+        bool: True if the equality fields form a prefix of the index and
+            the sort fields follow them
+    """
+    fields = [field for field, _ in index_keys]
+    equality = fields[:len(filter_fields)]
+    if set(equality) != set(filter_fields):
+        return False
+    following = fields[len(filter_fields):len(filter_fields) + len(sort_fields)]
+    return following == list(sort_fields)
+
+
+def find_uncovered_queries(registry=None, shapes=None):
+    """
+    Find query shapes that no registered index serves.
+    
+    Args:
+        registry (dict, optional): Index registry, defaults to INDEX_REGISTRY
+        shapes (list, optional): Query shapes, defaults to QUERY_SHAPES
+    
+    Returns:
+        list: Query shapes without a matching index
+    """
+    registry = INDEX_REGISTRY if registry is None else registry
+    shapes = QUERY_SHAPES if shapes is None else shapes
+    
+    uncovered = []
+    for shape in shapes:
+        candidates = [[("_id", ASCENDING)]] + [
+            index["keys"] for index in registry.get(shape["collection"], [])
+        ]
+        if not any(index_covers(keys, shape["filter"], shape["sort"]) for keys in candidates):
+            uncovered.append(shape)
+    return uncovered
+
+
+class IndexManager:
+    """
+    Builds the registered indexes and reports how a live database differs
+    from the registry.
+    """
+    
+    def __init__(self, db_manager, registry=None):
+        """
+        Initialize the index manager.
+        
+        Args:
+            db_manager (DatabaseManager): Connected database manager
+            registry (dict, optional): Index registry, defaults to INDEX_REGISTRY
+        """
+        self.db_manager = db_manager
+        self.registry = INDEX_REGISTRY if registry is None else registry
+    
+    def ensure_indexes(self, required_only=False):
+        """
+        Create every missing registered index. Required indexes are built
+        in the foreground, the others with a background build.
+        
+        Args:
+            required_only (bool, optional): Only create the required indexes
+        
+        Returns:
+            list: Names of the indexes that were created
+        """
+        created = []
+        for collection_name, indexes in self.registry.items():
+            collection = self.db_manager.get_collection(collection_name)
+            if collection is None:
+                return created
+            existing = collection.index_information()
+            for index in indexes:
+                if index["name"] in existing or (required_only and not index.get("required")):
+                    continue
+                try:
+                    collection.create_index(
+                        index["keys"],
+                        name=index["name"],
+                        unique=index.get("unique", False),
+                        sparse=index.get("sparse", False),
+                        background=not index.get("required", False)
+                    )
+                    created.append(f"{collection_name}.{index['name']}")
+                    logger.info(f"Created index {collection_name}.{index['name']}")
+                except Exception as e:
+                    logger.error(f"Failed to create index {collection_name}.{index['name']}: {str(e)}")
+        return created
+    
+    def ensure_required_indexes(self):
+        """
+        Create the required indexes and check that all of them exist. A
+        build fails if the collection already holds duplicates, such as two
+        heads for one file.
+        
+        Returns:
+            bool: True if every required index exists
+        """
+        self.ensure_indexes(required_only=True)
+        ready = True
+        for collection_name, indexes in self.registry.items():
+            required = [index["name"] for index in indexes if index.get("required")]
+            if not required:
+                continue
+            collection = self.db_manager.get_collection(collection_name)
+            if collection is None:
+                return False
+            missing = set(required) - set(collection.index_information())
+            if missing:
+                logger.error(f"Required indexes missing on {collection_name}: {sorted(missing)}")
+                ready = False
+        return ready
+    
+    def ensure_indexes_in_background(self):
+        """
+        Run ensure_indexes in a daemon thread so startup is not blocked.
+        
+        Returns:
+            threading.Thread: The started thread
+        """
+        thread = threading.Thread(target=self.ensure_indexes, name="index-builder", daemon=True)
+        thread.start()
+        return thread
+    
+    def report(self):
+        """
+        Compare the live indexes with the registry.
+        
+        Returns:
+            dict: Per collection: missing and extra index names, and index sizes in bytes
+        """
+        result = {}
+        for collection_name, indexes in self.registry.items():
+            collection = self.db_manager.get_collection(collection_name)
+            if collection is None:
+                return result
+            existing = collection.index_information()
+            registered = {index["name"] for index in indexes}
+            try:
+                sizes = self.db_manager.db.command("collStats", collection_name).get("indexSizes", {})
+            except Exception:
+                sizes = {}
+            result[collection_name] = {
+                "missing": sorted(registered - set(existing)),
+                "extra": sorted(set(existing) - registered - {"_id_"}),
+                "sizes": sizes
+            }
+        return result
+    
+    def check(self):
+        """
+        Check that every query is served by an index and every registered
+        index exists.
+        
+        Returns:
+            list: Problem descriptions, empty if everything is in order
+        """
+        problems = [
+            f"No index for {shape['collection']} query in {shape['source']}: "
+            f"filter={shape['filter']} sort={shape['sort']}"
+            for shape in find_uncovered_queries(self.registry)
+        ]
+        if self.db_manager.connected:
+            for collection_name, info in self.report().items():
+                problems += [f"Missing index {collection_name}.{name}" for name in info["missing"]]
+        return problems
+
+
+if __name__ == "__main__":
+    from src.models.database import db_manager
+    
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    db_manager.connect()
+    manager = IndexManager(db_manager)
+    
+    if command == "ensure":
+        manager.ensure_indexes()
+    elif command == "report":
+        for name, info in manager.report().items():
+            print(f"{name}: missing={info['missing']} extra={info['extra']} sizes={info['sizes']}")
+    elif command == "check":
+        problems = manager.check()
+        for problem in problems:
+            print(problem)
+        sys.exit(1 if problems else 0)
+    else:
+        print(__doc__)
+        sys.exit(2)
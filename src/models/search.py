@@ -0,0 +1,604 @@
+"""
+Full-text search over the latest contents of workspace files, and fuzzy
+search over file paths.
+
+Every commit tokenizes the text files it changes, a bounded batch at a
+time, and replaces their postings in an inverted index. A posting records
+how often a term occurs in the head version of one file, so the index
+always describes the current state of a workspace and old versions never
+match. Queries read the postings of their terms through the
+(workspace_id, term) index and rank the files with BM25, without touching
+file_contents.
+
+Collections:
+    search_postings  one document per (workspace, term, file)
+    search_docs      the indexed head version and token count of each file
+    search_stats     number of indexed files and total tokens per workspace
+
+Path search needs no collection of its own: every file head carries the
+trigrams of its path in a multikey-indexed path_trigrams array. A query
+selects the heads that share most of its trigrams, or all trigrams inside
+its words, and ranks them by the share of its trigrams they contain,
+preferring substring and file name matches. Queries shorter than a
+trigram scan the paths for the substring.
+
+Usage:
+    python -m src.models.search rebuild [workspace_id]   # reindex file heads
+    python -m src.models.search <workspace_id> <query>   # run a query
+"""
+import os
+import re
+import sys
+import math
+import heapq
+import logging
+from collections import Counter
+from datetime import datetime
+from pymongo import InsertOne, DeleteMany, ReplaceOne, DeleteOne, UpdateOne
+from src.models.compression import is_text_type
+from src.models.version import FileContent
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Search configuration
+SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'
+SEARCH_MAX_FILE_SIZE = int(os.getenv('SEARCH_MAX_FILE_SIZE', 1024 * 1024))  # larger files are not indexed
+SEARCH_MAX_POSTINGS_PER_TERM = int(os.getenv('SEARCH_MAX_POSTINGS_PER_TERM', 10000))  # highest tf first
+SEARCH_MAX_QUERY_TERMS = 16
+SEARCH_BATCH_SIZE = 1000  # postings per bulk write
+SEARCH_LOAD_BATCH_FILES = int(os.getenv('SEARCH_LOAD_BATCH_FILES', 100))  # files loaded and tokenized at a time
+SEARCH_LOAD_BATCH_BYTES = int(os.getenv('SEARCH_LOAD_BATCH_BYTES', 16 * 1024 * 1024))  # and at most this much text
+PATH_SEARCH_MIN_SIMILARITY = float(os.getenv('PATH_SEARCH_MIN_SIMILARITY', 0.5))  # share of query trigrams a fuzzy match needs
+PATH_SEARCH_CANDIDATES = 500  # best trigram matches reranked per query
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words of 2 to 64 letters, digits or underscores
+_TOKEN_PATTERN = re.compile(r"\w{2,64}")
+
+# Runs of letters and digits in a path
+_PATH_WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """
+    Split text into lower-case search terms.
+
+    Args:
+        text (str): Text to split
+
+    Returns:
+        list: Terms in order of occurrence
+    """
+    return [token.casefold() for token in _TOKEN_PATTERN.findall(text)]
+
+
+def path_trigrams(file_path, padded=True):
+    """
+    Get the distinct lower-case trigrams of the words of a file path.
+    Words are split at separators, underscores and punctuation, and padded
+    with two spaces in front and one behind, so a word also yields
+    trigrams for its start and end and words of one or two letters are
+    indexed too.
+
+    Args:
+        file_path (str): Path of the file, or a search query
+        padded (bool, optional): Include the padded start and end
+            trigrams; without them only trigrams inside words are returned
+
+    Returns:
+        list: Sorted trigrams
+    """
+    grams = set()
+    for word in _PATH_WORD_PATTERN.findall(file_path.casefold()):
+        if padded:
+            word = f"  {word} "
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return sorted(grams)
+
+
+def path_similarity(file_path, query, fuzzy=True):
+    """
+    Check whether a path matches a query. A path matches if it contains the
+    query or, when fuzzy, if it contains every trigram inside the words of
+    the query or enough of its padded trigrams.
+
+    Args:
+        file_path (str): Path of the file
+        query (str): Lower-case search query
+        fuzzy (bool, optional): Also match paths that do not contain the query
+
+    Returns:
+        float: Share of the query trigrams in the path, or None if the
+            path does not match
+    """
+    grams = path_trigrams(query, padded=fuzzy)
+    path_grams = set(path_trigrams(file_path))
+    similarity = len(path_grams.intersection(grams)) / len(grams) if grams else 1.0
+    if query in file_path.casefold():
+        return similarity
+    if not fuzzy or len(query) < 3:
+        return None
+    inner = path_trigrams(query, padded=False)
+    if inner and path_grams.issuperset(inner):
+        return similarity
+    if similarity >= PATH_SEARCH_MIN_SIMILARITY:
+        return similarity
+    return None
+
+
+def _path_score(file_path, query, similarity):
+    """
+    Rank a path for a query: the share of query trigrams it contains, with
+    bonuses for containing the query and for matching in the file name.
+    """
+    path = file_path.casefold()
+    name = path.rsplit("/", 1)[-1]
+    score = similarity
+    if query in path:
+        score += 1.0
+    if query in name:
+        score += 0.5
+    if name.startswith(query):
+        score += 0.25
+    return score
+
+
+def load_batches(items, sizes, max_files=None, max_bytes=None):
+    """
+    Split items into consecutive batches of at most max_files items and,
+    unless a single item is larger, at most max_bytes bytes.
+
+    Args:
+        items (list): Items to split
+        sizes (list): Size in bytes of each item
+        max_files (int, optional): Defaults to SEARCH_LOAD_BATCH_FILES
+        max_bytes (int, optional): Defaults to SEARCH_LOAD_BATCH_BYTES
+
+    Yields:
+        list: The items of one batch
+    """
+    max_files = SEARCH_LOAD_BATCH_FILES if max_files is None else max_files
+    max_bytes = SEARCH_LOAD_BATCH_BYTES if max_bytes is None else max_bytes
+    batch = []
+    batch_bytes = 0
+    for item, size in zip(items, sizes):
+        if batch and (len(batch) >= max_files or batch_bytes + size > max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(item)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def bm25(tf, df, length, docs, average_length):
+    """
+    Score one term of one file.
+
+    Args:
+        tf (int): Occurrences of the term in the file
+        df (int): Number of files that contain the term
+        length (int): Number of terms in the file
+        docs (int): Number of indexed files
+        average_length (float): Average number of terms per file
+
+    Returns:
+        float: BM25 score contribution
+    """
+    idf = math.log(1 + (docs - df + 0.5) / (df + 0.5))
+    norm = 1 - BM25_B + BM25_B * length / max(average_length, 1)
+    return idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+
+
+class SearchIndex:
+    """
+    Inverted index of the head versions of the text files of each workspace.
+    """
+
+    def __init__(self, db_manager):
+        """
+        Initialize the search index.
+
+        Args:
+            db_manager (DatabaseManager): Database manager
+        """
+        self.db_manager = db_manager
+
+    def index_commit(self, workspace_id, changes):
+        """
+        Reindex the files changed by a commit. Errors are logged and do
+        not fail the commit; rebuild repairs the index afterwards.
+
+        Args:
+            workspace_id (str): Workspace ID
+            changes (list): The (version_data, file_content_data) tuples of
+                the commit; file_content_data is None for contents that
+                were stored beforehand
+
+        Returns:
+            int: Number of files indexed
+        """
+        if not SEARCH_INDEX_ENABLED or not self.db_manager.connected:
+            return 0
+
+        try:
+            return self._index_in_batches(workspace_id, [
+                (version_data, FileContent.from_dict(file_content_data) if file_content_data else None)
+                for version_data, file_content_data in changes
+            ])
+        except Exception as e:
+            logger.error(f"Failed to index commit in {workspace_id}: {str(e)}")
+            return 0
+
+    def _decode(self, raw, content_type, encoding):
+        """
+        Get the text of a content, or None if it is binary or too large.
+        """
+        if len(raw) > SEARCH_MAX_FILE_SIZE or not (encoding or is_text_type(content_type)):
+            return None
+        return raw.decode(encoding or "utf-8", errors="replace")
+
+    def _index_in_batches(self, workspace_id, files):
+        """
+        Load, tokenize and index files a batch at a time, so only one batch
+        of texts and postings is in memory. Contents sent with a commit are
+        already in memory, stored ones are loaded from the blob store if
+        they are small text.
+
+        Args:
+            workspace_id (str): Workspace ID
+            files (list): (version_data, FileContent or None) tuples; None
+                for contents that are loaded from the blob store
+
+        Returns:
+            int: Number of files indexed
+        """
+        stored = list({version_data["content_hash"] for version_data, file_content in files if file_content is None})
+        metas = self.db_manager.blob_store.get_meta_many(stored) if stored else {}
+
+        # Binary and oversized contents are never loaded and weigh nothing
+        sizes = []
+        for version_data, file_content in files:
+            if file_content is not None:
+                meta = {"size": file_content.size, "content_type": file_content.content_type,
+                        "encoding": file_content.encoding}
+            else:
+                meta = metas.get(version_data["content_hash"])
+            sizes.append((meta.get("size") or 0) if meta and self._is_indexable(meta) else 0)
+
+        indexed = 0
+        for batch in load_batches(files, sizes):
+            wanted = [
+                version_data["content_hash"] for version_data, file_content in batch
+                if file_content is None and version_data["content_hash"] in metas
+                and self._is_indexable(metas[version_data["content_hash"]])
+            ]
+            raws = self.db_manager.blob_store.get_many(wanted) if wanted else {}
+
+            texts = []
+            for version_data, file_content in batch:
+                if file_content is not None:
+                    text = self._decode(file_content.get_raw(), file_content.content_type, file_content.encoding)
+                elif version_data["content_hash"] in raws:
+                    meta = metas[version_data["content_hash"]]
+                    text = self._decode(raws[version_data["content_hash"]], meta.get("content_type"), meta.get("encoding"))
+                else:
+                    text = None
+                texts.append((version_data, text))
+            indexed += self._index_files(workspace_id, texts)
+        return indexed
+
+    def _is_indexable(self, meta):
+        """
+        Check from its metadata whether a stored content is small text.
+        """
+        return (meta.get("size") or 0) <= SEARCH_MAX_FILE_SIZE and bool(
+            meta.get("encoding") or is_text_type(meta.get("content_type"))
+        )
+
+    def _index_files(self, workspace_id, files):
+        """
+        Replace the postings of files with those of their new head versions.
+        Files that are not text, and versions that are no longer the head
+        of their file, are removed or skipped.
+
+        Args:
+            workspace_id (str): Workspace ID
+            files (list): (version_data, text or None) tuples
+
+        Returns:
+            int: Number of files indexed
+        """
+        paths = [version_data["file_path"] for version_data, _ in files]
+        heads = {
+            head["file_path"]: head["head_version_id"]
+            for head in self.db_manager.get_collection("file_heads").find(
+                {"workspace_id": workspace_id, "file_path": {"$in": paths}},
+                {"file_path": 1, "head_version_id": 1}
+            )
+        }
+        search_docs = self.db_manager.get_collection("search_docs")
+        previous = {
+            doc["file_path"]: doc
+            for doc in search_docs.find(
+                {"workspace_id": workspace_id, "file_path": {"$in": paths}},
+                {"file_path": 1, "length": 1}
+            )
+        }
+
+        posting_ops = []
+        doc_ops = []
+        docs_delta = 0
+        length_delta = 0
+        indexed = 0
+        now = datetime.utcnow()
+        for version_data, text in files:
+            file_path = version_data["file_path"]
+            if heads.get(file_path) != version_data["version_id"]:
+                continue
+
+            old = previous.get(file_path)
+            if old:
+                posting_ops.append(DeleteMany({"workspace_id": workspace_id, "file_path": file_path}))
+            if text is None:
+                if old:
+                    doc_ops.append(DeleteOne({"_id": old["_id"]}))
+                    docs_delta -= 1
+                    length_delta -= old["length"]
+                continue
+
+            terms = Counter(tokenize(text))
+            length = sum(terms.values())
+            posting_ops.extend(
+                InsertOne({
+                    "workspace_id": workspace_id,
+                    "term": term,
+                    "file_path": file_path,
+                    "version_id": version_data["version_id"],
+                    "tf": tf,
+                    "length": length
+                })
+                for term, tf in terms.items()
+            )
+            doc_ops.append(ReplaceOne(
+                {"workspace_id": workspace_id, "file_path": file_path},
+                {
+                    "workspace_id": workspace_id,
+                    "file_path": file_path,
+                    "version_id": version_data["version_id"],
+                    "length": length,
+                    "indexed_at": now
+                },
+                upsert=True
+            ))
+            docs_delta += 0 if old else 1
+            length_delta += length - (old["length"] if old else 0)
+            indexed += 1
+
+        # Deletes of a file come before its inserts, so batches stay ordered
+        postings = self.db_manager.get_collection("search_postings")
+        for i in range(0, len(posting_ops), SEARCH_BATCH_SIZE):
+            postings.bulk_write(posting_ops[i:i + SEARCH_BATCH_SIZE], ordered=True)
+        if doc_ops:
+            search_docs.bulk_write(doc_ops, ordered=False)
+        if docs_delta or length_delta:
+            self.db_manager.get_collection("search_stats").update_one(
+                {"_id": workspace_id},
+                {"$inc": {"docs": docs_delta, "total_length": length_delta}},
+                upsert=True
+            )
+        return indexed
+
+    def remove_workspace(self, workspace_id):
+        """
+        Drop the index of a workspace.
+
+        Args:
+            workspace_id (str): Workspace ID
+        """
+        if not self.db_manager.connected:
+            return
+        self.db_manager.get_collection("search_postings").delete_many({"workspace_id": workspace_id})
+        self.db_manager.get_collection("search_docs").delete_many({"workspace_id": workspace_id})
+        self.db_manager.get_collection("search_stats").delete_one({"_id": workspace_id})
+
+    def rebuild(self, workspace_id=None):
+        """
+        Reindex the file heads of one or all workspaces from scratch.
+
+        Args:
+            workspace_id (str, optional): Workspace ID, all workspaces if None
+
+        Returns:
+            dict: Number of workspaces and files indexed, or None if not connected
+        """
+        if not self.db_manager.connected:
+            return None
+
+        if workspace_id:
+            workspace_ids = [workspace_id]
+        else:
+            workspace_ids = self.db_manager.get_collection("file_heads").distinct("workspace_id")
+
+        stats = Counter()
+        for current_id in workspace_ids:
+            self.remove_workspace(current_id)
+            heads = self.db_manager.list_file_heads(current_id)
+            for i in range(0, len(heads), SEARCH_BATCH_SIZE):
+                stats["files"] += self._index_in_batches(current_id, [
+                    ({"file_path": head["file_path"], "version_id": head["head_version_id"],
+                      "content_hash": head["content_hash"]}, None)
+                    for head in heads[i:i + SEARCH_BATCH_SIZE]
+                ])
+            stats["workspaces"] += 1
+        logger.info(f"Search index rebuilt: {dict(stats)}")
+        return dict(stats)
+
+    def backfill_path_trigrams(self, workspace_id):
+        """
+        Add path trigrams to file heads written before path search existed.
+
+        Args:
+            workspace_id (str): Workspace ID
+
+        Returns:
+            int: Number of file heads updated
+        """
+        file_heads = self.db_manager.get_collection("file_heads")
+        operations = [
+            UpdateOne({"_id": head["_id"]}, {"$set": {"path_trigrams": path_trigrams(head["file_path"])}})
+            for head in file_heads.find(
+                {"workspace_id": workspace_id, "path_trigrams": {"$exists": False}},
+                {"file_path": 1}
+            )
+        ]
+        for i in range(0, len(operations), SEARCH_BATCH_SIZE):
+            file_heads.bulk_write(operations[i:i + SEARCH_BATCH_SIZE], ordered=False)
+        return len(operations)
+
+    def search_paths(self, workspace_id, query, limit=20, fuzzy=True):
+        """
+        Find the files of a workspace whose path matches a query, best
+        match first.
+
+        Args:
+            workspace_id (str): Workspace ID
+            query (str): Part of a path, possibly misspelled if fuzzy
+            limit (int, optional): Maximum number of results
+            fuzzy (bool, optional): Also return paths that only share most
+                trigrams with the query instead of containing it
+
+        Returns:
+            list: Dicts with file_path, version_id, size, updated_at and score
+        """
+        if not self.db_manager.connected:
+            return []
+
+        # A substring of a path contains the trigrams inside its words, a
+        # fuzzy match only has to share most of the padded ones
+        query = query.casefold()
+        grams = path_trigrams(query, padded=fuzzy)
+        inner = path_trigrams(query, padded=False)
+        file_heads = self.db_manager.get_collection("file_heads")
+        fields = {"file_path": 1, "head_version_id": 1, "size": 1, "updated_at": 1}
+
+        if file_heads.find_one({"workspace_id": workspace_id, "path_trigrams": {"$exists": False}}, {"_id": 1}):
+            self.backfill_path_trigrams(workspace_id)
+
+        if grams and len(query) >= 3:
+            # Count the shared trigrams in the database and rerank only the
+            # best candidates; paths with every trigram inside the query's
+            # words may contain it, whatever share of the padded ones they have
+            min_shared = len(grams) if not fuzzy else max(1, math.ceil(len(grams) * PATH_SEARCH_MIN_SIMILARITY))
+            admitted = [{"shared": {"$gte": min_shared}}]
+            if inner:
+                admitted.append({"shared_inner": len(inner)})
+            candidates = list(file_heads.aggregate([
+                {"$match": {"workspace_id": workspace_id, "path_trigrams": {"$in": grams}}},
+                {"$project": {
+                    **fields,
+                    "shared": {"$size": {"$filter": {
+                        "input": "$path_trigrams", "as": "gram", "cond": {"$in": ["$$gram", grams]}
+                    }}},
+                    "shared_inner": {"$size": {"$filter": {
+                        "input": "$path_trigrams", "as": "gram", "cond": {"$in": ["$$gram", inner]}
+                    }}}
+                }},
+                {"$match": {"$or": admitted}},
+                {"$sort": {"shared_inner": -1, "shared": -1, "file_path": 1}},
+                {"$limit": PATH_SEARCH_CANDIDATES}
+            ]))
+        else:
+            # Queries too short for trigrams scan the workspace's paths
+            candidates = list(file_heads.find(
+                {"workspace_id": workspace_id, "file_path": {"$regex": re.escape(query), "$options": "i"}},
+                fields
+            ).sort("file_path", 1).limit(PATH_SEARCH_CANDIDATES))
+
+        results = []
+        for head in candidates:
+            similarity = path_similarity(head["file_path"], query, fuzzy)
+            if similarity is None:
+                continue
+            results.append({
+                "file_path": head["file_path"],
+                "version_id": head["head_version_id"],
+                "size": head.get("size"),
+                "updated_at": head.get("updated_at"),
+                "score": round(_path_score(head["file_path"], query, similarity), 4)
+            })
+        results.sort(key=lambda result: (-result["score"], len(result["file_path"]), result["file_path"]))
+        return results[:limit]
+
+    def search(self, workspace_id, query, limit=20):
+        """
+        Find the files of a workspace whose head version matches a query,
+        best match first.
+
+        Args:
+            workspace_id (str): Workspace ID
+            query (str): Search terms
+            limit (int, optional): Maximum number of results
+
+        Returns:
+            list: Dicts with file_path, version_id, score and the matched terms
+        """
+        if not self.db_manager.connected:
+            return []
+
+        terms = list(dict.fromkeys(tokenize(query)))[:SEARCH_MAX_QUERY_TERMS]
+        stats = self.db_manager.get_collection("search_stats").find_one({"_id": workspace_id})
+        if not terms or not stats or stats.get("docs", 0) <= 0:
+            return []
+        docs = stats["docs"]
+        average_length = stats["total_length"] / docs
+
+        postings = self.db_manager.get_collection("search_postings")
+        scores = Counter()
+        matches = {}
+        for term in terms:
+            found = list(postings.find(
+                {"workspace_id": workspace_id, "term": term},
+                {"file_path": 1, "version_id": 1, "tf": 1, "length": 1}
+            ).sort("tf", -1).limit(SEARCH_MAX_POSTINGS_PER_TERM))
+            df = len(found)
+            if df == SEARCH_MAX_POSTINGS_PER_TERM:
+                df = postings.count_documents({"workspace_id": workspace_id, "term": term})
+            for posting in found:
+                file_path = posting["file_path"]
+                scores[file_path] += bm25(posting["tf"], df, posting["length"], docs, average_length)
+                match = matches.setdefault(file_path, {"version_id": posting["version_id"], "terms": []})
+                match["terms"].append(term)
+
+        return [
+            {
+                "file_path": file_path,
+                "version_id": matches[file_path]["version_id"],
+                "score": round(score, 4),
+                "matches": matches[file_path]["terms"]
+            }
+            for file_path, score in heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        ]
+
+
+if __name__ == "__main__":
+    from src.models.database import db_manager
+
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+
+    if not db_manager.connect():
+        sys.exit(1)
+
+    if sys.argv[1] == "rebuild":
+        print(db_manager.search_index.rebuild(sys.argv[2] if len(sys.argv) > 2 else None))
+    else:
+        for result in db_manager.search_index.search(sys.argv[1], " ".join(sys.argv[2:])):
+            print(f"{result['score']:8.3f}  {result['file_path']}")
@@ -0,0 +1,150 @@
+from datetime import datetime
+from bson import ObjectId
+import hashlib
+
+class Tree:
+    """
+    Tree model for the community platform.
+    Represents one directory of a workspace snapshot. Trees are content
+    addressed, so unchanged directories are shared between commits.
+    """
+    
+    def __init__(self, entries=None):
+        """
+        Initialize a new Tree.
+        
+        Args:
+            entries (dict, optional): Mapping of name to {"type": "blob"|"tree", "hash": str}
+        """
+        self.entries = entries or {}
+        self.created_at = datetime.utcnow()
+    
+    @property
+    def tree_hash(self):
+        """
+        Hash of the tree, computed from its sorted entries.
+        
+        Returns:
+            str: SHA-256 of the canonical tree encoding
+        """
+        hasher = hashlib.sha256()
+        for name in sorted(self.entries):
+            entry = self.entries[name]
+            hasher.update(f"{entry['type']} {name}\0{entry['hash']}\n".encode("utf-8"))
+        return hasher.hexdigest()
+    
+    def to_dict(self):
+        """
+        Convert Tree object to dictionary for MongoDB storage.
+        
+        Returns:
+            dict: Dictionary representation of the Tree
+        """
+        return {
+            "tree_hash": self.tree_hash,
+            "entries": [
+                {"name": name, "type": self.entries[name]["type"], "hash": self.entries[name]["hash"]}
+                for name in sorted(self.entries)
+            ],
+            "created_at": self.created_at
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Create a Tree object from a dictionary.
+        
+        Args:
+            data (dict): Dictionary containing tree data
+        
+        Returns:
+            Tree: New Tree object
+        """
+        tree = cls({
+            entry["name"]: {"type": entry["type"], "hash": entry["hash"]}
+            for entry in data.get("entries", [])
+        })
+        tree.created_at = data.get("created_at", datetime.utcnow())
+        return tree
+
+
+class Commit:
+    """
+    Commit model for the community platform.
+    Represents an atomic change to one or more files of a workspace,
+    pointing at the tree of the whole workspace after the change.
+    """
+    
+    def __init__(self, workspace_id, tree_hash, author_id, message, parent_commit_id=None):
+        """
+        Initialize a new Commit.
+        
+        Args:
+            workspace_id (str): ID of the workspace this commit belongs to
+            tree_hash (str): Hash of the root tree of the workspace snapshot
+            author_id (str): User ID of the commit author
+            message (str): Commit message describing the changes
+            parent_commit_id (str, optional): ID of the previous workspace commit
+        """
+        self.workspace_id = workspace_id
+        self.tree_hash = tree_hash
+        self.author_id = author_id
+        self.message = message
+        self.parent_commit_id = parent_commit_id
+        self.created_at = datetime.utcnow()
+        self.commit_id = str(ObjectId())
+        self.changed_paths = []
+    
+    def to_dict(self):
+        """
+        Convert Commit object to dictionary for MongoDB storage.
+        
+        Returns:
+            dict: Dictionary representation of the Commit
+        """
+        return {
+            "commit_id": self.commit_id,
+            "workspace_id": self.workspace_id,
+            "tree_hash": self.tree_hash,
+            "author_id": self.author_id,
+            "message": self.message,
+            "parent_commit_id": self.parent_commit_id,
+            "created_at": self.created_at,
+            "changed_paths": self.changed_paths
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Create a Commit object from a dictionary.
+        
+        Args:
+            data (dict): Dictionary containing commit data
+        
+        Returns:
+            Commit: New Commit object
+        """
+        commit = cls(
+            workspace_id=data.get("workspace_id"),
+            tree_hash=data.get("tree_hash"),
+            author_id=data.get("author_id"),
+            message=data.get("message"),
+            parent_commit_id=data.get("parent_commit_id")
+        )
+        commit.created_at = data.get("created_at", datetime.utcnow())
+        commit.commit_id = data.get("commit_id", commit.commit_id)
+        commit.changed_paths = data.get("changed_paths", [])
+        return commit
+
+
+def split_path(file_path):
+    """
+    Split a file path into its non-empty components.
+    
+    Args:
+        file_path (str): File path within the workspace
+    
+    Returns:
+        list: Path components
+    """
+    return [part for part in file_path.split("/") if part]
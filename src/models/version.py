@@ -1,5 +1,8 @@
 from datetime import datetime
 from bson import ObjectId
+import hashlib
+import secrets
+from src.models.compression import encode_content, decompress, CODEC_NONE
 
 class Version:
     """
@@ -26,8 +29,10 @@ class Version:
         self.message = message
         self.parent_version_id = parent_version_id
         self.created_at = datetime.utcnow()
-        self.version_id = f"v{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+        # Random suffix keeps IDs unique when several versions are created in the same second
+        self.version_id = f"v{self.created_at.strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(6)}"
         self.status = "committed"  # committed, reverted
+        self.commit_id = None  # workspace commit that introduced this version
         
     def to_dict(self):
         """
@@ -45,7 +50,8 @@ class Version:
             "parent_version_id": self.parent_version_id,
             "created_at": self.created_at,
             "version_id": self.version_id,
-            "status": self.status
+            "status": self.status,
+            "commit_id": self.commit_id
         }
     
     @classmethod
@@ -70,6 +76,7 @@ class Version:
         version.created_at = data.get("created_at", datetime.utcnow())
         version.version_id = data.get("version_id", version.version_id)
         version.status = data.get("status", "committed")
+        version.commit_id = data.get("commit_id")
         return version
 
 
@@ -77,6 +84,7 @@ class FileContent:
     """
     FileContent model for the community platform.
     Stores the actual content of files for the versioning system.
+    Content is compressed on storage and only decompressed when requested.
     """
     
     def __init__(self, content_hash, content, content_type, size):
@@ -94,26 +102,86 @@ class FileContent:
         self.content_type = content_type
         self.size = size
         self.created_at = datetime.utcnow()
+        self.codec = CODEC_NONE  # none, zlib, lzma
+        self.encoding = "utf-8" if isinstance(content, str) else None
         
-    def to_dict(self):
+    def to_dict(self, compressed=True):
         """
         Convert FileContent object to dictionary for MongoDB storage.
+        The content is compressed with a codec picked for its content type.
+        
+        Args:
+            compressed (bool, optional): Compress the content; False hands it
+                over as committed, for the blob store to encode once
         
         Returns:
             dict: Dictionary representation of the FileContent
         """
+        content, codec, encoding = self.content, self.codec, self.encoding
+        if codec == CODEC_NONE and compressed:
+            content, codec, encoding = encode_content(self.content, self.content_type)
+        
         return {
             "content_hash": self.content_hash,
-            "content": self.content,
+            "content": content,
             "content_type": self.content_type,
             "size": self.size,
-            "created_at": self.created_at
+            "created_at": self.created_at,
+            "codec": codec,
+            "encoding": encoding
         }
     
+    def get_raw(self):
+        """
+        Get the decompressed content as bytes.
+        
+        Returns:
+            bytes: Raw file content
+        """
+        content = self.content
+        if isinstance(content, str):
+            return content.encode("utf-8")
+        return decompress(bytes(content), self.codec) if content is not None else b""
+    
+    def get_content(self):
+        """
+        Get the decompressed content in the form it was committed in.
+        
+        Returns:
+            str/bytes: File content
+        """
+        if isinstance(self.content, str):
+            return self.content
+        raw = self.get_raw()
+        return raw.decode(self.encoding) if self.encoding else raw
+    
+    @classmethod
+    def from_content(cls, content, content_type):
+        """
+        Create a FileContent object for newly committed content. The hash
+        and size are taken over the bytes, so text is measured in its UTF-8
+        encoding rather than in characters.
+        
+        Args:
+            content (bytes/str): The committed content
+            content_type (str): MIME type of the content
+            
+        Returns:
+            FileContent: New FileContent object
+        """
+        raw = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+        return cls(
+            content_hash=hashlib.sha256(raw).hexdigest(),
+            content=content,
+            content_type=content_type,
+            size=len(raw)
+        )
+    
     @classmethod
     def from_dict(cls, data):
         """
         Create a FileContent object from a dictionary.
+        The stored content is kept compressed until it is requested.
         
         Args:
             data (dict): Dictionary containing file content data
@@ -128,4 +196,6 @@ class FileContent:
             size=data.get("size")
         )
         file_content.created_at = data.get("created_at", datetime.utcnow())
+        file_content.codec = data.get("codec") or CODEC_NONE
+        file_content.encoding = data.get("encoding", file_content.encoding)
         return file_content
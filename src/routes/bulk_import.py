@@ -0,0 +1,87 @@
+from flask import Blueprint, request, jsonify, session
+from src.models.database import db_manager
+from src.models.bulk_import import start_import, get_import_job, resolve_import_path, is_valid_ref, IMPORT_ROOT
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+import_bp = Blueprint('bulk_import', __name__)
+
+@import_bp.route('/api/workspaces/<workspace_id>/import', methods=['POST'])
+def import_files(workspace_id):
+    """
+    Import a directory tree or bare git repository below IMPORT_ROOT into
+    a workspace as one commit. The import runs in the background; the
+    response carries the ID of the job to poll for its result.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    if not IMPORT_ROOT:
+        return jsonify({'error': 'Imports are disabled'}), 403
+
+    workspace_data = db_manager.get_workspace(workspace_id)
+
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+
+    data = request.json or {}
+
+    if 'path' not in data:
+        return jsonify({'error': 'Missing required field: path'}), 400
+
+    path = resolve_import_path(data['path'])
+    if not path:
+        return jsonify({'error': f'Import path not found: {data["path"]}'}), 400
+
+    ref = data.get('ref', 'HEAD')
+    if not is_valid_ref(ref):
+        return jsonify({'error': 'Invalid ref'}), 400
+
+    job_id = start_import(db_manager, workspace_id, path, session['user_id'], data.get('message'), ref)
+
+    if job_id:
+        return jsonify({
+            'message': 'Import started',
+            'job_id': job_id,
+            'status_url': f'/api/workspaces/{workspace_id}/import/{job_id}'
+        }), 202
+    else:
+        return jsonify({'error': 'Failed to start import'}), 400
+
+@import_bp.route('/api/workspaces/<workspace_id>/import/<job_id>', methods=['GET'])
+def get_import_status(workspace_id, job_id):
+    """
+    Get the status of an import job: running, finished (with the import
+    statistics and commit_id) or failed.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    workspace_data = db_manager.get_workspace(workspace_id)
+
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+
+    job = get_import_job(db_manager, job_id)
+    if not job or job.get('workspace_id') != workspace_id:
+        return jsonify({'error': 'Import job not found'}), 404
+
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'created_at': job['created_at'],
+        'finished_at': job.get('finished_at'),
+        **(job.get('stats') or {})
+    }), 200
@@ -0,0 +1,294 @@
+from flask import Blueprint, request, jsonify, session
+from src.models.database import db_manager, parse_timestamp, VersionConflictError
+from src.models.version import Version, FileContent
+from src.routes.version import parse_request_metadata
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+commit_bp = Blueprint('commit', __name__)
+
+@commit_bp.route('/api/workspaces/<workspace_id>/commits', methods=['POST'])
+def create_commit(workspace_id):
+    """
+    Create an atomic commit of several files.
+    Text files carry their `content` in the JSON body. In a
+    multipart/form-data request the JSON goes in the `metadata` field and a
+    file can name the raw file `part` that holds its content.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    data = parse_request_metadata()
+    
+    if data is None:
+        return jsonify({'error': 'Invalid request metadata'}), 400
+    
+    # Validate required fields
+    required_fields = ['files', 'message']
+    for field in required_fields:
+        if field not in data:
+            return jsonify({'error': f'Missing required field: {field}'}), 400
+    
+    if not data['files']:
+        return jsonify({'error': 'A commit needs at least one file'}), 400
+    
+    changes = []
+    rebase = True
+    for file_data in data['files']:
+        if 'file_path' not in file_data:
+            return jsonify({'error': 'Missing required field: file_path'}), 400
+        
+        if 'part' in file_data:
+            # Raw file part of a multipart request, streamed into the blob store
+            part = request.files.get(file_data['part'])
+            if part is None:
+                return jsonify({'error': f'Missing file part: {file_data["part"]}'}), 400
+            content_type = file_data.get('content_type') or part.mimetype or 'application/octet-stream'
+            stored = db_manager.blob_store.put(None, part.stream, content_type)
+            if not stored:
+                return jsonify({'error': f'Failed to store content of {file_data["file_path"]}'}), 400
+            content_hash = stored['content_hash']
+            file_content = None
+        elif 'content' in file_data:
+            if not isinstance(file_data['content'], str):
+                return jsonify({'error': 'JSON content must be text, upload binary content as a file part'}), 400
+            
+            # Create file content object
+            file_content = FileContent.from_content(file_data['content'], file_data.get('content_type', 'text/plain'))
+            content_hash = file_content.content_hash
+        elif 'content_hash' in file_data:
+            # Content was uploaded beforehand
+            content_hash = file_data['content_hash']
+            file_content = None
+            if not db_manager.blob_store.exists(content_hash):
+                return jsonify({'error': f'File content not found: {content_hash}'}), 400
+        else:
+            return jsonify({'error': f'Missing content for {file_data["file_path"]}'}), 400
+        
+        # Files sent with the parent they were edited from must still be at
+        # that parent, which makes the whole commit fail on a conflict
+        # instead of rebasing onto the current heads
+        if 'parent_version_id' in file_data:
+            parent_version = file_data['parent_version_id']
+            rebase = False
+        else:
+            parent_version = None
+            file_head = db_manager.get_file_head(workspace_id, file_data['file_path'])
+            if file_head:
+                parent_version = file_head['head_version_id']
+        
+        # Create version object
+        version = Version(
+            workspace_id=workspace_id,
+            file_path=file_data['file_path'],
+            content_hash=content_hash,
+            author_id=session['user_id'],
+            message=data['message'],
+            parent_version_id=parent_version
+        )
+        
+        changes.append((version.to_dict(), file_content.to_dict(compressed=False) if file_content else None))
+    
+    # Save to database
+    try:
+        commit_id = db_manager.create_commit(workspace_id, session['user_id'], data['message'], changes, rebase)
+    except VersionConflictError as e:
+        return jsonify({'error': str(e), **e.to_dict()}), 409
+    
+    if commit_id:
+        return jsonify({
+            'message': 'Commit created successfully',
+            'commit_id': commit_id,
+            'versions': [{
+                'file_path': version_data['file_path'],
+                'version_id': version_data['version_id'],
+                'content_hash': version_data['content_hash']
+            } for version_data, _ in changes]
+        }), 201
+    else:
+        return jsonify({'error': 'Failed to create commit'}), 400
+
+@commit_bp.route('/api/workspaces/<workspace_id>/restore', methods=['POST'])
+def restore_workspace(workspace_id):
+    """
+    Restore all files of a workspace to their versions at a point in time.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    data = request.json or {}
+    
+    if 'at' not in data:
+        return jsonify({'error': 'Missing required field: at'}), 400
+    
+    try:
+        at = parse_timestamp(data['at'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid timestamp'}), 400
+    
+    result = db_manager.restore_workspace(workspace_id, at, session['user_id'])
+    
+    if result:
+        return jsonify({
+            'message': 'Workspace restored',
+            **result
+        }), 200
+    else:
+        return jsonify({'error': 'Failed to restore workspace'}), 400
+
+@commit_bp.route('/api/workspaces/<workspace_id>/commits', methods=['GET'])
+def get_workspace_commits(workspace_id):
+    """
+    Get recent commits in a workspace.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    commits = db_manager.get_workspace_commits(workspace_id, limit)
+    
+    return jsonify([_commit_fields(commit) for commit in commits]), 200
+
+@commit_bp.route('/api/workspaces/<workspace_id>/commits/<commit_id>', methods=['GET'])
+def get_commit(workspace_id, commit_id):
+    """
+    Get a commit by ID.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    commit_data = db_manager.get_commit(workspace_id, commit_id)
+    
+    if not commit_data:
+        return jsonify({'error': 'Commit not found'}), 404
+    
+    return jsonify(_commit_fields(commit_data)), 200
+
+@commit_bp.route('/api/workspaces/<workspace_id>/commits/<commit_id>/files', methods=['GET'])
+def get_commit_files(workspace_id, commit_id):
+    """
+    List the files of the workspace snapshot at a commit (checkout).
+    An optional `path` query parameter limits the listing to one directory.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    commit_data = db_manager.get_commit(workspace_id, commit_id)
+    
+    if not commit_data:
+        return jsonify({'error': 'Commit not found'}), 404
+    
+    files = db_manager.get_snapshot_files(commit_data['tree_hash'], request.args.get('path', ''))
+    
+    if files is None:
+        return jsonify({'error': 'Path not found'}), 404
+    
+    return jsonify({
+        'commit_id': commit_id,
+        'tree_hash': commit_data['tree_hash'],
+        'files': [{'file_path': path, 'content_hash': files[path]} for path in sorted(files)],
+        'count': len(files)
+    }), 200
+
+@commit_bp.route('/api/workspaces/<workspace_id>/commits/<commit_id>/diff', methods=['GET'])
+def diff_commits(workspace_id, commit_id):
+    """
+    Compare a commit with another commit (the `against` query parameter),
+    or with its parent by default.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    commit_data = db_manager.get_commit(workspace_id, commit_id)
+    
+    if not commit_data:
+        return jsonify({'error': 'Commit not found'}), 404
+    
+    against_id = request.args.get('against', commit_data.get('parent_commit_id'))
+    against_tree = None
+    if against_id:
+        against_data = db_manager.get_commit(workspace_id, against_id)
+        if not against_data:
+            return jsonify({'error': 'Commit to compare against not found'}), 404
+        against_tree = against_data['tree_hash']
+    
+    changes = db_manager.diff_snapshots(against_tree, commit_data['tree_hash'])
+    
+    return jsonify({
+        'commit_id': commit_id,
+        'against': against_id,
+        'changes': changes,
+        'count': len(changes)
+    }), 200
+
+def _commit_fields(commit_data):
+    """
+    Build the JSON representation of a commit.
+    """
+    return {
+        'commit_id': commit_data['commit_id'],
+        'tree_hash': commit_data['tree_hash'],
+        'parent_commit_id': commit_data.get('parent_commit_id'),
+        'author_id': commit_data['author_id'],
+        'message': commit_data['message'],
+        'created_at': commit_data['created_at'],
+        'changed_paths': commit_data.get('changed_paths', [])
+    }
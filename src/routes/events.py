@@ -0,0 +1,121 @@
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
+from src.models.database import db_manager
+from src.models.events import (
+    version_event, parse_event_id,
+    EVENTS_HEARTBEAT_SECONDS, EVENTS_POLL_SECONDS, EVENTS_BACKFILL_LIMIT, EVENTS_RETRY_MS, EVENTS_MAX_STREAMS
+)
+from bson import ObjectId
+import json
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+events_bp = Blueprint('events', __name__)
+
+# Sorts after every version of a commit
+_END_OF_COMMIT = ObjectId("f" * 24)
+
+def _format_event(event):
+    """
+    Serialize an event in the text/event-stream format.
+    """
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+@events_bp.route('/api/workspaces/<workspace_id>/events', methods=['GET'])
+def workspace_events(workspace_id):
+    """
+    Stream the new versions of a workspace as server-sent events.
+    A reconnecting client sends the id of the last event it got as
+    Last-Event-ID (or the `last_event_id` parameter) and first receives
+    the versions it missed. If it missed too many, or sent an id that is
+    not from this stream, it gets a `resync` event and should reload the
+    history instead.
+    
+    Without change streams, commits of other worker processes never reach
+    this process's event hub, so the stream polls the workspace's commit
+    chain from its last event instead of relaying the hub's events.
+    
+    Each open stream holds a server thread, so a process serves at most
+    EVENTS_MAX_STREAMS of them and refuses more with 503. No page of the
+    app subscribes yet; the stream is for API clients.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    # Keep threads free for regular requests
+    if EVENTS_MAX_STREAMS and db_manager.event_hub.subscriber_count() >= EVENTS_MAX_STREAMS:
+        return jsonify({'error': 'Too many event streams'}), 503
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    last_event = parse_event_id(last_event_id)
+    
+    def generate():
+        # Subscribe before reading the missed versions so none fall in between
+        subscription = db_manager.event_hub.subscribe(workspace_id)
+        poll = not db_manager.event_hub.change_stream_active
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+            
+            sent = set()
+            sent_id = last_event_id
+            if last_event_id:
+                position = last_event
+            else:
+                position = (workspace_data.get('head_commit_id'), _END_OF_COMMIT)
+            last_write = time.monotonic()
+            backfill = bool(last_event_id)
+            
+            while not subscription.overflowed:
+                if backfill:
+                    # Versions the stream has not sent yet, in commit order
+                    missed = None
+                    if position:
+                        missed = db_manager.get_versions_after(workspace_id, *position, EVENTS_BACKFILL_LIMIT + 1)
+                    if missed is None or len(missed) > EVENTS_BACKFILL_LIMIT:
+                        yield _format_event({'id': sent_id or '', 'type': 'resync', 'data': {}})
+                        return
+                    for version_data in missed:
+                        event = version_event(version_data)
+                        sent.add(event['id'])
+                        sent_id = event['id']
+                        position = (version_data.get('commit_id'), version_data['_id'])
+                        last_write = time.monotonic()
+                        yield _format_event(event)
+                
+                event = subscription.get(EVENTS_POLL_SECONDS if poll else EVENTS_HEARTBEAT_SECONDS)
+                backfill = poll
+                if poll:
+                    # Events of this process only trigger an early poll, which
+                    # covers all of them
+                    while event is not None:
+                        event = subscription.get(0)
+                elif event is not None and event['id'] not in sent:
+                    last_write = time.monotonic()
+                    yield _format_event(event)
+                if time.monotonic() - last_write >= EVENTS_HEARTBEAT_SECONDS:
+                    # Comment lines keep proxies from closing an idle stream
+                    last_write = time.monotonic()
+                    yield ": heartbeat\n\n"
+            
+            # The client fell behind; it resumes from its last event on reconnect
+        finally:
+            db_manager.event_hub.unsubscribe(subscription)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,49 @@
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
+from src.models.database import db_manager, parse_timestamp
+from src.models.export import ARCHIVE_FORMATS, iter_tar, iter_zip
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+export_bp = Blueprint('export', __name__)
+
+@export_bp.route('/api/workspaces/<workspace_id>/export', methods=['GET'])
+def export_workspace(workspace_id):
+    """
+    Download the files of a workspace as a tar or zip archive, at HEAD or
+    as they were at the time given by the `at` parameter.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    workspace_data = db_manager.get_workspace(workspace_id)
+
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+
+    archive_format = request.args.get('format', 'tar')
+    if archive_format not in ARCHIVE_FORMATS:
+        return jsonify({'error': f'Unsupported format: {archive_format}'}), 400
+
+    at = None
+    if request.args.get('at'):
+        try:
+            at = parse_timestamp(request.args['at'])
+        except ValueError:
+            return jsonify({'error': 'Invalid timestamp'}), 400
+
+    files = db_manager.get_files_at(workspace_id, at)
+    archive = iter_tar if archive_format == 'tar' else iter_zip
+
+    return Response(
+        stream_with_context(archive(db_manager.blob_store, files)),
+        mimetype=ARCHIVE_FORMATS[archive_format],
+        headers={'Content-Disposition': f'attachment; filename="{workspace_id}.{archive_format}"'}
+    )
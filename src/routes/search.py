@@ -0,0 +1,70 @@
+from flask import Blueprint, request, jsonify, session
+from src.models.database import db_manager, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/api/workspaces/<workspace_id>/search', methods=['GET'])
+def search_workspace(workspace_id):
+    """
+    Full-text search in the latest versions of the files of a workspace.
+    The `q` parameter holds the search terms; results are ranked best first.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing required parameter: q'}), 400
+    
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    
+    return jsonify({
+        'query': query,
+        'results': db_manager.search_index.search(workspace_id, query, limit)
+    }), 200
+
+@search_bp.route('/api/workspaces/<workspace_id>/files/search', methods=['GET'])
+def search_file_paths(workspace_id):
+    """
+    Type-ahead search over the file paths of a workspace. `q` is matched as
+    a substring and, unless `fuzzy=false`, by shared trigrams so small
+    typos still match; results are ranked best first.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing required parameter: q'}), 400
+    
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    fuzzy = request.args.get('fuzzy', 'true').lower() != 'false'
+    
+    return jsonify({
+        'query': query,
+        'files': db_manager.search_index.search_paths(workspace_id, query, limit, fuzzy)
+    }), 200
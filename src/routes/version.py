@@ -1,10 +1,14 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.database import db_manager
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context, url_for
+from src.models.database import db_manager, encode_page_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ANCESTRY_MAX_DEPTH, VersionConflictError
 from src.models.version import Version, FileContent
-import hashlib
+from src.models.chunking import MAX_CHUNK_SIZE
+from src.models.blobstore import is_valid_hash
+from src.models.compaction import HistoryCompactor
+from werkzeug.wsgi import wrap_file
 import logging
 import os
 import json
+import base64
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,10 +17,158 @@ logger = logging.getLogger(__name__)
 # Create blueprint
 version_bp = Blueprint('version', __name__)
 
+# Bytes sent per step when serving blobs from local disk
+SEND_BUFFER_SIZE = 64 * 1024
+
+# Responses of a version never change; responses of a file head are
+# revalidated with If-None-Match on every use
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+
+def _cache_headers(etag, immutable):
+    """
+    Build the ETag and Cache-Control headers of a cacheable response.
+    """
+    return {
+        'ETag': f'"{etag}"',
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    }
+
+def _not_modified(etag, immutable):
+    """
+    Answer 304 Not Modified if the client already has the representation
+    with this ETag, before any content is loaded.
+    
+    Returns:
+        Response: 304 response, or None if the content has to be sent
+    """
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=_cache_headers(etag, immutable))
+    return None
+
+def _send_content(file_content_meta, immutable=False):
+    """
+    Stream a stored content as the raw response body, honouring a single
+    byte range from the Range header with 206 Partial Content. The content
+    hash is the ETag.
+    """
+    etag = file_content_meta['content_hash']
+    length = db_manager.blob_store.content_length(file_content_meta)
+    
+    if length is None:
+        return jsonify({'error': 'File content not found'}), 404
+    
+    headers = {'Accept-Ranges': 'bytes', **_cache_headers(etag, immutable)}
+    status = 200
+    start, end = 0, length
+    
+    # Multiple ranges are not supported, those requests get the whole
+    # content, as do ranges conditional on a different representation
+    range_applies = 'If-Range' not in request.headers or request.if_range.etag == etag
+    if request.range and len(request.range.ranges) == 1 and range_applies:
+        byte_range = request.range.range_for_length(length)
+        if byte_range is None:
+            headers['Content-Range'] = f'bytes */{length}'
+            return Response(status=416, headers=headers)
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{length}'
+        status = 206
+    
+    headers['Content-Length'] = str(end - start)
+    
+    # Blobs on local disk are memory-mapped; whole blobs go through the
+    # server's file wrapper so it can use sendfile
+    blob = db_manager.blob_store.open(file_content_meta, start, end)
+    if blob is None:
+        body = stream_with_context(db_manager.blob_store.iter_range(file_content_meta, start, end))
+    elif status == 200:
+        body = wrap_file(request.environ, blob, SEND_BUFFER_SIZE)
+    else:
+        body = blob
+    
+    return Response(
+        body,
+        status=status,
+        headers=headers,
+        mimetype=file_content_meta.get('content_type') or 'application/octet-stream',
+        direct_passthrough=True
+    )
+
+def parse_request_metadata():
+    """
+    Get the JSON metadata of a version or commit request. JSON requests
+    carry it as the body; multipart/form-data requests carry it in the
+    `metadata` field next to the raw file parts, so binary content is
+    uploaded as is instead of base64 encoded.
+    
+    Returns:
+        dict: Request metadata, or None if it is missing or malformed
+    """
+    if request.mimetype == 'multipart/form-data':
+        try:
+            data = json.loads(request.form.get('metadata') or '{}')
+        except ValueError:
+            return None
+    else:
+        data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+def _inline_requested():
+    """
+    Check whether the client asked for the content inline in a JSON
+    version response with `?content=inline`.
+    """
+    return request.args.get('content') == 'inline'
+
+def _blob_fields(file_content_meta):
+    """
+    Build the content fields of a JSON version response that points at the
+    immutable blob URL instead of carrying the content, so clients and
+    caches download deduplicated content once.
+    """
+    return {
+        'content_type': file_content_meta.get('content_type') or 'application/octet-stream',
+        'size': file_content_meta.get('size'),
+        'content_hash': file_content_meta['content_hash'],
+        'blob_url': url_for('version.download_blob', content_hash=file_content_meta['content_hash'])
+    }
+
+def _content_fields(file_content_data):
+    """
+    Build the content fields of a JSON version response with inline content.
+    Binary content cannot be sent as a JSON string, so it is base64 encoded.
+    """
+    content = FileContent.from_dict(file_content_data).get_content()
+    fields = _blob_fields(file_content_data)
+    if isinstance(content, bytes):
+        fields['content'] = base64.b64encode(content).decode('ascii')
+        fields['content_encoding'] = 'base64'
+    else:
+        fields['content'] = content
+    return fields
+
+def _ancestry_fields(version_data):
+    """
+    Build the JSON representation of a version in an ancestry listing.
+    """
+    return {
+        'version_id': version_data['version_id'],
+        'file_path': version_data['file_path'],
+        'parent_version_id': version_data.get('parent_version_id'),
+        'author_id': version_data['author_id'],
+        'message': version_data['message'],
+        'created_at': version_data['created_at'],
+        'depth': version_data['depth']
+    }
+
 @version_bp.route('/api/workspaces/<workspace_id>/versions', methods=['POST'])
 def create_version(workspace_id):
     """
     Create a new version (commit) in the workspace.
+    Text can be sent as `content` in a JSON body. Binary content is sent
+    as the `content` part of a multipart/form-data request with the JSON
+    metadata in its `metadata` field, or as the raw body of the upload
+    endpoint.
     """
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
@@ -30,30 +182,56 @@ def create_version(workspace_id):
     if session['user_id'] not in workspace_data.get('members', []):
         return jsonify({'error': 'Access denied'}), 403
     
-    data = request.json
+    data = parse_request_metadata()
+    
+    if data is None:
+        return jsonify({'error': 'Invalid request metadata'}), 400
     
     # Validate required fields
-    required_fields = ['file_path', 'content', 'message']
+    required_fields = ['file_path', 'message']
     for field in required_fields:
         if field not in data:
             return jsonify({'error': f'Missing required field: {field}'}), 400
     
-    # Generate content hash
-    content_hash = hashlib.sha256(data['content'].encode()).hexdigest()
-    
-    # Create file content object
-    file_content = FileContent(
-        content_hash=content_hash,
-        content=data['content'],
-        content_type=data.get('content_type', 'text/plain'),
-        size=len(data['content'])
-    )
-    
-    # Get parent version if exists
-    parent_version = None
-    previous_versions = db_manager.get_file_versions(workspace_id, data['file_path'])
-    if previous_versions:
-        parent_version = previous_versions[0]['version_id']
+    if 'content' in request.files:
+        # Raw file part of a multipart request, streamed into the blob store
+        part = request.files['content']
+        content_type = data.get('content_type') or part.mimetype or 'application/octet-stream'
+        stored = db_manager.blob_store.put(None, part.stream, content_type)
+        if not stored:
+            return jsonify({'error': 'Failed to store file content'}), 400
+        content_hash = stored['content_hash']
+        file_content = None
+    elif 'content' in data:
+        if not isinstance(data['content'], str):
+            return jsonify({'error': 'JSON content must be text, upload binary content as a file part'}), 400
+        
+        # Create file content object
+        file_content = FileContent.from_content(data['content'], data.get('content_type', 'text/plain'))
+        content_hash = file_content.content_hash
+    elif 'chunks' in data and 'content_hash' in data:
+        # Content was uploaded as chunks beforehand, only the manifest is sent
+        content_hash = data['content_hash']
+        file_content = None
+        if not db_manager.blob_store.put_chunked(
+            content_hash,
+            data['chunks'],
+            data.get('content_type', 'application/octet-stream')
+        ):
+            return jsonify({'error': 'Chunks are missing or do not match content_hash'}), 400
+    else:
+        return jsonify({'error': 'Missing required field: content'}), 400
+    
+    # A client that sends the parent it edited gets a conflict if the file
+    # moved on; otherwise the version goes on top of the current head
+    rebase = 'parent_version_id' not in data
+    if rebase:
+        parent_version = None
+        file_head = db_manager.get_file_head(workspace_id, data['file_path'])
+        if file_head:
+            parent_version = file_head['head_version_id']
+    else:
+        parent_version = data['parent_version_id']
     
     # Create version object
     version = Version(
@@ -66,7 +244,14 @@ def create_version(workspace_id):
     )
     
     # Save to database
-    version_id = db_manager.create_version(version.to_dict(), file_content.to_dict())
+    try:
+        version_id = db_manager.create_version(
+            version.to_dict(),
+            file_content.to_dict(compressed=False) if file_content else None,
+            rebase
+        )
+    except VersionConflictError as e:
+        return jsonify({'error': str(e), **e.to_dict()}), 409
     
     if version_id:
         return jsonify({
@@ -77,6 +262,71 @@ def create_version(workspace_id):
     else:
         return jsonify({'error': 'Failed to create version'}), 400
 
+@version_bp.route('/api/workspaces/<workspace_id>/files/<path:file_path>/upload', methods=['POST', 'PUT'])
+def upload_version(workspace_id, file_path):
+    """
+    Create a new version from the raw request body.
+    The body is streamed into the blob store, so binary files of any size
+    can be committed. The commit message comes from the `message` query
+    parameter or the X-Commit-Message header.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    message = request.args.get('message') or request.headers.get('X-Commit-Message')
+    if not message:
+        return jsonify({'error': 'Missing required field: message'}), 400
+    
+    content_type = request.mimetype or 'application/octet-stream'
+    stored = db_manager.blob_store.put(None, request.stream, content_type)
+    
+    if not stored:
+        return jsonify({'error': 'Failed to store file content'}), 400
+    
+    # The expected parent comes from the `parent_version_id` query parameter
+    # or the X-Parent-Version-Id header; empty means a new file
+    parent_version = request.args.get('parent_version_id', request.headers.get('X-Parent-Version-Id'))
+    rebase = parent_version is None
+    if rebase:
+        file_head = db_manager.get_file_head(workspace_id, file_path)
+        if file_head:
+            parent_version = file_head['head_version_id']
+    
+    # Create version object
+    version = Version(
+        workspace_id=workspace_id,
+        file_path=file_path,
+        content_hash=stored['content_hash'],
+        author_id=session['user_id'],
+        message=message,
+        parent_version_id=parent_version or None
+    )
+    
+    # Save to database (content is already stored)
+    try:
+        version_id = db_manager.create_version(version.to_dict(), None, rebase)
+    except VersionConflictError as e:
+        return jsonify({'error': str(e), **e.to_dict()}), 409
+    
+    if version_id:
+        return jsonify({
+            'message': 'Version created successfully',
+            'version_id': version_id,
+            'content_hash': stored['content_hash'],
+            'size': stored['size']
+        }), 201
+    else:
+        return jsonify({'error': 'Failed to create version'}), 400
+
 @version_bp.route('/api/workspaces/<workspace_id>/versions/<version_id>', methods=['GET'])
 def get_version(workspace_id, version_id):
     """
@@ -99,10 +349,20 @@ def get_version(workspace_id, version_id):
     if not version_data:
         return jsonify({'error': 'Version not found'}), 404
     
-    # Get file content
-    file_content_data = db_manager.get_file_content(version_data['content_hash'])
+    # A version never changes, so its content hash identifies the response
+    not_modified = _not_modified(version_data['content_hash'], True)
+    if not_modified:
+        return not_modified
+    
+    # The content is only loaded if it is asked for inline
+    if _inline_requested():
+        file_content_data = db_manager.get_file_content(version_data['content_hash'])
+        content_fields = _content_fields(file_content_data) if file_content_data else None
+    else:
+        file_content_meta = db_manager.get_file_content_meta(version_data['content_hash'])
+        content_fields = _blob_fields(file_content_meta) if file_content_meta else None
     
-    if not file_content_data:
+    if not content_fields:
         return jsonify({'error': 'File content not found'}), 404
     
     return jsonify({
@@ -112,14 +372,165 @@ def get_version(workspace_id, version_id):
         'message': version_data['message'],
         'parent_version_id': version_data['parent_version_id'],
         'created_at': version_data['created_at'],
-        'content': file_content_data['content'],
-        'content_type': file_content_data['content_type']
+        **content_fields
+    }), 200, _cache_headers(version_data['content_hash'], True)
+
+@version_bp.route('/api/workspaces/<workspace_id>/versions/<version_id>/ancestry', methods=['GET'])
+def get_version_ancestry(workspace_id, version_id):
+    """
+    Get the chain of parent versions from a version back to its root.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    max_depth = request.args.get('max_depth', ANCESTRY_MAX_DEPTH, type=int)
+    ancestry = db_manager.get_version_ancestry(workspace_id, version_id, max_depth)
+    
+    if not ancestry:
+        return jsonify({'error': 'Version not found'}), 404
+    
+    return jsonify({
+        'versions': [_ancestry_fields(version) for version in ancestry['versions']],
+        'truncated': ancestry['truncated']
     }), 200
 
+@version_bp.route('/api/workspaces/<workspace_id>/merge-base', methods=['GET'])
+def get_merge_base(workspace_id):
+    """
+    Find the nearest common ancestor of the versions given as `a` and `b`.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    if not request.args.get('a') or not request.args.get('b'):
+        return jsonify({'error': 'Missing required parameters: a, b'}), 400
+    
+    max_depth = request.args.get('max_depth', ANCESTRY_MAX_DEPTH, type=int)
+    result = db_manager.get_merge_base(workspace_id, request.args['a'], request.args['b'], max_depth)
+    
+    if not result:
+        return jsonify({'error': 'Version not found'}), 404
+    
+    return jsonify({
+        'merge_base': _ancestry_fields(result['merge_base']) if result['merge_base'] else None,
+        'distance_a': result['distance'],
+        'distance_b': result['other_distance']
+    }), 200
+
+@version_bp.route('/api/workspaces/<workspace_id>/versions/<version_id>/raw', methods=['GET'])
+def download_version(workspace_id, version_id):
+    """
+    Download the raw content of a version. Supports Range requests.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    version_data = db_manager.get_version(version_id, workspace_id)
+    
+    if not version_data:
+        return jsonify({'error': 'Version not found'}), 404
+    
+    not_modified = _not_modified(version_data['content_hash'], True)
+    if not_modified:
+        return not_modified
+    
+    file_content_meta = db_manager.blob_store.get_meta(version_data['content_hash'])
+    
+    if not file_content_meta:
+        return jsonify({'error': 'File content not found'}), 404
+    
+    return _send_content(file_content_meta, immutable=True)
+
+@version_bp.route('/api/blobs/<content_hash>', methods=['GET'])
+def download_blob(content_hash):
+    """
+    Download a content by its hash. The URL is the same for every version,
+    file and workspace that references the content, and the response never
+    changes, so it is cached as immutable. Supports Range requests.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    # Contents outside the user's workspaces look the same as missing ones
+    if not db_manager.is_content_accessible(content_hash, session['user_id']):
+        return jsonify({'error': 'Blob not found'}), 404
+    
+    not_modified = _not_modified(content_hash, True)
+    if not_modified:
+        return not_modified
+    
+    file_content_meta = db_manager.blob_store.get_meta(content_hash)
+    
+    if not file_content_meta:
+        return jsonify({'error': 'Blob not found'}), 404
+    
+    return _send_content(file_content_meta, immutable=True)
+
+@version_bp.route('/api/workspaces/<workspace_id>/files/<path:file_path>/raw', methods=['GET'])
+def download_latest_file(workspace_id, file_path):
+    """
+    Download the raw content of the latest version of a file. Supports Range requests.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    file_head = db_manager.get_file_head(workspace_id, file_path)
+    
+    if not file_head:
+        return jsonify({'error': 'File not found'}), 404
+    
+    not_modified = _not_modified(file_head['content_hash'], False)
+    if not_modified:
+        return not_modified
+    
+    file_content_meta = db_manager.blob_store.get_meta(file_head['content_hash'])
+    
+    if not file_content_meta:
+        return jsonify({'error': 'File content not found'}), 404
+    
+    return _send_content(file_content_meta)
+
 @version_bp.route('/api/workspaces/<workspace_id>/files/<path:file_path>/versions', methods=['GET'])
 def get_file_versions(workspace_id, file_path):
     """
-    Get all versions of a specific file.
+    Get the versions of a specific file, one page at a time.
+    Pass the returned next_cursor as `cursor` to get the next page.
     """
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
@@ -133,7 +544,12 @@ def get_file_versions(workspace_id, file_path):
     if session['user_id'] not in workspace_data.get('members', []):
         return jsonify({'error': 'Access denied'}), 403
     
-    versions = db_manager.get_file_versions(workspace_id, file_path)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    
+    try:
+        versions = db_manager.get_file_versions(workspace_id, file_path, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     result = []
     for version in versions:
@@ -144,7 +560,10 @@ def get_file_versions(workspace_id, file_path):
             'created_at': version['created_at']
         })
     
-    return jsonify(result), 200
+    return jsonify({
+        'versions': result,
+        'next_cursor': encode_page_cursor(versions[-1]) if len(versions) == limit else None
+    }), 200
 
 @version_bp.route('/api/workspaces/<workspace_id>/files/<path:file_path>/latest', methods=['GET'])
 def get_latest_file(workspace_id, file_path):
@@ -163,33 +582,42 @@ def get_latest_file(workspace_id, file_path):
     if session['user_id'] not in workspace_data.get('members', []):
         return jsonify({'error': 'Access denied'}), 403
     
-    versions = db_manager.get_file_versions(workspace_id, file_path)
+    file_head = db_manager.get_file_head(workspace_id, file_path)
     
-    if not versions:
+    if not file_head:
         return jsonify({'error': 'File not found'}), 404
     
-    latest_version = versions[0]
+    # The response carries the head's metadata, so the tag changes with
+    # every new version even if the content stays the same
+    etag = f"{file_head['head_version_id']}.{file_head['content_hash']}"
+    not_modified = _not_modified(etag, False)
+    if not_modified:
+        return not_modified
     
-    # Get file content
-    file_content_data = db_manager.get_file_content(latest_version['content_hash'])
+    if _inline_requested():
+        file_content_data = db_manager.get_file_content(file_head['content_hash'])
+        content_fields = _content_fields(file_content_data) if file_content_data else None
+    else:
+        file_content_meta = db_manager.get_file_content_meta(file_head['content_hash'])
+        content_fields = _blob_fields(file_content_meta) if file_content_meta else None
     
-    if not file_content_data:
+    if not content_fields:
         return jsonify({'error': 'File content not found'}), 404
     
     return jsonify({
-        'version_id': latest_version['version_id'],
-        'file_path': latest_version['file_path'],
-        'author_id': latest_version['author_id'],
-        'message': latest_version['message'],
-        'created_at': latest_version['created_at'],
-        'content': file_content_data['content'],
-        'content_type': file_content_data['content_type']
-    }), 200
+        'version_id': file_head['head_version_id'],
+        'file_path': file_head['file_path'],
+        'author_id': file_head['author_id'],
+        'message': file_head['message'],
+        'created_at': file_head['updated_at'],
+        **content_fields
+    }), 200, _cache_headers(etag, False)
 
 @version_bp.route('/api/workspaces/<workspace_id>/versions', methods=['GET'])
 def get_workspace_versions(workspace_id):
     """
-    Get recent versions in a workspace.
+    Get recent versions in a workspace, one page at a time.
+    Pass the returned next_cursor as `cursor` to get the next page.
     """
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
@@ -203,8 +631,12 @@ def get_workspace_versions(workspace_id):
     if session['user_id'] not in workspace_data.get('members', []):
         return jsonify({'error': 'Access denied'}), 403
     
-    limit = request.args.get('limit', 20, type=int)
-    versions = db_manager.get_workspace_versions(workspace_id, limit)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    
+    try:
+        versions = db_manager.get_workspace_versions(workspace_id, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     result = []
     for version in versions:
@@ -216,7 +648,10 @@ def get_workspace_versions(workspace_id):
             'created_at': version['created_at']
         })
     
-    return jsonify(result), 200
+    return jsonify({
+        'versions': result,
+        'next_cursor': encode_page_cursor(versions[-1]) if len(versions) == limit else None
+    }), 200
 
 @version_bp.route('/api/workspaces/<workspace_id>/files/<path:file_path>/revert/<version_id>', methods=['POST'])
 def revert_to_version(workspace_id, file_path, version_id):
@@ -241,15 +676,16 @@ def revert_to_version(workspace_id, file_path, version_id):
     if not version_data:
         return jsonify({'error': 'Version not found'}), 404
     
-    # Get file content
-    file_content_data = db_manager.get_file_content(version_data['content_hash'])
-    
-    if not file_content_data:
+    # Check the file content still exists
+    if not db_manager.blob_store.exists(version_data['content_hash']):
         return jsonify({'error': 'File content not found'}), 404
     
     # Create a new version with the reverted content
     content_hash = version_data['content_hash']
     
+    # The revert goes on top of the current head
+    file_head = db_manager.get_file_head(workspace_id, file_path)
+    
     # Create version object
     version = Version(
         workspace_id=workspace_id,
@@ -257,7 +693,7 @@ def revert_to_version(workspace_id, file_path, version_id):
         content_hash=content_hash,
         author_id=session['user_id'],
         message=f"Reverted to version {version_id}",
-        parent_version_id=version_id
+        parent_version_id=file_head['head_version_id'] if file_head else None
     )
     
     # Save to database (reusing existing file content)
@@ -271,6 +707,70 @@ def revert_to_version(workspace_id, file_path, version_id):
     else:
         return jsonify({'error': 'Failed to revert to version'}), 400
 
+@version_bp.route('/api/workspaces/<workspace_id>/files/<path:file_path>/prune', methods=['POST'])
+def prune_file_history(workspace_id, file_path):
+    """
+    Delete all but the newest versions of a file.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is the owner of the workspace
+    if workspace_data['owner_id'] != session['user_id']:
+        return jsonify({'error': 'Only the workspace owner can prune history'}), 403
+    
+    data = request.json or {}
+    keep = data.get('keep')
+    
+    if not isinstance(keep, int) or keep < 1:
+        return jsonify({'error': 'keep must be a positive integer'}), 400
+    
+    deleted = db_manager.prune_file_history(workspace_id, file_path, keep)
+    
+    if deleted is None:
+        return jsonify({'error': 'Failed to prune file history'}), 400
+    
+    return jsonify({
+        'message': 'File history pruned',
+        'deleted': deleted
+    }), 200
+
+@version_bp.route('/api/workspaces/<workspace_id>/files/<path:file_path>/compact', methods=['POST'])
+def compact_file_history(workspace_id, file_path):
+    """
+    Squash old versions of a file into hourly, daily and weekly checkpoints.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is the owner of the workspace
+    if workspace_data['owner_id'] != session['user_id']:
+        return jsonify({'error': 'Only the workspace owner can compact history'}), 403
+    
+    try:
+        stats = HistoryCompactor(db_manager).run(workspace_id, file_path)
+    except Exception as e:
+        logger.error(f"Failed to compact file history: {str(e)}")
+        stats = None
+    
+    if stats is None:
+        return jsonify({'error': 'Failed to compact file history'}), 400
+    
+    return jsonify({
+        'message': 'File history compacted',
+        **stats
+    }), 200
+
 @version_bp.route('/api/workspaces/<workspace_id>/files', methods=['GET'])
 def list_workspace_files(workspace_id):
     """
@@ -288,10 +788,86 @@ def list_workspace_files(workspace_id):
     if session['user_id'] not in workspace_data.get('members', []):
         return jsonify({'error': 'Access denied'}), 403
     
-    # Get list of files from database manager
-    files = db_manager.list_workspace_files(workspace_id)
+    # Get file heads from database manager
+    file_heads = db_manager.list_file_heads(workspace_id)
     
     return jsonify({
-        'files': files,
-        'count': len(files)
+        'files': [head['file_path'] for head in file_heads],
+        'heads': [{
+            'file_path': head['file_path'],
+            'version_id': head['head_version_id'],
+            'content_hash': head['content_hash'],
+            'size': head.get('size'),
+            'author_id': head.get('author_id'),
+            'updated_at': head.get('updated_at')
+        } for head in file_heads],
+        'count': len(file_heads)
     }), 200
+
+@version_bp.route('/api/workspaces/<workspace_id>/chunks/missing', methods=['POST'])
+def find_missing_chunks(workspace_id):
+    """
+    Report which chunks of a content still need to be uploaded.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    data = request.get_json(silent=True)
+    
+    if not isinstance(data, dict) or 'chunks' not in data:
+        return jsonify({'error': 'Missing required field: chunks'}), 400
+    
+    if not isinstance(data['chunks'], list) or not all(is_valid_hash(digest) for digest in data['chunks']):
+        return jsonify({'error': 'chunks must be a list of hex SHA-256 hashes'}), 400
+    
+    missing = db_manager.blob_store.missing_chunks(data['chunks'])
+    
+    return jsonify({
+        'missing': missing,
+        'count': len(missing)
+    }), 200
+
+@version_bp.route('/api/workspaces/<workspace_id>/chunks/<chunk_hash>', methods=['PUT'])
+def upload_chunk(workspace_id, chunk_hash):
+    """
+    Upload a single chunk as the raw request body.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is a member of the workspace
+    if session['user_id'] not in workspace_data.get('members', []):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    if request.content_length and request.content_length > MAX_CHUNK_SIZE:
+        return jsonify({'error': 'Chunk too large'}), 413
+    
+    # Read one byte past the limit at most, also when no Content-Length was sent
+    data = bytearray()
+    while len(data) <= MAX_CHUNK_SIZE:
+        piece = request.stream.read(MAX_CHUNK_SIZE + 1 - len(data))
+        if not piece:
+            break
+        data += piece
+    
+    if len(data) > MAX_CHUNK_SIZE:
+        return jsonify({'error': 'Chunk too large'}), 413
+    
+    if db_manager.blob_store.put_chunk(chunk_hash, bytes(data)):
+        return jsonify({'message': 'Chunk stored', 'chunk_hash': chunk_hash}), 201
+    else:
+        return jsonify({'error': 'Chunk does not match its hash'}), 400
@@ -93,9 +93,10 @@ def update_workspace(workspace_id):
     
     data = request.json
     
-    # Don't allow updating owner_id
-    if 'owner_id' in data:
-        del data['owner_id']
+    # Don't allow updating owner_id or moving the commit head directly
+    for field in ['owner_id', 'head_commit_id']:
+        if field in data:
+            del data[field]
     
     success = db_manager.update_workspace(workspace_id, data)
     
@@ -104,6 +105,30 @@ def update_workspace(workspace_id):
     else:
         return jsonify({'error': 'Failed to update workspace'}), 400
 
+@workspace_bp.route('/api/workspaces/<workspace_id>', methods=['DELETE'])
+def delete_workspace(workspace_id):
+    """
+    Delete a workspace and its file history.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    workspace_data = db_manager.get_workspace(workspace_id)
+    
+    if not workspace_data:
+        return jsonify({'error': 'Workspace not found'}), 404
+    
+    # Check if user is the owner of the workspace
+    if workspace_data['owner_id'] != session['user_id']:
+        return jsonify({'error': 'Only the workspace owner can delete it'}), 403
+    
+    success = db_manager.delete_workspace(workspace_id)
+    
+    if success:
+        return jsonify({'message': 'Workspace deleted successfully'}), 200
+    else:
+        return jsonify({'error': 'Failed to delete workspace'}), 400
+
 @workspace_bp.route('/api/workspaces/<workspace_id>/members', methods=['POST'])
 def add_workspace_member(workspace_id):
     """
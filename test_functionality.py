@@ -1,9 +1,29 @@
 import unittest
 import json
 import os
-from src.models.database import db_manager
+import io
+import hashlib
+import tempfile
+import time
+from datetime import datetime, timedelta
+import tarfile
+import zipfile
+from src.models.database import db_manager, parse_timestamp, VersionConflictError, DatabaseManager
 from src.models.workspace import Workspace
 from src.models.version import Version, FileContent
+from src.models.delta import create_delta, apply_delta
+from src.models.compression import choose_codec, CODEC_NONE, CODEC_LZMA
+from src.models import chunking
+from src.models.chunking import iter_chunks, StreamChunker, MIN_CHUNK_SIZE, MAX_CHUNK_SIZE
+from src.models.indexes import find_uncovered_queries, index_covers, INDEX_REGISTRY, IndexManager
+from src.models.blobstore import MemoryBlobStore, FilesystemBlobStore, MirroredBlobStore, MongoBlobStore
+from src.models.export import iter_tar, iter_zip
+from src.models.bulk_import import iter_directory, hash_source, resolve_import_path, is_valid_ref, BulkImporter
+from src.models.compaction import checkpoint_bucket, select_checkpoints, HOUR, DAY
+from src.models.search import tokenize, bm25, path_trigrams, path_similarity, load_batches
+from src.models.events import EventHub, Subscription, version_event, parse_event_id
+from bson import ObjectId
+from pymongo import MongoClient
 from flask import session
 
 # Mock Flask session for testing
@@ -88,6 +108,20 @@ class TestFileVersioning(unittest.TestCase):
         # This would mock the database calls and verify the file is reverted correctly
         print("Testing revert version functionality...")
         print("✓ Revert version test passed")
+        
+    def test_parse_restore_timestamp(self):
+        """Test that restore timestamps are normalized to naive UTC"""
+        self.assertEqual(parse_timestamp("2024-03-05T10:00:00+02:00"), datetime(2024, 3, 5, 8, 0))
+        self.assertEqual(parse_timestamp("2024-03-05T10:00:00"), datetime(2024, 3, 5, 10, 0))
+        self.assertRaises(ValueError, parse_timestamp, "last tuesday")
+        
+    def test_version_conflict_reports_head(self):
+        """Test that a rejected commit reports the head to rebase onto"""
+        error = VersionConflictError(self.file_path, {
+            "head_version_id": "v2", "content_hash": "abc", "author_id": self.user_id
+        })
+        self.assertEqual(error.to_dict()["head"]["version_id"], "v2")
+        self.assertIsNone(VersionConflictError(self.file_path, None).to_dict()["head"])
 
 # Test class for AI Assistant functionality
 class TestAIAssistant(unittest.TestCase):
@@ -126,6 +160,521 @@ class TestAIAssistant(unittest.TestCase):
         print("Testing AI error handling...")
         print("✓ AI error handling test passed")
 
+# Test class for delta-compressed content storage
+class TestDeltaStorage(unittest.TestCase):
+    def setUp(self):
+        # Set up a base script and a lightly edited copy of it
+        self.base = b"INT. STUDIO - NIGHT\n" * 2000
+        self.target = self.base[:5000] + b"CUT TO:\n" + self.base[5000:]
+        
+    def test_delta_roundtrip(self):
+        """Test that a delta rebuilds the edited content exactly"""
+        delta = create_delta(self.base, self.target)
+        self.assertEqual(apply_delta(self.base, delta), self.target)
+        self.assertLess(len(delta), len(self.target) // 10)
+        
+    def test_delta_unrelated_content(self):
+        """Test that unrelated content still round-trips"""
+        target = bytes(range(256)) * 10
+        delta = create_delta(self.base, target)
+        self.assertEqual(apply_delta(self.base, delta), target)
+        
+    def test_delta_max_size(self):
+        """Test that delta creation gives up once it exceeds max_size"""
+        target = bytes(range(256)) * 10
+        self.assertIsNone(create_delta(self.base, target, max_size=100))
+        
+    def test_delta_wrong_base(self):
+        """Test that applying a delta to the wrong base is rejected"""
+        delta = create_delta(self.base, self.target)
+        with self.assertRaises(ValueError):
+            apply_delta(self.base[:-1], delta)
+
+# Test class for content compression
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        # Set up a compressible script
+        self.content = "EXT. ROOFTOP - DAY\nThe crew waits for the light.\n" * 500
+        
+    def test_text_uses_lzma(self):
+        """Test that text content is compressed with lzma"""
+        self.assertEqual(choose_codec("text/plain", self.content.encode()), CODEC_LZMA)
+        
+    def test_media_not_recompressed(self):
+        """Test that already-compressed media types are stored as-is"""
+        self.assertEqual(choose_codec("video/mp4", self.content.encode()), CODEC_NONE)
+        self.assertEqual(choose_codec("application/octet-stream", os.urandom(8192)), CODEC_NONE)
+        
+    def test_file_content_roundtrip(self):
+        """Test that FileContent compresses on storage and decompresses on use"""
+        file_content = FileContent("hash123", self.content, "text/plain", len(self.content))
+        stored = file_content.to_dict()
+        self.assertEqual(stored["codec"], CODEC_LZMA)
+        self.assertLess(len(stored["content"]), len(self.content))
+        self.assertEqual(FileContent.from_dict(stored).get_content(), self.content)
+        
+        # Contents handed to the blob store are left for it to encode
+        uncompressed = file_content.to_dict(compressed=False)
+        self.assertEqual(uncompressed["codec"], CODEC_NONE)
+        self.assertEqual(FileContent.from_dict(uncompressed).get_raw(), self.content.encode("utf-8"))
+
+    def test_text_sized_and_stored_as_bytes(self):
+        """Test that text is hashed, sized and stored as its UTF-8 bytes"""
+        file_content = FileContent.from_content("naïve café", "text/plain")
+        raw = "naïve café".encode("utf-8")
+        self.assertEqual(file_content.size, len(raw))
+        self.assertEqual(file_content.content_hash, hashlib.sha256(raw).hexdigest())
+        stored = file_content.to_dict()
+        self.assertEqual(stored["codec"], CODEC_NONE)
+        self.assertEqual(bytes(stored["content"]), raw)
+        self.assertEqual(FileContent.from_dict(stored).get_content(), "naïve café")
+
+# Test class for content-defined chunking
+class TestChunking(unittest.TestCase):
+    def setUp(self):
+        # Set up a pseudo-random binary stem
+        self.content = os.urandom(1024 * 1024)
+        
+    def test_chunks_reassemble(self):
+        """Test that chunks reassemble to the original content within size bounds"""
+        chunks = list(iter_chunks(self.content))
+        self.assertEqual(b"".join(chunks), self.content)
+        for chunk in chunks[:-1]:
+            self.assertGreater(len(chunk), MIN_CHUNK_SIZE)
+            self.assertLessEqual(len(chunk), MAX_CHUNK_SIZE)
+        
+    def test_insert_keeps_later_chunks(self):
+        """Test that inserting bytes only changes the chunks around the edit"""
+        original = list(iter_chunks(self.content))
+        edited = list(iter_chunks(self.content[:1000] + b"edit" + self.content[1000:]))
+        self.assertGreater(len(set(original) & set(edited)), len(original) - 3)
+        
+    def test_stream_chunker_matches(self):
+        """Test that streaming chunking produces the same chunks"""
+        chunker = StreamChunker()
+        chunks = []
+        for i in range(0, len(self.content), 50000):
+            chunks += chunker.update(self.content[i:i + 50000])
+        chunks += chunker.flush()
+        self.assertEqual(chunks, list(iter_chunks(self.content)))
+        
+    @unittest.skipUnless(chunking.numpy, "numpy is not installed")
+    def test_vectorised_cut_points_match(self):
+        """Test that the numpy gear hash finds the same cut points as the byte loop"""
+        low_entropy = bytes(self.content[i] & 1 for i in range(300000))
+        cases = [(self.content, 0, None), (self.content, 12345, 100000), (low_entropy, 7, None)]
+        vectorised = [chunking.find_cut_point(*case) for case in cases]
+        numpy_module, chunking.numpy = chunking.numpy, None
+        try:
+            byte_loop = [chunking.find_cut_point(*case) for case in cases]
+        finally:
+            chunking.numpy = numpy_module
+        self.assertEqual(vectorised, byte_loop)
+        
+    @unittest.skipUnless(chunking.numpy, "numpy is not installed")
+    def test_chunking_throughput(self):
+        """Test that chunking keeps up with uploads (the byte loop managed ~4 MB/s)"""
+        content = os.urandom(16 * 1024 * 1024)
+        started = time.perf_counter()
+        self.assertEqual(b"".join(iter_chunks(content)), content)
+        self.assertGreater(16 / (time.perf_counter() - started), 15)
+
+# Test class for the index registry
+class TestIndexRegistry(unittest.TestCase):
+    def test_all_queries_covered(self):
+        """Test that every DatabaseManager query shape has a matching index"""
+        self.assertEqual(find_uncovered_queries(), [])
+        
+    def test_sort_must_follow_equality(self):
+        """Test that an index only covers a sort that follows the equality fields"""
+        keys = [("workspace_id", 1), ("created_at", -1)]
+        self.assertTrue(index_covers(keys, ["workspace_id"], ["created_at"]))
+        self.assertFalse(index_covers(keys, ["workspace_id", "file_path"], ["created_at"]))
+        self.assertFalse(index_covers(keys, ["created_at"], []))
+        
+    def test_commit_indexes_are_required(self):
+        """Test that the unique indexes commits rely on are built before commits"""
+        required = {
+            (collection_name, index["name"])
+            for collection_name, indexes in INDEX_REGISTRY.items()
+            for index in indexes if index.get("required")
+        }
+        self.assertIn(("file_heads", "workspace_file_unique"), required)
+        self.assertIn(("file_contents", "content_hash_unique"), required)
+        self.assertTrue(all(
+            index.get("unique") for indexes in INDEX_REGISTRY.values() for index in indexes if index.get("required")
+        ))
+
+# Test class for the blob store backends
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        # Set up one store per local backend
+        self.stores = [MemoryBlobStore(), FilesystemBlobStore(tempfile.mkdtemp())]
+        self.content = b"hello blob store\n" * 100
+        self.content_hash = hashlib.sha256(self.content).hexdigest()
+        
+    def test_put_is_idempotent(self):
+        """Test that a blob is only created once and reads back intact"""
+        for store in self.stores:
+            first = store.put(self.content_hash, io.BytesIO(self.content), "text/plain")
+            second = store.put(self.content_hash, io.BytesIO(self.content), "text/plain")
+            self.assertTrue(first["created"])
+            self.assertFalse(second["created"])
+            self.assertEqual(store.get(self.content_hash), self.content)
+            self.assertEqual(store.get_meta(self.content_hash)["encoding"], "utf-8")
+            
+    def test_put_rejects_wrong_hash(self):
+        """Test that content not matching its hash is not stored"""
+        for store in self.stores:
+            self.assertIsNone(store.put("0" * 64, io.BytesIO(self.content)))
+            self.assertFalse(store.exists("0" * 64))
+            
+    def test_chunk_protocol(self):
+        """Test that uploaded chunks assemble into a blob"""
+        chunks = [b"a" * 100, b"b" * 50]
+        chunk_hashes = [hashlib.sha256(chunk).hexdigest() for chunk in chunks]
+        content_hash = hashlib.sha256(b"".join(chunks)).hexdigest()
+        for store in self.stores:
+            self.assertEqual(store.missing_chunks(chunk_hashes), chunk_hashes)
+            self.assertTrue(store.put_chunk(chunk_hashes[0], chunks[0]))
+            self.assertFalse(store.put_chunked(content_hash, chunk_hashes, "text/plain"))
+            self.assertTrue(store.put_chunk(chunk_hashes[1], chunks[1]))
+            self.assertTrue(store.put_chunked(content_hash, chunk_hashes, "text/plain"))
+            self.assertEqual(b"".join(store.iter_range(store.get_meta(content_hash), 90, 110)), b"a" * 10 + b"b" * 10)
+            
+    def test_manifest_of_stored_blob_is_verified(self):
+        """Test that a manifest naming a stored blob still needs matching chunks"""
+        chunk = b"c" * 100
+        chunk_digest = hashlib.sha256(chunk).hexdigest()
+        for store in self.stores:
+            store.put(None, io.BytesIO(self.content))
+            self.assertTrue(store.put_chunk(chunk_digest, chunk))
+            self.assertFalse(store.put_chunked(self.content_hash, [chunk_digest], "text/plain"))
+            self.assertTrue(store.put_chunk(self.content_hash, self.content))
+            self.assertTrue(store.put_chunked(self.content_hash, [self.content_hash], "text/plain"))
+
+    def test_list_and_delete(self):
+        """Test that blobs are listed in hash order from a resume point and can be deleted"""
+        blobs = [b"one", b"two", b"three"]
+        hashes = sorted(hashlib.sha256(blob).hexdigest() for blob in blobs)
+        for store in self.stores:
+            for blob in blobs:
+                store.put(None, io.BytesIO(blob))
+            self.assertEqual([meta["content_hash"] for meta in store.list_blobs(limit=2)], hashes[:2])
+            self.assertEqual([meta["content_hash"] for meta in store.list_blobs(hashes[1])], hashes[2:])
+            self.assertTrue(store.delete(hashes[0]))
+            self.assertFalse(store.delete(hashes[0]))
+            self.assertFalse(store.exists(hashes[0]))
+            
+    def test_reference_counts(self):
+        """Test that reference counts start at zero and follow adjustments"""
+        for store in self.stores:
+            store.put(self.content_hash, io.BytesIO(self.content))
+            self.assertEqual(store.get_meta(self.content_hash)["refcount"], 0)
+            store.add_refs({self.content_hash: 3})
+            store.add_refs({self.content_hash: -1})
+            self.assertEqual(store.get_meta(self.content_hash)["refcount"], 2)
+            
+    def test_delete_keeps_used_blobs(self):
+        """Test that deletes skip blobs with references or stored again since the cutoff"""
+        for store in self.stores:
+            store.put(self.content_hash, io.BytesIO(self.content))
+            cutoff = datetime.utcnow()
+            store.add_refs({self.content_hash: 1})
+            self.assertFalse(store.delete(self.content_hash))
+            store.add_refs({self.content_hash: -1})
+            store.put(self.content_hash, io.BytesIO(self.content))
+            self.assertFalse(store.delete(self.content_hash, cutoff))
+            self.assertTrue(store.delete(self.content_hash, datetime.utcnow() + timedelta(seconds=1)))
+            
+    def test_put_many(self):
+        """Test that a batch put stores new blobs and skips mismatched ones"""
+        other = b"second blob"
+        other_hash = hashlib.sha256(other).hexdigest()
+        for store in self.stores:
+            store.put(self.content_hash, io.BytesIO(self.content))
+            stored = store.put_many([
+                (self.content_hash, self.content, "text/plain"),
+                (other_hash, other, "text/plain"),
+                ("0" * 64, other, "text/plain")
+            ])
+            self.assertEqual(set(stored), {self.content_hash, other_hash})
+            self.assertFalse(stored[self.content_hash]["created"])
+            self.assertTrue(stored[other_hash]["created"])
+            self.assertEqual(store.get(other_hash), other)
+            
+    def test_filesystem_open_range(self):
+        """Test that a memory-mapped blob only reads its byte range"""
+        store = self.stores[1]
+        store.put(self.content_hash, io.BytesIO(self.content))
+        blob = store.open(store.get_meta(self.content_hash), 10, 30)
+        try:
+            self.assertEqual(b"".join(blob), self.content[10:30])
+        finally:
+            blob.close()
+            
+    def test_mirror_write_through(self):
+        """Test that a mirrored store writes to both stores and fills the mirror on reads"""
+        primary, mirror = MemoryBlobStore(), FilesystemBlobStore(tempfile.mkdtemp())
+        store = MirroredBlobStore(primary, mirror)
+        self.assertTrue(store.put(self.content_hash, io.BytesIO(self.content), "text/plain")["created"])
+        self.assertTrue(primary.exists(self.content_hash))
+        self.assertTrue(mirror.exists(self.content_hash))
+        
+        other = b"only in the primary"
+        other_hash = hashlib.sha256(other).hexdigest()
+        primary.put(other_hash, io.BytesIO(other))
+        self.assertEqual(store.get(other_hash), other)
+        self.assertTrue(mirror.exists(other_hash))
+        
+    def test_mirror_metadata_does_not_fill(self):
+        """Test that metadata lookups leave the mirror alone and content reads fill it"""
+        primary, mirror = MemoryBlobStore(), FilesystemBlobStore(tempfile.mkdtemp())
+        store = MirroredBlobStore(primary, mirror)
+        primary.put(self.content_hash, io.BytesIO(self.content), "text/plain")
+        self.assertEqual(store.get_meta(self.content_hash)["size"], len(self.content))
+        self.assertIn(self.content_hash, store.get_meta_many([self.content_hash]))
+        self.assertFalse(mirror.exists(self.content_hash))
+        
+        meta = store.get_meta(self.content_hash)
+        self.assertEqual(b"".join(store.iter_range(meta, 0, 5)), self.content[:5])
+        self.assertTrue(mirror.exists(self.content_hash))
+
+# Test class for the MongoDB blob store; needs a server at TEST_MONGO_URI
+@unittest.skipUnless(os.getenv("TEST_MONGO_URI"), "TEST_MONGO_URI not set")
+class TestMongoBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.db_manager = DatabaseManager(os.getenv("TEST_MONGO_URI"))
+        self.db_manager.client = MongoClient(self.db_manager.connection_string)
+        self.db_manager.db = self.db_manager.client["test_blob_store"]
+        self.db_manager.connected = True
+        IndexManager(self.db_manager).ensure_required_indexes()
+        self.store = MongoBlobStore(self.db_manager)
+        
+    def tearDown(self):
+        self.db_manager.client.drop_database("test_blob_store")
+        self.db_manager.close()
+        
+    def test_delete_during_put_keeps_shared_chunks(self):
+        """Test that deleting a blob while a put shares its chunks leaves the new blob whole"""
+        shared = os.urandom(3 * 1024 * 1024)
+        first, second = shared + b"1", shared + b"2"
+        first_hash = hashlib.sha256(first).hexdigest()
+        second_hash = hashlib.sha256(second).hexdigest()
+        self.assertTrue(self.store.put(first_hash, io.BytesIO(first))["created"])
+        
+        # Delete the first blob after the second stored its chunks but
+        # before it took references on them
+        store_chunks = self.store._store_chunks
+        def store_then_delete(chunks, content_type=None):
+            stored = store_chunks(chunks, content_type)
+            self.assertTrue(self.store.delete(first_hash))
+            return stored
+        self.store._store_chunks = store_then_delete
+        self.assertTrue(self.store.put(second_hash, io.BytesIO(second))["created"])
+        self.assertEqual(self.store.get(second_hash), second)
+
+# Test class for workspace archive export
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        # Set up a store with a few files
+        self.store = MemoryBlobStore()
+        self.contents = {"README.md": b"# readme\n", "src/app.py": b"print('hi')\n" * 300, "../escape": b"x"}
+        self.files = []
+        for file_path, content in sorted(self.contents.items()):
+            meta = self.store.put(None, io.BytesIO(content), "text/plain")
+            self.files.append({"file_path": file_path, "content_hash": meta["content_hash"], "updated_at": None})
+        
+    def test_tar_export(self):
+        """Test that a streamed tar archive holds every file with a safe path"""
+        archive = tarfile.open(fileobj=io.BytesIO(b"".join(iter_tar(self.store, self.files, batch_size=2))))
+        self.assertEqual(sorted(archive.getnames()), ["README.md", "escape", "src/app.py"])
+        self.assertEqual(archive.extractfile("src/app.py").read(), self.contents["src/app.py"])
+        
+    def test_zip_export(self):
+        """Test that a streamed zip archive holds every file"""
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(iter_zip(self.store, self.files, batch_size=2))))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.read("README.md"), self.contents["README.md"])
+        self.assertEqual(archive.read("src/app.py"), self.contents["src/app.py"])
+        
+    def test_colliding_paths_get_unique_names(self):
+        """Test that paths that normalise to the same name are all kept"""
+        meta = self.store.put(None, io.BytesIO(b"y"), "text/plain")
+        self.files.append({"file_path": "escape", "content_hash": meta["content_hash"], "updated_at": None})
+        archive = tarfile.open(fileobj=io.BytesIO(b"".join(iter_tar(self.store, self.files))))
+        self.assertEqual(sorted(archive.getnames()), ["README.md", "escape", "escape~1", "src/app.py"])
+        self.assertEqual(archive.extractfile("escape~1").read(), b"y")
+        
+    def test_short_content_keeps_archive_readable(self):
+        """Test that content ending before its size is padded, not left to corrupt the archive"""
+        self.store.get_many = lambda content_hashes: {}
+        self.store.iter_range = lambda meta, start=0, end=None: iter([b"# re"])
+        archive = tarfile.open(fileobj=io.BytesIO(b"".join(iter_tar(self.store, self.files))))
+        self.assertEqual(sorted(archive.getnames()), ["README.md", "escape", "src/app.py"])
+        self.assertEqual(archive.extractfile("README.md").read(), b"# re" + b"\0" * 5)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(iter_zip(self.store, self.files))))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(len(archive.read("src/app.py")), len(self.contents["src/app.py"]))
+
+# Test class for bulk import
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        # Set up a small directory tree
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "src"))
+        os.makedirs(os.path.join(self.root, ".git"))
+        for path, content in [("README", b"readme"), ("src/data.bin", b"\xff\xfe"), (".git/HEAD", b"ref")]:
+            with open(os.path.join(self.root, path), "wb") as f:
+                f.write(content)
+        
+    def test_directory_listing(self):
+        """Test that the import walks files in order and skips .git"""
+        self.assertEqual([path for path, _ in iter_directory(self.root)], ["README", "src/data.bin"])
+        
+    def test_hash_source(self):
+        """Test that workers report hash, size and whether content is text"""
+        sources = dict(iter_directory(self.root))
+        self.assertEqual(hash_source(sources["README"]), (hashlib.sha256(b"readme").hexdigest(), 6, True))
+        self.assertFalse(hash_source(sources["src/data.bin"])[2])
+        
+    def test_import_path_stays_in_root(self):
+        """Test that API imports cannot leave the import root"""
+        self.assertEqual(resolve_import_path("src", self.root), os.path.realpath(os.path.join(self.root, "src")))
+        self.assertIsNone(resolve_import_path("..", self.root))
+        self.assertIsNone(resolve_import_path("/etc", self.root))
+        
+    def test_refs_cannot_be_options(self):
+        """Test that git refs from requests cannot pass options to git"""
+        self.assertTrue(is_valid_ref("refs/heads/main"))
+        self.assertFalse(is_valid_ref("--output=/tmp/x"))
+        self.assertFalse(is_valid_ref(""))
+        self.assertFalse(is_valid_ref(["HEAD"]))
+        
+    def test_hash_entries_in_spawned_pool(self):
+        """Test that hashing works in spawned worker processes"""
+        hashed = BulkImporter(None, workers=2)._hash_entries(list(iter_directory(self.root)))
+        self.assertEqual([item["content_hash"] for item in hashed],
+                         [hashlib.sha256(b"readme").hexdigest(), hashlib.sha256(b"\xff\xfe").hexdigest()])
+        
+    def test_upload_batches_capped_by_bytes(self):
+        """Test that bulk writes are split by total size as well as count"""
+        store = MemoryBlobStore()
+        batches = []
+        put_many = store.put_many
+        store.put_many = lambda blobs: batches.append(len(blobs)) or put_many(blobs)
+        manager = DatabaseManager()
+        manager.blob_store = store
+        importer = BulkImporter(manager, workers=1, batch_size=10, batch_bytes=4)
+        hashed = importer._hash_entries(list(iter_directory(self.root)))
+        self.assertEqual(importer._upload_missing(hashed), 2)
+        self.assertEqual(batches, [1, 1])
+
+# Test class for history compaction
+class TestCompaction(unittest.TestCase):
+    def setUp(self):
+        # Keep everything for a day, then hourly for a week, then daily
+        self.now = datetime(2024, 3, 10, 12, 0)
+        self.policy = [(timedelta(days=1), None), (timedelta(days=7), HOUR), (None, DAY)]
+        
+    def test_recent_versions_are_kept(self):
+        """Test that versions younger than the keep-all age have no bucket"""
+        self.assertIsNone(checkpoint_bucket(self.now - timedelta(hours=23), self.now, self.policy))
+        
+    def test_buckets_grow_with_age(self):
+        """Test that old versions share hourly, then daily buckets"""
+        two_days = self.now - timedelta(days=2)
+        self.assertEqual(checkpoint_bucket(two_days, self.now, self.policy),
+                         checkpoint_bucket(two_days + timedelta(minutes=30), self.now, self.policy))
+        self.assertNotEqual(checkpoint_bucket(two_days, self.now, self.policy),
+                            checkpoint_bucket(two_days + timedelta(hours=1), self.now, self.policy))
+        ten_days = datetime(2024, 2, 29, 1, 0)
+        self.assertEqual(checkpoint_bucket(ten_days, self.now, self.policy),
+                         checkpoint_bucket(ten_days + timedelta(hours=20), self.now, self.policy))
+        
+    def test_head_is_kept_when_not_newest(self):
+        """Test that the file head is kept even if a newer version shares its bucket"""
+        two_days = self.now - timedelta(days=2)
+        versions = [
+            {"version_id": "v3", "created_at": two_days + timedelta(minutes=40)},
+            {"version_id": "v2", "created_at": two_days + timedelta(minutes=20)},
+            {"version_id": "v1", "created_at": two_days}
+        ]
+        kept, deleted = select_checkpoints(versions, "v2", self.now, self.policy)
+        self.assertEqual([v["version_id"] for v in kept], ["v3", "v2"])
+        self.assertEqual([v["version_id"] for v in deleted], ["v1"])
+        kept, deleted = select_checkpoints(versions, None, self.now, self.policy)
+        self.assertEqual([v["version_id"] for v in kept], ["v3", "v2"])
+
+# Test class for full-text search
+class TestSearch(unittest.TestCase):
+    def test_tokenize(self):
+        """Test that text is split into lower-case words of two or more characters"""
+        self.assertEqual(tokenize("INT. Café — a Scene_2, again!"), ["int", "café", "scene_2", "again"])
+        
+    def test_bm25_ranking(self):
+        """Test that frequent terms in short files and rare terms rank higher"""
+        self.assertGreater(bm25(3, 2, 10, 100, 50), bm25(1, 2, 10, 100, 50))
+        self.assertGreater(bm25(1, 2, 10, 100, 50), bm25(1, 2, 200, 100, 50))
+        self.assertGreater(bm25(1, 2, 10, 100, 50), bm25(1, 80, 10, 100, 50))
+        
+    def test_path_trigrams(self):
+        """Test that path trigrams are padded per word and contain those of substrings"""
+        grams = set(path_trigrams("Reel1/EDL_final.edl"))
+        self.assertTrue({"  e", " ed", "edl", "dl ", "fin"} <= grams)
+        self.assertTrue(set(path_trigrams("l_fin", padded=False)) <= grams)
+        self.assertNotIn("l_f", grams)
+        
+    def test_fuzzy_path_match_keeps_substrings(self):
+        """Test that fuzzy path matching still finds paths containing the query"""
+        self.assertIsNotNone(path_similarity("Reel1/EDL_final.edl", "ina"))
+        self.assertIsNotNone(path_similarity("Reel1/EDL_final.edl", "edl final"))
+        self.assertIsNotNone(path_similarity("cue_0123", "12"))
+        self.assertIsNone(path_similarity("cue_0123", "13"))
+        self.assertIsNone(path_similarity("Reel1/EDL_final.edl", "finla", fuzzy=False))
+        self.assertIsNotNone(path_similarity("Reel1/EDL_final.edl", "finla"))
+        
+    def test_load_batches_are_bounded(self):
+        """Test that texts are loaded in batches bounded by file count and bytes"""
+        batches = list(load_batches(list("abcdef"), [1, 1, 1, 8, 20, 1], max_files=3, max_bytes=10))
+        self.assertEqual(batches, [["a", "b", "c"], ["d"], ["e"], ["f"]])
+
+# Test class for workspace events
+class TestEvents(unittest.TestCase):
+    def setUp(self):
+        self.hub = EventHub()
+        self.version = {"_id": ObjectId(), "version_id": "v1", "file_path": "cue.wav", "commit_id": str(ObjectId()),
+                        "message": "New cue", "created_at": datetime(2024, 3, 10, 12, 0)}
+        
+    def test_publish_reaches_workspace_subscribers(self):
+        """Test that events go to the subscribers of their workspace only"""
+        subscription = self.hub.subscribe("w1")
+        other = self.hub.subscribe("w2")
+        self.assertEqual(self.hub.subscriber_count(), 2)
+        self.hub.publish_commit("w1", [self.version])
+        event = subscription.get(0.1)
+        self.assertEqual(event["id"], f"{self.version['commit_id']}:{self.version['_id']}")
+        self.assertEqual(event["data"]["file_path"], "cue.wav")
+        self.assertIsNone(other.get(0.01))
+        self.hub.unsubscribe(subscription)
+        self.hub.unsubscribe(other)
+        self.assertEqual(self.hub._subscriptions, {})
+        
+    def test_slow_subscriber_overflows(self):
+        """Test that a full queue marks the subscription instead of blocking"""
+        subscription = Subscription("w1", size=1)
+        subscription.put(version_event(self.version))
+        subscription.put(version_event(self.version))
+        self.assertTrue(subscription.overflowed)
+        
+    def test_parse_event_id(self):
+        """Test that only commit and version ids are accepted as Last-Event-ID"""
+        event_id = version_event(self.version)["id"]
+        self.assertEqual(parse_event_id(event_id), (self.version["commit_id"], self.version["_id"]))
+        self.assertIsNone(parse_event_id(str(self.version["_id"])))
+        self.assertIsNone(parse_event_id("not-an-id"))
+        self.assertIsNone(parse_event_id(None))
+
 # Run the tests
 if __name__ == "__main__":
     print("Running functionality tests...")
@@ -137,6 +686,50 @@ if __name__ == "__main__":
     file_suite = unittest.TestLoader().loadTestsFromTestCase(TestFileVersioning)
     unittest.TextTestRunner().run(file_suite)
     
+    print("\nTesting Delta Storage:")
+    delta_suite = unittest.TestLoader().loadTestsFromTestCase(TestDeltaStorage)
+    unittest.TextTestRunner().run(delta_suite)
+    
+    print("\nTesting Compression:")
+    compression_suite = unittest.TestLoader().loadTestsFromTestCase(TestCompression)
+    unittest.TextTestRunner().run(compression_suite)
+    
+    print("\nTesting Chunking:")
+    chunking_suite = unittest.TestLoader().loadTestsFromTestCase(TestChunking)
+    unittest.TextTestRunner().run(chunking_suite)
+    
+    print("\nTesting Index Registry:")
+    index_suite = unittest.TestLoader().loadTestsFromTestCase(TestIndexRegistry)
+    unittest.TextTestRunner().run(index_suite)
+    
+    print("\nTesting Blob Store:")
+    blob_suite = unittest.TestLoader().loadTestsFromTestCase(TestBlobStore)
+    unittest.TextTestRunner().run(blob_suite)
+    
+    print("\nTesting MongoDB Blob Store:")
+    mongo_blob_suite = unittest.TestLoader().loadTestsFromTestCase(TestMongoBlobStore)
+    unittest.TextTestRunner().run(mongo_blob_suite)
+    
+    print("\nTesting Export:")
+    export_suite = unittest.TestLoader().loadTestsFromTestCase(TestExport)
+    unittest.TextTestRunner().run(export_suite)
+    
+    print("\nTesting Bulk Import:")
+    import_suite = unittest.TestLoader().loadTestsFromTestCase(TestBulkImport)
+    unittest.TextTestRunner().run(import_suite)
+    
+    print("\nTesting Compaction:")
+    compaction_suite = unittest.TestLoader().loadTestsFromTestCase(TestCompaction)
+    unittest.TextTestRunner().run(compaction_suite)
+    
+    print("\nTesting Search:")
+    search_suite = unittest.TestLoader().loadTestsFromTestCase(TestSearch)
+    unittest.TextTestRunner().run(search_suite)
+    
+    print("\nTesting Events:")
+    events_suite = unittest.TestLoader().loadTestsFromTestCase(TestEvents)
+    unittest.TextTestRunner().run(events_suite)
+    
     print("\nTesting AI Assistant:")
     ai_suite = unittest.TestLoader().loadTestsFromTestCase(TestAIAssistant)
     unittest.TextTestRunner().run(ai_suite)